@@ -0,0 +1,60 @@
+# encoding: utf-8
+
+""" Tests of scanned code format check.
+"""
+
+import pytest
+
+from vjezd import codes
+from vjezd.codes import CodeFormat
+from vjezd.models import Ticket
+
+
+@pytest.mark.parametrize('code', ['0F0B7', '0F0B73E290000001', 'ABCDEF',
+    '1234567890'])
+def test_well_formed(code):
+    assert CodeFormat().check(code) == (code, None)
+
+
+def test_whitespace_stripped():
+    assert CodeFormat().check(' 0F0B73E2\r\n') == ('0F0B73E2', None)
+
+
+@pytest.mark.parametrize('code', [None, '', '   ', '\r\n'])
+def test_empty_rejected(code):
+    assert CodeFormat().check(code)[1] == codes.REJECT_EMPTY
+
+
+@pytest.mark.parametrize('code', ['0F0B', '0F0B73E2900000011', 'A' * 240])
+def test_length_rejected(code):
+    assert CodeFormat().check(code)[1] == codes.REJECT_LENGTH
+
+
+@pytest.mark.parametrize('code', ['0f0b73e2', '0F0B7G', '0F0B 73E2',
+    '0F0B-73E2', '0F0B\x0073'])
+def test_charset_rejected(code):
+    assert CodeFormat().check(code)[1] == codes.REJECT_CHARSET
+
+
+def test_rejections_counted():
+    fmt = CodeFormat()
+    for code in ('', '0F0B', 'XYZXYZ', 'XYZXYZ', '0F0B7'):
+        fmt.check(code)
+
+    assert fmt.rejected == {codes.REJECT_EMPTY: 1, codes.REJECT_LENGTH: 1,
+        codes.REJECT_CHARSET: 2}
+
+
+def test_custom_format():
+    fmt = CodeFormat('0-9', 2, 4)
+
+    assert fmt.check('1234')[1] is None
+    assert fmt.check('12345')[1] == codes.REJECT_LENGTH
+    assert fmt.check('12A')[1] == codes.REJECT_CHARSET
+
+
+def test_generated_codes_well_formed():
+    fmt = CodeFormat()
+    for i in range(100):
+        code = Ticket.generate_code()
+        assert fmt.check(code) == (code, None)
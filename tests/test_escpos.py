@@ -0,0 +1,77 @@
+# encoding: utf-8
+
+""" Tests of ESC/POS printer port targets.
+"""
+
+import os
+import socket
+
+import pytest
+
+from vjezd.ports.printer import escpos
+from vjezd.ports.printer.escpos import EscPosPrinter, EscPosPrinterTestError
+
+
+@pytest.mark.parametrize('target, address', [
+    ('printer', ('printer', escpos.TCP_PORT)),
+    ('printer:', ('printer', escpos.TCP_PORT)),
+    ('192.168.1.50:9101', ('192.168.1.50', 9101)),
+    ('/dev/usb/lp0', None),
+    ('./ticket.bin', None),
+    ('sink/ticket.bin', None)])
+def test_target(target, address):
+    printer = EscPosPrinter(target)
+
+    assert printer.is_network() == (address is not None)
+    assert printer.address == address
+
+
+def test_missing_device_not_created(tmp_path):
+    target = str(tmp_path / 'lp0')
+    printer = EscPosPrinter(target)
+
+    with pytest.raises(EscPosPrinterTestError):
+        printer.test()
+    with pytest.raises(FileNotFoundError):
+        printer.open()
+    assert not os.path.exists(target)
+    assert not printer.is_open()
+
+
+def test_file_sink(tmp_path):
+    target = tmp_path / 'ticket.bin'
+    target.touch()
+    printer = EscPosPrinter(str(target))
+
+    printer.test()
+    printer.open()
+    try:
+        printer.print_document(None, escpos.INIT)
+        printer.print_document(None, escpos.CUT)
+    finally:
+        printer.close()
+    assert target.read_bytes() == escpos.INIT + escpos.CUT
+
+
+def test_network_sink():
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(('127.0.0.1', 0))
+    server.listen(1)
+    printer = EscPosPrinter('127.0.0.1:{}'.format(server.getsockname()[1]))
+
+    printer.test()
+    printer.open()
+    client, address = server.accept()
+    try:
+        printer.print_document(None, escpos.INIT + escpos.CUT)
+        printer.close()
+        data = b''
+        while True:
+            chunk = client.recv(64)
+            if not chunk:
+                break
+            data += chunk
+    finally:
+        client.close()
+        server.close()
+    assert data == escpos.INIT + escpos.CUT
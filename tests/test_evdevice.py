@@ -0,0 +1,72 @@
+# encoding: utf-8
+
+""" Tests of kernel event mask of shared event device.
+"""
+
+import ctypes
+
+import pytest
+
+evdev = pytest.importorskip('evdev')
+from evdev import ecodes as e
+
+from vjezd.ports import evdevice
+
+
+class FakeInputDevice(object):
+    """ Input device not backed by any special file.
+    """
+
+    fd = -1
+
+    def __init__(self, path):
+        self.path = path
+
+
+@pytest.fixture
+def masks(monkeypatch):
+    """ Capture bitmaps passed to EVIOCSMASK ioctl by event type.
+    """
+    masks = {}
+    def ioctl(fd, request, mask):
+        assert request == evdevice._EVIOCSMASK
+        bitmap = ctypes.string_at(mask.codes_ptr, mask.codes_size)
+        masks[mask.type] = set(i for i in range(len(bitmap) * 8)
+            if bitmap[i // 8] & (1 << (i % 8)))
+
+    monkeypatch.setattr(evdevice, 'InputDevice', FakeInputDevice)
+    monkeypatch.setattr(evdevice.fcntl, 'ioctl', ioctl)
+    return masks
+
+
+def subscribe(device, types=None, codes=None):
+    device.subscribers.append(evdevice.Subscriber(device, types, codes))
+    device._set_mask()
+
+
+def test_type_mask_is_union_of_types(masks):
+    device = evdevice.SharedDevice('/dev/input/event0')
+    subscribe(device, (e.EV_KEY,), (e.KEY_ENTER,))
+    subscribe(device, (e.EV_KEY,), (e.KEY_A, e.KEY_B))
+
+    # Type 0 bitmap is the mask of event types
+    assert masks[0] == {e.EV_KEY}
+    assert masks[e.EV_KEY] == {e.KEY_ENTER, e.KEY_A, e.KEY_B}
+
+
+def test_type_mask_of_several_types(masks):
+    device = evdevice.SharedDevice('/dev/input/event0')
+    subscribe(device, (e.EV_KEY,), (e.KEY_ENTER,))
+    subscribe(device, (e.EV_KEY, e.EV_MSC), None)
+
+    assert masks[0] == {e.EV_KEY, e.EV_MSC}
+    assert masks[e.EV_KEY] == set(range(e.KEY_MAX + 1))
+
+
+def test_subscriber_of_all_events_unmasks_everything(masks):
+    device = evdevice.SharedDevice('/dev/input/event0')
+    subscribe(device, (e.EV_KEY,), (e.KEY_ENTER,))
+    subscribe(device)
+
+    assert masks[0] >= set(range(e.EV_MAX + 1))
+    assert masks[e.EV_KEY] >= set(range(e.KEY_MAX + 1))
@@ -0,0 +1,116 @@
+# encoding: utf-8
+
+""" Tests of port event queue policies.
+"""
+
+import time
+
+from vjezd.ports import events
+from vjezd.ports.events import EventQueue
+
+
+def drain(queue):
+    """ Get data of all events in queue.
+    """
+    data = []
+    while True:
+        event = queue.get(timeout=0)
+        if not event:
+            return data
+        data.append(event.data)
+
+
+def test_drop_oldest_at_size():
+    queue = EventQueue('test', events.DROP_OLDEST, '3')
+    for i in range(5):
+        queue.put(i)
+
+    assert len(queue) == 3
+    assert drain(queue) == [2, 3, 4]
+    assert queue.stats['received'] == 5
+    assert queue.stats['dropped'] == 2
+    assert queue.stats['consumed'] == 3
+
+
+def test_coalesce_merges_equal_events():
+    queue = EventQueue('test', events.COALESCE, '2')
+    for data in ('a', 'a', 'b', 'a', 'c'):
+        queue.put(data)
+
+    # Equal events are merged, once full the oldest one is dropped
+    assert queue.stats['merged'] == 2
+    assert queue.stats['dropped'] == 1
+    event = queue.get(timeout=0)
+    assert event.data == 'b'
+    assert event.count == 1
+    assert drain(queue) == ['c']
+
+
+def test_coalesce_merge_counts():
+    queue = EventQueue('test', events.COALESCE, '2')
+    for data in ('a', 'a', 'a', 'b'):
+        queue.put(data)
+
+    event = queue.get(timeout=0)
+    assert (event.data, event.count) == ('a', 3)
+    assert queue.stats['dropped'] == 0
+
+
+def test_latest_keeps_latest():
+    queue = EventQueue('test', events.LATEST, '2')
+    for i in range(5):
+        queue.put(i)
+
+    assert drain(queue) == [3, 4]
+    assert queue.stats['dropped'] == 3
+
+
+def test_latest_bounded_by_size():
+    queue = EventQueue('test', events.LATEST)
+    for i in range(events.QUEUE_SIZE + 4):
+        queue.put(i)
+
+    assert len(queue) == events.QUEUE_SIZE
+    assert drain(queue) == [events.QUEUE_SIZE + 3]
+
+
+def test_expire_drops_old_events():
+    queue = EventQueue('test', events.EXPIRE, '0.1')
+    queue.put(1)
+    queue.put(2)
+    time.sleep(0.2)
+    queue.put(3)
+
+    assert drain(queue) == [3]
+    assert queue.stats['expired'] == 2
+
+
+def test_expire_bounded_by_size():
+    queue = EventQueue('test', events.EXPIRE)
+    for i in range(events.QUEUE_SIZE + 1):
+        queue.put(i)
+
+    assert len(queue) == events.QUEUE_SIZE
+    assert drain(queue)[0] == 1
+
+
+def test_unknown_policy_falls_back_to_default():
+    queue = EventQueue('test', 'bogus', '3')
+
+    assert queue.policy == events.DEFAULT_POLICY
+    assert queue.size == events.QUEUE_SIZE
+
+
+def test_invalid_argument_falls_back_to_default():
+    queue = EventQueue('test', events.LATEST, 'x')
+
+    assert queue.policy == events.LATEST
+    assert queue.keep == events.KEEP
+
+
+def test_get_times_out_on_empty_queue():
+    queue = EventQueue('test')
+
+    start = time.monotonic()
+    assert queue.get(timeout=0.1) is None
+    assert time.monotonic() - start >= 0.1
@@ -0,0 +1,53 @@
+# encoding: utf-8
+
+""" Tests of interrupting blocked waits once exiting.
+
+    Exiting flag can't be reset, so each test runs in its own interpreter.
+"""
+
+import os
+import sys
+import subprocess
+import textwrap
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(code):
+    """ Run code in new interpreter and return its output.
+    """
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    return subprocess.check_output([sys.executable, '-c',
+        textwrap.dedent(code)], env=env, timeout=30).decode().strip()
+
+
+def test_relay_wait_interrupted():
+    out = run('''
+        import time, threading
+        from vjezd import threads
+        from vjezd.ports.relay.scheduler import RelayHandle
+
+        handle = RelayHandle(None, 'scan', 0, 10)
+        threading.Timer(0.2, threads.set_exiting).start()
+        start = time.monotonic()
+        result = handle.wait()
+        print(result, round(time.monotonic() - start - 0.2, 1))
+    ''')
+    assert out == 'False 0.0'
+
+
+def test_stage_put_interrupted():
+    out = run('''
+        import time, threading
+        from vjezd import threads
+        from vjezd.threads.pipeline import Job, Stage
+
+        stage = Stage('full', lambda job: job, size=1)
+        stage.put(Job())
+        threading.Timer(0.2, threads.set_exiting).start()
+        start = time.monotonic()
+        result = stage.put(Job())
+        print(result, round(time.monotonic() - start - 0.2, 1))
+    ''')
+    assert out == 'False 0.0'
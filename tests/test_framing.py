@@ -0,0 +1,62 @@
+# encoding: utf-8
+
+""" Tests of framing receive buffer.
+"""
+
+from vjezd.ports.framing import FrameBuffer
+
+
+def receive(frames, data):
+    """ Receive data into free part of buffer as recv_into() would.
+    """
+    view = frames.free()
+    n = min(len(view), len(data))
+    view[:n] = data[:n]
+    return frames.feed(n), data[n:]
+
+
+def test_frame_split_across_receives():
+    frames = FrameBuffer(b'\n', 16)
+
+    assert receive(frames, b'ABC')[0] == []
+    assert receive(frames, b'DE')[0] == []
+    assert receive(frames, b'F\nGH')[0] == ['ABCDEF']
+    assert receive(frames, b'\n')[0] == ['GH']
+
+
+def test_several_frames_and_terminators():
+    frames = FrameBuffer(b'\r\n', 16)
+
+    # Empty frames (e.g. CR of CRLF) are skipped
+    assert receive(frames, b'AB\r\nCD\r\n\r\nEF')[0] == ['AB', 'CD']
+    assert frames.flush() == ['EF']
+    assert frames.flush() == []
+
+
+def test_frame_of_maximum_length():
+    frames = FrameBuffer(b'\n', 4)
+
+    assert receive(frames, b'ABCD\n')[0] == ['ABCD']
+    assert frames.dropped == 0
+
+
+def test_overlong_frame_dropped():
+    frames = FrameBuffer(b'\n', 4)
+
+    # Buffer holds the longest frame and its terminator only
+    codes, rest = receive(frames, b'ABCDEFGH\nIJ\n')
+    assert codes == []
+    while rest:
+        more, rest = receive(frames, rest)
+        codes += more
+    assert codes == ['IJ']
+    assert frames.dropped == 1
+
+
+def test_clear_discards_incomplete_frame():
+    frames = FrameBuffer(b'\n', 4)
+
+    receive(frames, b'ABCDEFGH')
+    frames.clear()
+    assert receive(frames, b'IJ\n')[0] == ['IJ']
+    assert frames.dropped == 0
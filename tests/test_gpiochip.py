@@ -0,0 +1,105 @@
+# encoding: utf-8
+
+""" Tests of GPIO character device ports driven by fake chip.
+"""
+
+import time
+import errno
+
+import pytest
+
+from vjezd.ports import gpiochip
+from vjezd.ports.button.gpiochip import GPIOChipButton
+from vjezd.ports.relay.gpiochip import GPIOChipRelay
+
+
+def presses(button):
+    """ Read button once and count callbacks.
+    """
+    pressed = []
+    button.read(lambda: pressed.append(True))
+    return len(pressed)
+
+
+@pytest.fixture
+def button(request):
+    button = GPIOChipButton('22', 'fake:' + request.node.name, '50')
+    button.open()
+    yield button
+    button.close()
+
+
+def test_button_rising_edge(button):
+    chip = gpiochip.open_chip(button.chip_path)
+    assert button.offset == 25
+
+    chip.press(button.offset)
+    assert presses(button) == 1
+
+    # Only rising edge of the press is reported
+    button._last = None
+    line = chip.lines[button.offset]
+    line.trigger(1)
+    line.trigger(0)
+    assert presses(button) == 1
+
+
+def test_button_debounce(button):
+    chip = gpiochip.open_chip(button.chip_path)
+
+    chip.press(button.offset)
+    chip.press(button.offset)
+    chip.press(button.offset)
+    assert presses(button) == 1
+
+
+def test_button_pressed_after_bouncetime(button):
+    chip = gpiochip.open_chip(button.chip_path)
+
+    chip.press(button.offset)
+    assert presses(button) == 1
+    time.sleep(0.06)
+    chip.press(button.offset)
+    assert presses(button) == 1
+
+
+def test_line_busy(button):
+    other = GPIOChipButton('22', button.chip_path)
+    with pytest.raises(OSError) as err:
+        other.open()
+    assert err.value.errno == errno.EBUSY
+
+    # Line is free once released
+    button.close()
+    other.open()
+    other.close()
+
+
+def test_press_not_requested_line():
+    chip = gpiochip.open_chip('fake:not-requested')
+    with pytest.raises(ValueError):
+        chip.press(gpiochip.pin_line(22))
+
+
+def test_relay_switch():
+    relay = GPIOChipRelay('40', 'fake:relay')
+    relay.open()
+    try:
+        chip = gpiochip.open_chip(relay.chip_path)
+        line = chip.lines[gpiochip.pin_line(40)]
+        assert line.value == 0
+
+        relay.switch(1)
+        relay.switch(0)
+        assert [value for ts, value in line.history] == [1, 0]
+
+        with pytest.raises(OSError) as err:
+            chip.request_output(line.offset)
+        assert err.value.errno == errno.EBUSY
+        # Output line can't be pressed
+        with pytest.raises(ValueError):
+            chip.press(line.offset)
+    finally:
+        relay.close()
+    assert not relay.is_open()
+    assert line.offset not in chip.lines
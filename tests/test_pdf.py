@@ -0,0 +1,58 @@
+# encoding: utf-8
+
+""" Tests of PDF printer port.
+"""
+
+import threading
+
+import pytest
+
+pytest.importorskip('reportlab')
+
+from vjezd import ports
+from vjezd.ports.printer import render
+from vjezd.ports.printer.pdf import PDFPrinter
+
+
+DATA = {'width': 72, 'title': 'Parking', 'code': '0F0B73E290000001',
+    'issued_label': 'Issued', 'issued': '01.01.2014 12:00',
+    'expires_label': 'Expires', 'expires': '02.01.2014 12:00'}
+
+
+def test_render_pool_started_by_open_ports(tmp_path, monkeypatch):
+    printer = PDFPrinter(72, str(tmp_path / 'ticket.pdf'))
+    monkeypatch.setitem(ports.ports, ports.DEFAULT_LANE,
+        {'printer': printer})
+
+    assert not printer.is_open()
+    ports.open_ports(['printer'])
+    try:
+        assert printer.is_open()
+        assert printer.renderer.pool is not None
+    finally:
+        printer.close()
+    assert not printer.is_open()
+    assert printer.renderer.pool is None
+
+
+def test_concurrent_renders_of_cached_layout():
+    render.template.cache_clear()
+    documents = []
+    errors = []
+    def worker():
+        try:
+            for i in range(10):
+                documents.append(render.render_pdf(DATA))
+        except Exception as err:
+            errors.append(err)
+
+    workers = [threading.Thread(target=worker) for i in range(4)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+
+    assert errors == []
+    assert len(documents) == 40
+    assert all(d.startswith(b'%PDF') for d in documents)
+    assert render.template.cache_info().currsize == 1
@@ -0,0 +1,53 @@
+# encoding: utf-8
+
+""" Tests of print pipeline limit of jobs in flight.
+"""
+
+from vjezd.threads.pipeline import Job, Stage, Limit, chain
+from vjezd.threads.print import PrintThread
+
+
+def test_limit_released_once_passed_or_dropped():
+    limit = Limit(1)
+    first, second, last = chain(
+        Stage('first', lambda job: job),
+        Stage('second', lambda job: job if job.data else None),
+        Stage('last', lambda job: job))
+    second.releases = True
+
+    assert limit.acquire(0)
+    assert not limit.acquire(0)
+    job = Job(True)
+    job.limit = limit
+    first.put(job)
+    first.do()
+    # Still in the limited part
+    assert limit.jobs == 1
+    second.do()
+    assert limit.jobs == 0
+    assert last.inbox.qsize() == 1
+
+    # Dropped job leaves the limited part too
+    assert limit.acquire(0)
+    job = Job(False)
+    job.limit = limit
+    first.put(job)
+    first.do()
+    second.do()
+    assert limit.jobs == 0
+    assert last.inbox.qsize() == 1
+
+
+def test_presses_wait_in_event_queue():
+    thread = PrintThread()
+    for data in (1, 2, 3):
+        thread.reader.queue.put(data)
+
+    thread.do()
+    assert thread.stages[0].inbox.qsize() == 1
+    assert len(thread.reader.queue.events) == 2
+
+    # Pipeline is busy with the first press, others stay in event queue
+    thread.do()
+    assert thread.stages[0].inbox.qsize() == 1
+    assert len(thread.reader.queue.events) == 2
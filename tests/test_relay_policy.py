@@ -0,0 +1,87 @@
+# encoding: utf-8
+
+""" Tests of relay policies in scan mode.
+"""
+
+import time
+
+import pytest
+
+from vjezd.ports.relay import scheduler
+from vjezd.threads import scan
+from vjezd.threads.scan import ScanThread
+
+
+class FakeRelay(object):
+    """ Relay recording its switching.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.switched = []
+        self.handles = []
+        self.scheduler = None
+
+
+    def output(self):
+        return 'fake'
+
+
+    def switch(self, value):
+        self.switched.append(value)
+
+
+    def write(self, mode):
+        handle = self.scheduler.schedule(self, mode, 0, 0.5, self.policy)
+        self.handles.append(handle)
+        return handle
+
+
+@pytest.fixture
+def relay(request, monkeypatch):
+    relay = FakeRelay(request.param)
+    relay.scheduler = scheduler.RelayScheduler()
+    relay.scheduler.start()
+
+    monkeypatch.setattr(scan, 'port', lambda name, lane: relay)
+    monkeypatch.setattr(scan, 'admit_ticket', lambda code: code)
+    monkeypatch.setattr(scan, 'commit_ticket', lambda: None)
+    yield relay
+    relay.scheduler.stop()
+
+
+@pytest.mark.parametrize('relay', [scheduler.MERGE, scheduler.EXTEND],
+    indirect=True)
+def test_two_admissions_in_one_cycle(relay):
+    thread = ScanThread()
+
+    start = time.monotonic()
+    thread.scanner_callback('0F0B73E290000001')
+    # Let the cycle open so the extend policy has something to extend
+    time.sleep(0.1)
+    thread.scanner_callback('0F0B73E2A0000001')
+    elapsed = time.monotonic() - start
+
+    # Neither admission waited for the cycle to finish
+    assert thread.completed == 2
+    assert elapsed < 0.5
+    assert relay.handles[0] is relay.handles[1]
+    assert relay.handles[0].requests == 2
+
+    assert relay.handles[0].wait()
+    assert relay.switched == [1, 0]
+
+
+@pytest.mark.parametrize('relay', [scheduler.QUEUE], indirect=True)
+def test_queue_waits_for_cycle(relay):
+    thread = ScanThread()
+
+    start = time.monotonic()
+    thread.scanner_callback('0F0B73E290000001')
+    thread.scanner_callback('0F0B73E2A0000001')
+    elapsed = time.monotonic() - start
+
+    assert thread.completed == 2
+    assert elapsed >= 1.0
+    assert relay.handles[0] is not relay.handles[1]
+    assert relay.switched == [1, 0, 1, 0]
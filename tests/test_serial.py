@@ -0,0 +1,76 @@
+# encoding: utf-8
+
+""" Tests of serial scanner on pseudo terminal pair.
+"""
+
+import os
+import pty
+
+import pytest
+
+from vjezd.ports import PortReadError
+from vjezd.ports.scanner.serial import SerialScanner
+
+
+@pytest.fixture
+def line():
+    """ Open serial scanner on slave side of pseudo terminal.
+
+        :return:                    (scanner, master fd)
+    """
+    master, slave = pty.openpty()
+    scanner = SerialScanner(os.ttyname(slave), '9600', '\\r\\n', '16')
+    scanner.open()
+    os.close(slave)
+    yield scanner, master
+    scanner.close()
+    try:
+        os.close(master)
+    except OSError:
+        pass
+
+
+def read(scanner):
+    codes = []
+    scanner.read(codes.append)
+    return codes
+
+
+def test_code_split_across_reads(line):
+    scanner, master = line
+
+    os.write(master, b'0F0B73')
+    assert read(scanner) == []
+    os.write(master, b'E290000001\r')
+    assert read(scanner) == ['0F0B73E290000001']
+
+
+def test_several_codes_in_one_read(line):
+    scanner, master = line
+
+    os.write(master, b'ABCDE\r\nFGHIJ\r\nKL')
+    assert read(scanner) == ['ABCDE', 'FGHIJ']
+    os.write(master, b'MNO\n')
+    assert read(scanner) == ['KLMNO']
+
+
+def test_overlong_code_dropped(line):
+    scanner, master = line
+
+    # Buffer is full after the first read, rest is read by the second one
+    os.write(master, b'0123456789ABCDEF0123\r')
+    assert read(scanner) == []
+    assert read(scanner) == []
+    assert scanner.frames.dropped == 1
+    os.write(master, b'ABCDE\r')
+    assert read(scanner) == ['ABCDE']
+
+
+def test_hangup(line):
+    scanner, master = line
+
+    os.write(master, b'ABC')
+    assert read(scanner) == []
+    os.close(master)
+    with pytest.raises(PortReadError):
+        read(scanner)
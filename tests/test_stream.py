@@ -0,0 +1,99 @@
+# encoding: utf-8
+
+""" Tests of stream socket scanner.
+"""
+
+import time
+import socket
+
+import pytest
+
+from vjezd.ports.scanner.stream import StreamScanner
+
+
+def connect(scanner):
+    """ Connect new client to scanner.
+    """
+    if scanner.is_unix():
+        client = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    else:
+        client = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    client.connect(scanner.socket.getsockname())
+    return client
+
+
+def read(scanner, times=1):
+    """ Read scanner given number of times and get read codes.
+    """
+    codes = []
+    for i in range(times):
+        scanner.read(codes.append)
+    return codes
+
+
+@pytest.fixture(params=['unix', 'tcp'])
+def scanner(request, tmp_path):
+    if request.param == 'unix':
+        address = str(tmp_path / 'scanner.sock')
+    else:
+        address = '127.0.0.1:0'
+    scanner = StreamScanner(address, '2', '16')
+    scanner.open()
+    yield scanner
+    scanner.close()
+
+
+def test_code_split_across_receives(scanner):
+    client = connect(scanner)
+    read(scanner)
+
+    client.sendall(b'0F0B73')
+    assert read(scanner) == []
+    client.sendall(b'E290000001\nABCDE\nFG')
+    # Client is read once per wakeup, the longest code fills its buffer
+    assert read(scanner) == ['0F0B73E290000001']
+    assert read(scanner) == ['ABCDE']
+
+    # Code without newline is complete once client disconnects
+    client.close()
+    assert read(scanner) == ['FG']
+    assert scanner.clients == {}
+
+
+def test_overlong_code_dropped(scanner):
+    client = connect(scanner)
+    read(scanner)
+
+    client.sendall(b'0123456789ABCDEF0123\nABCDE\n')
+    time.sleep(0.05)
+    assert read(scanner, 2) == ['ABCDE']
+    fd = list(scanner.clients)[0]
+    assert scanner.clients[fd][1].dropped == 1
+    client.close()
+
+
+def test_client_limit(scanner):
+    clients = [connect(scanner) for i in range(3)]
+    time.sleep(0.05)
+    read(scanner)
+
+    assert len(scanner.clients) == 2
+    assert scanner.accepted == 2
+    assert scanner.refused == 1
+    # Refused client is disconnected
+    assert clients[2].recv(1) == b''
+
+    # Connected clients are still served
+    clients[1].sendall(b'ABCDE\n')
+    assert read(scanner) == ['ABCDE']
+
+    # Once client disconnects new one is accepted
+    clients[0].close()
+    read(scanner)
+    clients.append(connect(scanner))
+    read(scanner)
+    assert scanner.accepted == 3
+    assert len(scanner.clients) == 2
+
+    for client in clients:
+        client.close()
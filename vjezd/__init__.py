@@ -76,6 +76,10 @@ command line arguments overrides configuration file options.)
 -i, --id=ID                 device identifier
 -F, --factory               restore factory settings in DB tables
                             WARNING: This option may DELETE your settings
+    --profile-startup=FILENAME
+                            write startup phases profile to JSON file
+    --profile-detail        add cProfile statistics (FILENAME.prof) and
+                            imported modules to startup profile
 -v, --verbose               increase verbosity, can be used multiple times
 -h, --help                  show this short help message and exit
 -V, --version               show version information and exit
@@ -180,6 +184,14 @@ def signal_handler(signum, frame):
         logger.warning('Got SIGINT. Interrupting threads. Please wait')
         threads.set_exiting(threads.EXITING)
 
+    # SIGUSR1 dumps thread stacks, SIGUSR2 toggles sampling profiler
+    elif signum == signal.SIGUSR1:
+        from vjezd import debug
+        debug.dump_stacks()
+    elif signum == signal.SIGUSR2:
+        from vjezd import debug
+        debug.toggle_profiler()
+
 
 def main(args):
     """ Application entry point.
@@ -192,6 +204,8 @@ def main(args):
     opt_mode = None
     opt_id = None
     opt_factory = False
+    opt_profile = None
+    opt_profile_detail = False
 
     # Process command line arguments
     try:
@@ -202,6 +216,8 @@ def main(args):
                 'mode=',
                 'id=',
                 'factory',
+                'profile-startup=',
+                'profile-detail',
                 'verbose',
                 'help',
                 'version'])
@@ -223,6 +239,10 @@ def main(args):
             opt_id = arg
         elif opt in ('-F', '--factory'):
             opt_factory = True
+        elif opt == '--profile-startup':
+            opt_profile = arg
+        elif opt == '--profile-detail':
+            opt_profile_detail = True
         elif opt in ('-v', '--verbose'):
             # verbosity maps to logging log level numeric values (default: 40)
             if opt_loglevel is None:
@@ -238,36 +258,70 @@ def main(args):
 
     # Install signal handlers
     signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGUSR1, signal_handler)
+    signal.signal(signal.SIGUSR2, signal_handler)
+
+    # Profile startup phases (see vjezd.profiler)
+    from vjezd import profiler
+    if opt_profile:
+        profiler.start(opt_profile, opt_profile_detail)
 
     # Import our own modules here to avoid circular dependencies. Other modules
     # are imported after db.connect() as they use models
-    from vjezd import conffile
-    from vjezd import log
-    from vjezd import db
+    with profiler.phase('import'):
+        from vjezd import conffile
+        from vjezd import log
+        from vjezd import db
 
     # Read configuration
-    conffile.load(opt_conf)
+    with profiler.phase('conffile.load'):
+        conffile.load(opt_conf)
 
     # Initialize logging and DB (create session and Base class)
-    log.init(opt_logfile, opt_loglevel)
-    db.init(opt_factory)
+    with profiler.phase('log.init'):
+        log.init(opt_logfile, opt_loglevel)
+    with profiler.phase('db.init'):
+        db.init(opt_factory)
 
     # Import the rest of application modules
-    from vjezd import ports
-    from vjezd import device
+    with profiler.phase('import.app'):
+        from vjezd import ports
+        from vjezd import device
 
     # Initialize ports as we need them to decide which mode device operates
-    # in in case it is being set to auto.
-    ports.init()
+    # in in case it is being set to auto. Only ports required by requested
+    # mode are initialized.
+    with profiler.phase('ports.init'):
+        ports.init(port_names=device.get_port_names(opt_mode))
 
     # Initialize device
-    device.init(opt_id, opt_mode)
-
-    # Run threads
-    from vjezd import threads
+    # NOTE In process execution ports are opened by worker processes
+    execution = conffile.get('device', 'execution', 'threads').lower()
+    with profiler.phase('device.init'):
+        device.init(opt_id, opt_mode, open_ports=(execution != 'processes'))
+    if execution != 'processes':
+        with profiler.phase('device.warm_up'):
+            device.warm_up()
+
+    # NOTE Start phase is ended by profiler.finish() once the threads, worker
+    # processes or handlers are started
+    profiler.begin('start')
+
+    # Run threads, worker processes or asyncio core
     # NOTE This method also monitors threads
     try:
-        threads.run()
+        if execution == 'processes':
+            from vjezd import supervisor
+            supervisor.run({
+                'conf': opt_conf,
+                'logfile': opt_logfile,
+                'loglevel': opt_loglevel})
+        elif conffile.get('device', 'core', 'threads').lower() == 'asyncio':
+            from vjezd import aio
+            aio.run()
+        else:
+            from vjezd import threads
+            threads.run()
     except Exception as err:
         logger.critical('Error while running application: {}'.format(err))
         crit_exit(10, err)
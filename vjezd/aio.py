@@ -0,0 +1,405 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Asyncio Core
+    ************
+
+    Asyncio core is an optional replacement of :mod:`vjezd.threads`. Instead of
+    running a dedicated thread for each device mode it serves all ports from
+    a single asyncio event loop. It is enabled by ``core=asyncio`` option in
+    [device] section of the configuration file.
+
+    Ports are waited on using their file descriptor (see
+    :meth:`vjezd.ports.base.BasePort.fileno`) and then read using their own
+    read() method, so the existing read/callback contract keeps working
+    through :class:`PortAdapter`. Ports without a file descriptor (e.g. GPIO
+    button) are polled from executor. Read data are put into event queue of
+    the port (see :mod:`vjezd.ports.events`) from which they are consumed by
+    mode handler.
+
+    Mode handlers are coroutines. Relay cycles are scheduled by relay scheduler
+    and awaited, they are cancelled immediately once application is exiting.
+    Relay is always switched off when cycle is cancelled.
+
+    DB work is blocking and SQLAlchemy session is scoped to thread, so each mode
+    handler runs its DB work in its own single worker thread.
+"""
+
+import sys
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import logging
+logger = logging.getLogger(__name__)
+
+# Python version check
+if sys.version_info[:2] < (3,5):
+    raise ImportError('Asyncio core requires Python 3.5 or above')
+
+from vjezd import db
+from vjezd import codes
+from vjezd import threads
+from vjezd import profiler
+from vjezd.ports import port, PortWriteError
+from vjezd.ports.events import event_queue
+from vjezd.ports.relay import scheduler
+
+# Constants
+# Interval in seconds between reads of ports which have no file descriptor
+POLL_INTERVAL = 0.1
+
+
+class PortAdapter(object):
+    """ Adapter of BasePort read/callback contract to coroutine.
+    """
+
+    def __init__(self, port, loop):
+        """ Initialize adapter for given port instance.
+        """
+        self.port = port
+        self.loop = loop
+
+
+    async def read(self):
+        """ Wait for port data and read them.
+
+            :return:                list of data passed by port to callback
+        """
+        events = []
+        def callback(data=None):
+            events.append(data)
+
+        fd = self.port.fileno()
+        if fd is not None:
+            # Port read() will not block in select() once fd is readable
+            await self._readable(fd)
+            self.port.read(callback=callback)
+        else:
+            await self.loop.run_in_executor(None,
+                functools.partial(self.port.read, callback=callback))
+            if not events:
+                await asyncio.sleep(POLL_INTERVAL)
+
+        return events
+
+
+    def _readable(self, fd):
+        """ Get future which is done once given file descriptor is readable.
+        """
+        future = self.loop.create_future()
+
+        def ready():
+            if not future.done():
+                future.set_result(None)
+
+        self.loop.add_reader(fd, ready)
+        # NOTE Reader must be removed also when future gets cancelled
+        future.add_done_callback(lambda f: self.loop.remove_reader(fd))
+        return future
+
+
+class ModeHandler(object):
+    """ Abstract base class for mode handlers.
+
+        Handler reads its port in a loop into event queue and for each queued
+        event awaits the handle() coroutine.
+    """
+
+    #: Name of port which triggers handler
+    port_name = None
+
+
+    def __init__(self, loop, lane):
+        """ Initialize mode handler.
+
+            :param lane string:     lane operated by handler
+        """
+        self.name = '{}-{}'.format(self.__class__.__name__, lane)
+        self.loop = loop
+        self.lane = lane
+        self.adapter = PortAdapter(port(self.port_name, lane), loop)
+        self.queue = event_queue(self.port_name, lane)
+        self.ready = asyncio.Event()
+        # NOTE Single worker keeps all DB work in the same scoped session
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+    async def serve(self):
+        """ Serve port until application is exiting.
+        """
+        reader = self.loop.create_task(self.guard(self.read()))
+        try:
+            await self.guard(self.consume())
+        finally:
+            reader.cancel()
+
+
+    async def read(self):
+        """ Read port into event queue.
+        """
+        while not threads.exiting:
+            for data in await self.adapter.read():
+                self.queue.put(data)
+                self.ready.set()
+
+
+    async def consume(self):
+        """ Handle events from event queue.
+        """
+        while not threads.exiting:
+            # NOTE Queue is filled only from the loop so it never blocks here
+            event = self.queue.get(timeout=0)
+            if event:
+                logger.debug('Handling {}'.format(event))
+                await self.handle(event.data)
+                continue
+            await self.ready.wait()
+            self.ready.clear()
+
+
+    async def guard(self, coro):
+        """ Await coroutine and exit critically if it fails.
+        """
+        try:
+            await coro
+
+        except asyncio.CancelledError:
+            logger.debug('Handler {} is exiting'.format(self.name))
+
+        except Exception as err:
+            from vjezd import crit_exit
+            logger.critical('Handler {} has failed: {}'.format(self.name, err))
+            crit_exit(11, err, force_thread=True)
+
+
+    async def handle(self, data=None):
+        """ Abstract handler coroutine.
+        """
+        raise NotImplementedError
+
+
+    def call(self, func, *args):
+        """ Run blocking function in handler worker thread.
+
+            :return:                awaitable future of function result
+        """
+        return self.loop.run_in_executor(self.executor,
+            functools.partial(func, *args))
+
+
+    async def activate_relay(self, mode):
+        """ Activate relay in given mode.
+
+            Relay cycle is run by relay scheduler (see
+            :mod:`vjezd.ports.relay.scheduler`), which also makes sure cycles
+            of the lane relay don't overlap as in mode=both it is shared by
+            both handlers of the lane. Scheduler cancels all cycles once
+            exiting.
+
+            :return:                RelayHandle of scheduled cycle or None
+        """
+        return await self.call(port('relay', self.lane).write, mode)
+
+
+    async def wait_relay(self, handle):
+        """ Wait for the relay cycle.
+
+            Raises PortWriteError if the cycle failed.
+
+            :return:                True if cycle is done, False if it was
+                                    cancelled
+        """
+        future = self.loop.create_future()
+        def set_result(handle):
+            if not future.done():
+                future.set_result(handle)
+        def done(handle):
+            # NOTE Called from scheduler thread
+            if not self.loop.is_closed():
+                self.loop.call_soon_threadsafe(set_result, handle)
+        handle.add_done_callback(done)
+
+        await future
+        if handle.state == scheduler.FAILED:
+            raise PortWriteError('{}'.format(handle.error))
+        return handle.state == scheduler.DONE
+
+
+    def close(self):
+        """ Shutdown handler worker thread and summarize queue statistics.
+        """
+        self.executor.shutdown()
+        logger.info('Queue {} {}'.format(self.queue.name, self.queue))
+
+
+class PrintHandler(ModeHandler):
+    """ Print mode handler.
+    """
+
+    port_name = 'button'
+
+
+    async def handle(self, data=None):
+        """ Handle button press.
+
+            Runs the stages of print pipeline (see :mod:`vjezd.threads.print`)
+            one after another.
+        """
+        from vjezd.threads.pipeline import Job
+        from vjezd.threads.print import issue, render, print_ticket, \
+            commit_ticket
+
+        logger.info('Button pressed')
+
+        job = Job(data, self.lane)
+        for stage in (issue, render, print_ticket):
+            job = await self.call(stage, job)
+            if not job:
+                return
+
+        # Wait for the relay cycle so the ticket is not commited if it fails
+        # NOTE Ticket is already printed, so it is commited also when the
+        # cycle is cancelled. Other policies than queue need next tickets to
+        # join the open cycle, don't wait for it
+        try:
+            handle = await self.activate_relay('print')
+            if handle and handle.exclusive() and \
+                not await self.wait_relay(handle):
+                logger.warning('Relay cycle {} not finished'.format(handle))
+        except PortWriteError as err:
+            logger.error('Cannot write port {}!'.format(err))
+            return
+        except asyncio.CancelledError:
+            # NOTE Ticket is already printed, commit it also once exiting
+            await self.call(commit_ticket, job)
+            raise
+
+        await self.call(commit_ticket, job)
+        logger.info('Ticket issued {}'.format(job))
+
+
+class ScanHandler(ModeHandler):
+    """ Scan mode handler.
+    """
+
+    port_name = 'scanner'
+
+
+    async def handle(self, data=None):
+        """ Handle scanned code.
+
+            See :meth:`vjezd.threads.scan.ScanThread.scanner_callback`.
+        """
+        from vjezd.threads.scan import admit_ticket, commit_ticket
+
+        logger.info('Code scanned: {}'.format(data))
+
+        if not await self.call(admit_ticket, data):
+            return
+
+        # Activate relay
+        handle = None
+        try:
+            handle = await self.activate_relay('scan')
+        except PortWriteError as err:
+            # In case port write raised an exception rollback the session
+            logger.error('Cannot write port {}!'.format(err))
+            await self.call(db.session.remove)
+
+        await self.call(commit_ticket)
+
+        # Wait for the gate to close (queue relay policy only)
+        # NOTE Ticket is commited before, so cancelling the wait once exiting
+        # doesn't leave the ticket unused
+        try:
+            if handle and handle.exclusive():
+                await self.wait_relay(handle)
+        except PortWriteError as err:
+            logger.error('Cannot write port {}!'.format(err))
+
+
+def run():
+    """ Run handlers according to the device's own modes.
+
+        This method will create an event loop, serve ports of all device
+        operated modes in it and will be monitoring them until exiting.
+    """
+    # Avoid circular dependencies
+    from vjezd import crit_exit, exit
+    from vjezd import device as this_device
+
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    handlers = []
+    for lane, modes in sorted(this_device.lanes.items()):
+        if 'print' in modes:
+            handlers.append(PrintHandler(loop, lane))
+        if 'scan' in modes:
+            handlers.append(ScanHandler(loop, lane))
+
+    try:
+        loop.run_until_complete(_monitor(loop, handlers))
+    finally:
+        for h in handlers:
+            h.close()
+        loop.close()
+
+    # Exit depending on exiting state
+    if threads.exiting == threads.CRIT_EXITING:
+        crit_exit(10)
+    else:
+        exit()
+
+
+async def _monitor(loop, handlers):
+    """ Start handlers and wait until exiting, then cancel them.
+    """
+    tasks = []
+    for h in handlers:
+        logger.debug('Starting handler {}'.format(h.name))
+        tasks.append(loop.create_task(h.serve()))
+    profiler.finish()
+
+    # Wait for exiting. Wakeup pipe becomes readable once exiting flag is set
+    # (e.g. by signal handler or by failed handler).
+    exiting = loop.create_future()
+    def wakeup():
+        if not exiting.done():
+            exiting.set_result(None)
+    loop.add_reader(threads.wakeup_fd(), wakeup)
+    try:
+        await exiting
+    finally:
+        loop.remove_reader(threads.wakeup_fd())
+
+    logger.info('Cancelling all handlers')
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    logger.info('All handlers cancelled in {:.3f}s'.format(
+        threads.exiting_elapsed()))
+    codes.report()
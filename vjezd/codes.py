@@ -0,0 +1,166 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Code Format
+    ***********
+
+    Scanned codes are checked against format of codes produced by ticket code
+    generator (see :meth:`vjezd.models.Ticket.generate_code`) before the
+    ticket is looked up in database. Malformed input (unknown characters,
+    wrong length, noise read by scanner) is rejected without any database
+    access. Rejections are counted by reason and reported once exiting.
+
+    Generated codes are uppercase hexadecimal numbers of 16 digits: timestamp
+    part (9 digits), issuer (1 digit) and node part (6 digits). Codes
+    generated by earlier versions have 5 to 16 digits. Codes carry no check
+    digit.
+
+    Configuration Options
+    ---------------------
+    Format is configured in [codes] section of the configuration file:
+
+    ==============  ===========================================================
+    Option          Description
+    ==============  ===========================================================
+    check           Check format of scanned codes. Default is yes.
+    charset         Characters allowed in code. Default is ``0-9A-F``.
+    min_length      Minimal length of code. Default is 5.
+    max_length      Maximal length of code. Default is 16.
+    ==============  ===========================================================
+"""
+
+import re
+import threading
+import collections
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import conffile
+
+# Constants
+# Defaults of generated codes format
+CHARSET = '0-9A-F'
+MIN_LENGTH = 5
+MAX_LENGTH = 16
+# Rejection reasons
+REJECT_EMPTY = 'empty'
+REJECT_LENGTH = 'length'
+REJECT_CHARSET = 'charset'
+
+
+class CodeFormat(object):
+    """ Format of valid codes.
+
+        :ivar Counter rejected:     number of rejected codes by reason
+    """
+
+    def __init__(self, charset=CHARSET, min_length=MIN_LENGTH,
+        max_length=MAX_LENGTH):
+        self.charset = charset
+        self.min_length = min_length
+        self.max_length = max_length
+        self._match = re.compile('[{}]*'.format(charset)).fullmatch
+        self.rejected = collections.Counter()
+        self._lock = threading.Lock()
+
+
+    def check(self, code):
+        """ Check format of code.
+
+            Surrounding whitespace is stripped.
+
+            :param code string:     code to check
+            :return:                tuple of stripped code and rejection
+                                    reason (None if code is well-formed)
+        """
+        code = (code or '').strip()
+        reason = None
+        if not code:
+            reason = REJECT_EMPTY
+        elif not self.min_length <= len(code) <= self.max_length:
+            reason = REJECT_LENGTH
+        elif not self._match(code):
+            reason = REJECT_CHARSET
+
+        if reason:
+            with self._lock:
+                self.rejected[reason] += 1
+        return code, reason
+
+
+    def __str__(self):
+        return '[{}]{{{},{}}}'.format(self.charset, self.min_length,
+            self.max_length)
+
+
+# Format of codes or None if check is disabled
+_format = None
+_loaded = False
+
+
+def code_format():
+    """ Get format of codes configured in [codes] section.
+
+        :return:                    CodeFormat or None if check is disabled
+    """
+    global _format, _loaded
+
+    if not _loaded:
+        if conffile.getbool('codes', 'check', True):
+            _format = CodeFormat(
+                conffile.get('codes', 'charset', CHARSET),
+                conffile.getint('codes', 'min_length', MIN_LENGTH),
+                conffile.getint('codes', 'max_length', MAX_LENGTH))
+            logger.debug('Code format: {}'.format(_format))
+        _loaded = True
+    return _format
+
+
+def check(code):
+    """ Check format of scanned code.
+
+        :param code string:         scanned code
+        :return:                    stripped code if well-formed, otherwise
+                                    None
+    """
+    fmt = code_format()
+    if not fmt:
+        return code
+
+    code, reason = fmt.check(code)
+    if reason:
+        logger.warning('Rejected malformed code {!r}: {}'.format(code, reason))
+        return None
+    return code
+
+
+def report():
+    """ Report number of rejected codes by reason.
+    """
+    if _format and _format.rejected:
+        logger.info('Rejected codes: {}'.format(', '.join('{}:{}'.format(r, n)
+            for r, n in sorted(_format.rejected.items()))))
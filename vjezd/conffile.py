@@ -46,6 +46,17 @@
     mode            Operating mode. One of ``print``, ``scan``, ``both`` or
                     ``auto``. In ``auto`` mode device will try to detect
                     configured ports and choose mode according to them.
+    core            Event core. Either ``threads`` (default) which runs one
+                    thread per mode or ``asyncio`` which serves all ports from
+                    a single event loop (requires Python 3.5).
+    execution       Execution model. Either ``threads`` (default) which runs
+                    everything in one process or ``processes`` which runs each
+                    mode of each lane in its own worker process supervised by
+                    the main process which drives relays.
+    port_timeout    Time in seconds to create and test each port. Port which
+                    is not ready in time is skipped. Default is 10.
+    warmup          Warm up device (run hot queries, render throwaway ticket,
+                    etc.) before accepting events. Default is yes.
     ==============  ===========================================================
 
     Section [ports]
@@ -72,6 +83,66 @@
     ==============  ===========================================================
 
     Available classes and their configurations can be found
+
+    Section [debug]
+    ---------------
+    Contains configuration of sampling profiler toggled by SIGUSR2 (see
+    :mod:`vjezd.debug`): ``profile_dir``, ``interval`` and ``window``.
+
+    Section [lane:name]
+    -------------------
+    Device can drive more than one gate. Ports of each additional gate (lane)
+    are configured in a separate section named ``lane:`` followed by lane
+    name. Section has same format as section [ports] which configures the
+    default lane. Additionaly lane section can contain ``mode`` option which
+    overrides device mode for the lane:
+
+    .. code-block::
+
+        [lane:north]
+        mode=scan
+        relay=gpio:16
+        scanner=evdev:/dev/input/event1
+
+    Section [events]
+    ----------------
+    Contains policies of event queues of input ports (see
+    :mod:`vjezd.ports.events`). Option name is port name and value has format
+    ``policy:arg``, where policy is one of ``drop-oldest``, ``coalesce``
+    (default), ``latest`` or ``expire``:
+
+    .. code-block::
+
+        [events]
+        button=coalesce
+        scanner=expire:5
+
+    Section [codes]
+    ---------------
+    Contains format of scanned codes checked before any database access (see
+    :mod:`vjezd.codes`): ``check``, ``charset``, ``min_length`` and
+    ``max_length``.
+
+    Section [evdev]
+    ---------------
+    Contains configuration of event devices shared by ``evdev`` ports (see
+    :mod:`vjezd.ports.evdevice`). Option ``grab`` grabs devices exclusively
+    so keystrokes do not reach console. Default is no, it is ignored with
+    ``processes`` execution.
+
+    Section [render]
+    ----------------
+    Contains configuration of ticket renderer used by ``pdf`` and ``cups``
+    printers (see :mod:`vjezd.ports.printer.render`):
+
+    ==============  ===========================================================
+    Option          Description
+    ==============  ===========================================================
+    workers         Number of render worker processes. If 0 tickets are
+                    rendered in-process. Default is 1.
+    timeout         Timeout in seconds of rendering in worker process before
+                    falling back to in-process rendering. Default is 10.
+    ==============  ===========================================================
 """
 
 import os
@@ -0,0 +1,201 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Debugging Hooks
+    ***************
+
+    Running application can be inspected using signals:
+
+    * SIGUSR1: dump stacks of all threads to log
+    * SIGUSR2: start sampling profiler, second SIGUSR2 stops it. Profiler is
+      also stopped after configured time window. Sampled stacks are written
+      in collapsed format (one ``frame;frame;frame count`` line per stack)
+      which can be turned into flame graph by e.g. flamegraph.pl.
+
+    Nothing runs until signal is received, sampling profiler runs in its own
+    thread only while it is enabled.
+
+    Configuration Options
+    ---------------------
+    Debugging hooks are configured in [debug] section of the configuration
+    file:
+
+    ==============  ===========================================================
+    Option          Description
+    ==============  ===========================================================
+    profile_dir     Directory where profiles are written. Default is system
+                    temporary directory.
+    interval        Sampling interval in seconds. Default is 0.01.
+    window          Maximum time in seconds profiler runs. Default is 60.
+    ==============  ===========================================================
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import traceback
+from collections import Counter
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import APP_NAME
+from vjezd import conffile
+
+# Constants
+# Default sampling interval in seconds
+INTERVAL = 0.01
+# Default maximum time in seconds profiler runs
+WINDOW = 60
+
+_sampler = None
+_lock = threading.Lock()
+
+
+def dump_stacks():
+    """ Dump stacks of all threads to log.
+    """
+    # NOTE Signal handler must not log directly as it could interrupt logging
+    # in main thread, so stacks are dumped from a new thread
+    t = threading.Thread(target=_dump_stacks, name='StackDump')
+    t.daemon = True
+    t.start()
+
+
+def _dump_stacks():
+    """ Log stacks of all threads except the dumping one.
+    """
+    names = {t.ident: t.name for t in threading.enumerate()}
+    me = threading.get_ident()
+    for ident, frame in sys._current_frames().items():
+        if ident == me:
+            continue
+        logger.warning('Thread {} ({}):\n{}'.format(names.get(ident, '?'),
+            ident, ''.join(traceback.format_stack(frame))))
+
+
+def toggle_profiler():
+    """ Start sampling profiler or stop it if it is running.
+    """
+    global _sampler
+
+    with _lock:
+        if _sampler and _sampler.is_alive():
+            _sampler.stop()
+            _sampler = None
+        else:
+            _sampler = Sampler()
+            _sampler.start()
+
+
+class Sampler(threading.Thread):
+    """ Sampling profiler thread.
+
+        Sampler periodically takes stacks of all other threads and counts
+        them. Once stopped (or once time window passes) counted stacks are
+        written to file in collapsed format.
+    """
+
+    def __init__(self, interval=None, window=None):
+        """ Initialize sampler.
+
+            :param interval float:  sampling interval in seconds
+            :param window float:    maximum time in seconds sampler runs
+        """
+        threading.Thread.__init__(self)
+        self.name = self.__class__.__name__
+        self.daemon = True
+
+        if interval is None:
+            interval = conffile.getfloat('debug', 'interval', INTERVAL)
+        if window is None:
+            window = conffile.getfloat('debug', 'window', WINDOW)
+
+        self.interval = interval
+        self.window = window
+        self.stacks = Counter()
+        self.samples = 0
+        self._halt = threading.Event()
+
+
+    def stop(self):
+        """ Stop sampler. Profile is written by sampler thread.
+        """
+        self._halt.set()
+
+
+    def run(self):
+        """ Sample stacks until stopped or time window passes.
+        """
+        logger.warning('Sampling profiler started for at most {}s'.format(
+            self.window))
+        start = time.monotonic()
+        me = threading.get_ident()
+        while not self._halt.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                self.stacks[self.collapse(names.get(ident, '?'), frame)] += 1
+            self.samples += 1
+            if time.monotonic() - start >= self.window:
+                break
+
+        self.write(time.monotonic() - start)
+
+
+    @staticmethod
+    def collapse(name, frame):
+        """ Get collapsed stack of frame (outermost frame first).
+        """
+        frames = []
+        while frame:
+            code = frame.f_code
+            frames.append('{}:{}:{}'.format(
+                os.path.basename(code.co_filename), code.co_name,
+                frame.f_lineno))
+            frame = frame.f_back
+        frames.append(name)
+        return ';'.join(reversed(frames))
+
+
+    def write(self, elapsed):
+        """ Write collapsed stacks to profile file.
+        """
+        path = os.path.join(
+            conffile.get('debug', 'profile_dir', tempfile.gettempdir()),
+            '{}-{}-{}.collapsed'.format(APP_NAME, os.getpid(),
+                time.strftime('%Y%m%d%H%M%S')))
+        try:
+            with open(path, 'w') as f:
+                for stack, count in self.stacks.most_common():
+                    f.write('{} {}\n'.format(stack, count))
+            logger.warning('Sampling profiler stopped after {:.1f}s, {} '
+                'samples written to: {}'.format(elapsed, self.samples, path))
+        except OSError as err:
+            logger.error('Cannot write profile: {}!'.format(err))
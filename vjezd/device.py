@@ -34,6 +34,7 @@
     ---------------------
 """
 
+import time
 import socket
 import re
 import logging
@@ -48,8 +49,20 @@ from vjezd import db
 from vjezd.models import Device
 
 
-def init(_id=None, mode=None):
+# Dependency matrix for each mode.
+dep = {
+    'both': ['button', 'relay', 'printer', 'scanner'],
+    'print': ['button', 'relay', 'printer'],
+    'scan': ['scanner', 'relay']}
+
+
+def init(_id=None, mode=None, open_ports=True):
     """ Initialize the device.
+
+        :param _id string:          device identifier override
+        :param mode string:         device mode override
+        :param open_ports bool:     open ports of all lanes (ports are opened
+                                    by workers in process execution)
     """
     logger.debug('Initializing device')
 
@@ -66,7 +79,51 @@ def init(_id=None, mode=None):
         logger.critical('Device identifier must be up to 8 a-zA-Z0-9 chars!')
         crit_exit(3)
 
+    # Determine mode of each lane
+    global lanes
+    lanes = {}
+    for lane, lane_mode in sorted(get_requested_modes(mode).items()):
+        lane_mode = get_lane_mode(lane_mode, lane)
+
+        # Store real modes of lane
+        if lane_mode == 'both':
+            lanes[lane] = ('print', 'scan')
+        else:
+            lanes[lane] = (lane_mode,)
+
+        # Open the lane ports
+        if open_ports:
+            ports.open_ports(dep[lane_mode], lane)
+
+    # Store real modes of all lanes
+    global modes
+    modes = tuple(m for m in ('print', 'scan')
+        if any(m in lanes[l] for l in lanes))
+    mode = 'both' if len(modes) > 1 else modes[0]
+
+    # Update device tracking table
+    try:
+        Device.last_seen(id, mode, get_ip())
+
+        db.session.commit()
+        db.session.remove()
+    except Exception as err:
+        logger.critical('Unable update device record: {}!'.format(err))
+        crit_exit(3, err)
+
+    logger.debug('Device {} initialized.'.format(id))
+
+def get_requested_modes(mode=None):
+    """ Get mode requested for each lane.
+
+        Mode can be set in lane section, command line argument overrides it.
+        Requested mode can be auto, see get_lane_mode().
+
+        :param mode string:         device mode override
+        :return:                    dict of requested mode by lane
+    """
     # Determine device mode. In case of misspeled or wrong
+    forced = bool(mode)
     if not mode:
         mode = conffile.get('device', 'mode', 'auto')
         if mode.lower() not in ('scan', 'print', 'both', 'auto'):
@@ -74,59 +131,119 @@ def init(_id=None, mode=None):
                 'Unknown mode {}. Falling back to auto'.format(mode))
             mode='auto'
 
-    # Dependency matrix for each mode.
-    dep = {
-        'both': ['button', 'relay', 'printer', 'scanner'],
-        'print': ['button', 'relay', 'printer'],
-        'scan': ['scanner', 'relay']}
+    modes = {}
+    for lane in ports.lanes():
+        modes[lane] = mode
+        if not forced:
+            modes[lane] = conffile.get(ports.lane_section(lane), 'mode', mode)
+    return modes
+
+
+def get_port_names(mode=None):
+    """ Get names of ports required by requested mode of each lane.
+
+        Lane in auto mode requires all ports as its mode is detected from
+        available ports.
+
+        :param mode string:         device mode override
+        :return:                    dict of port names by lane
+    """
+    return {lane: dep.get(m.lower(), ports.PORT_NAMES)
+        for lane, m in get_requested_modes(mode).items()}
+
 
-    # If mode is auto, decide device mode based on ports.
+def warm_up():
+    """ Warm up device before accepting events.
+
+        First ticket after start would otherwise pay for the first DB
+        connection checkout and SQL compilation, reportlab imports and font
+        loading, etc. Warm-up runs hot queries and lets each open port of
+        device lanes warm up (see :meth:`vjezd.ports.base.BasePort.warm_up`).
+        It can be disabled by ``warmup=no`` in [device] section.
+    """
+    from vjezd.models import Config, Ticket, RegularHours, ExceptionHours
+
+    if not conffile.getbool('device', 'warmup', True):
+        return
+
+    logger.info('Warming up device')
+    start = time.time()
+
+    try:
+        RegularHours.check()
+        ExceptionHours.check()
+        Config.get_int('validity')
+        Ticket.query.filter(Ticket.code == '').first()
+    except SQLAlchemyError as err:
+        logger.warning('Warm-up queries failed: {}'.format(err))
+    finally:
+        db.session.remove()
+    logger.debug('Queries warmed up in {:.3f}s'.format(time.time() - start))
+
+    for lane, lane_modes in sorted(lanes.items()):
+        for port_name in ports.PORT_NAMES:
+            p = ports.port(port_name, lane)
+            if not p or not p.is_open() or \
+                not any(port_name in dep[m] for m in lane_modes):
+                continue
+
+            t = time.time()
+            try:
+                p.warm_up()
+            except Exception as err:
+                logger.warning('Warm-up of port {} failed: {}'.format(
+                    port_name, err))
+            finally:
+                db.session.remove()
+            logger.debug('Port {} of lane {} warmed up in {:.3f}s'.format(
+                port_name, lane, time.time() - t))
+
+    logger.info('Device warmed up in {:.3f}s'.format(time.time() - start))
+
+
+def get_lane_mode(mode, lane):
+    """ Get mode of given lane.
+
+        If mode is auto, decide lane mode based on its ports. Otherwise verify
+        requirements and fail in case they're not met.
+    """
+    mode = mode.lower()
+    if mode not in ('scan', 'print', 'both', 'auto'):
+        logger.warning('Unknown mode {} of lane {}. Falling back to auto'.format(
+            mode, lane))
+        mode = 'auto'
+
+    # If mode is auto, decide lane mode based on ports.
     if mode == 'auto':
-        logger.debug('Trying to auto-detect mode based on available ports')
+        logger.debug('Trying to auto-detect mode of lane {} based on '
+            'available ports'.format(lane))
 
         # Make dep dict doesn't guarantee order, sort by lenght of dep list.
         for d in sorted(dep.keys(), key=lambda k: len(dep[k]), reverse=True):
-            if ports.has_ports(dep[d]):
+            if ports.has_ports(dep[d], lane):
                 mode = d
                 break
 
         if mode == 'auto':
-            logger.critical('No suitable mode for device ports!')
+            logger.critical('No suitable mode for lane {} ports!'.format(lane))
             crit_exit(3)
 
-        logger.info('Auto-detected mode: {}'.format(mode))
+        logger.info('Auto-detected mode of lane {}: {}'.format(lane, mode))
 
     # If mode is given (print, scan, both) just verify requirements and fail in
     # case they're not met.
     else:
-        if not ports.has_ports(dep[mode]):
-            logger.critical('Mode {} requires ports: {}; missing: {}'.format(
-                mode, dep[mode], [p for p in dep[mode] if not ports.port(p)]))
+        if not ports.has_ports(dep[mode], lane):
+            logger.critical(
+                'Mode {} of lane {} requires ports: {}; missing: {}'.format(
+                mode, lane, dep[mode],
+                [p for p in dep[mode] if not ports.port(p, lane)]))
             crit_exit(3)
 
-        logger.info('Device mode: {}'.format(mode))
+        logger.info('Lane {} mode: {}'.format(lane, mode))
 
-    # Store real modes
-    global modes
-    if mode == 'both':
-        modes = ('print', 'scan')
-    else:
-        modes = (mode)
-
-    # Open the device ports
-    ports.open_ports(dep[mode])
-
-    # Update device tracking table
-    try:
-        Device.last_seen(id, mode, get_ip())
+    return mode
 
-        db.session.commit()
-        db.session.remove()
-    except Exception as err:
-        logger.critical('Unable update device record: {}!'.format(err))
-        crit_exit(3, err)
-
-    logger.debug('Device {} initialized.'.format(id))
 
 def finalize():
     """ Finalize device.
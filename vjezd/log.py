@@ -72,11 +72,12 @@ FORMAT='%(asctime)s %(levelname)s [%(name)s %(threadName)s ' \
 DATEFMT='%Y-%m-%d %H:%M:%S'
 
 
-def init(path=None, level=None):
+def init(path=None, level=None, append=None):
     """ Initialize the logging.
 
         :param string path:     Path to the log file
         :param string level:    Desired log level
+        :param bool append:     Append to log file, if None use configuration
     """
     logger.debug('Initializing logging')
 
@@ -93,7 +94,9 @@ def init(path=None, level=None):
         dests = [path]
 
     mode = 'w'
-    if not path and conffile.getbool('log', 'append', False):
+    if append is None:
+        append = not path and conffile.getbool('log', 'append', False)
+    if append:
         mode = 'a'
 
     # Create handlers for all destinations
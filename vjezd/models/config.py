@@ -55,6 +55,13 @@ class Config(Base):
         relay_print_delay           relay activation delay in print (seconds)
         relay_scan_delay            relay activation delay in scan (seconds)
         ticket_title                Title on ticket (e.g. device name)
+        relay_policy                policy for overlapping relay requests
+                                    (queue, merge or extend)
+        relay_extend_max            maximum time relay is kept open by extend
+                                    policy (seconds)
+        relay_priority              mode which relay cycles are queued ahead
+                                    of waiting cycles of other mode (print or
+                                    scan, unset for FIFO order)
         ==========================  ===========================================
 
 
@@ -27,6 +27,7 @@
 
 
 import uuid
+import threading
 from datetime import datetime, timedelta
 import logging
 logger = logging.getLogger(__name__)
@@ -38,6 +39,14 @@ from sqlalchemy.sql import func
 
 from vjezd.db import Base
 
+# Constants
+# Epoch of code timestamp
+CODE_EPOCH = datetime(2014, 1, 1)
+
+# Timestamp of the last generated code
+_code_ts = 0
+_code_lock = threading.Lock()
+
 
 class Ticket(Base):
     """ **Tickets** table contains all generated tickets including invalid,
@@ -72,6 +81,10 @@ class Ticket(Base):
     cancelled   = Column(DateTime())
 
 
+    #: Number of process issuing tickets (0-15)
+    issuer = 0
+
+
     def __init__(self):
         """ Initialize new ticket with given validity period.
         """
@@ -114,16 +127,29 @@ class Ticket(Base):
 
     @staticmethod
     def generate_code():
-        """ Generate unique code based on timestamp and node part of UUID.
+        """ Generate unique code based on timestamp, issuer and node part of
+            UUID.
+
+            Timestamp is in tenths of second since CODE_EPOCH and it never
+            repeats within process, so tickets issued in the same tenth of
+            second (e.g. by print pipeline or by lanes) get different codes.
+            Issuer distinguishes processes of the same device issuing tickets
+            (see :mod:`vjezd.supervisor`).
         """
+        global _code_ts
+
         # Node is MAC address of interface, cut first three bytes which are
         # organization an probably same for all devices
-        node = hex(int(uuid.uuid1().fields[5])).split('x')[1][6:]
-        # NOTE This is naive but sufficient for current application
-        ts = hex(int(datetime.now().strftime('%S%M%H%y%m%d'))).split('x')[1]
+        node = '{:012X}'.format(uuid.uuid1().fields[5])[6:]
+
+        ts = int((datetime.now() - CODE_EPOCH).total_seconds() * 10)
+        with _code_lock:
+            _code_ts = max(ts, _code_ts + 1)
+            ts = _code_ts
 
-        # Final code, add separator and make it uppercase
-        code = '{}{}'.format(ts,node).upper()
+        # Final code, uppercase hexadecimal of fixed length
+        # NOTE Keep format in sync with defaults in vjezd.codes
+        code = '{:09X}{:X}{}'.format(ts, Ticket.issuer % 16, node)
         return code
 
 
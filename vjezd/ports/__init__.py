@@ -41,12 +41,21 @@
     base class. These implementations have to be thread-safe as in 'both' mode
     both printer and scanner might want access them.
 
+    Lanes
+    -----
+    Device can drive more than one gate (lane). Each lane has its own set of
+    ports configured either in [ports] section (default lane) or in
+    [lane:name] section. Lanes are independent on each other, each lane has
+    its own mode threads and relay.
+
     Configuration Options
     ---------------------
 """
 
 import sys
 import os
+import time
+import threading
 import importlib
 import logging
 logger = logging.getLogger(__name__)
@@ -67,41 +76,190 @@ class PortReadError(Exception):
     pass
 
 
-# Stores port instances. Each port class can have only one instance.
+# Constants
+# Name of default lane configured in [ports] section
+DEFAULT_LANE = 'default'
+# Prefix of lane configuration section
+LANE_PREFIX = 'lane:'
+# Port names
+PORT_NAMES = ('button', 'relay', 'printer', 'scanner')
+# Default time in seconds to create and test port
+PORT_TIMEOUT = 10
+
+# Stores port instances per lane. Each port class can have only one instance
+# in lane.
 ports = {}
 
 
-def init():
-    """ Initialize ports.
+def init(only_lanes=None, port_names=None):
+    """ Initialize ports of all lanes.
+
+        Ports are created and tested concurrently, each in its own thread
+        (see :class:`PortBuilder`). Port which is not created and tested in
+        time given by ``port_timeout`` option in [device] section is skipped.
+
+        :param only_lanes list:     initialize only ports of given lanes
+        :param port_names dict:     names of ports required in each lane, if
+                                    lane is not present all ports are created
     """
     global ports
 
     logger.debug('Initializing ports')
-    for port_name in ('button', 'relay', 'printer', 'scanner'):
-        ports[port_name] = port_factory(port_name)
+    start = time.monotonic()
+    timeout = conffile.getfloat('device', 'port_timeout', PORT_TIMEOUT)
+
+    builders = []
+    for lane in only_lanes or lanes():
+        logger.debug('Initializing ports of lane {}'.format(lane))
+        ports[lane] = {}
+        required = (port_names or {}).get(lane, PORT_NAMES)
+        for port_name in PORT_NAMES:
+            ports[lane][port_name] = None
+            if port_name not in required:
+                logger.info('Port {} of lane {} is not required by mode. '
+                    'Skipping.'.format(port_name, lane))
+                continue
+            b = PortBuilder(port_name, lane)
+            b.start()
+            builders.append(b)
+
+    deadline = start + timeout
+    for b in builders:
+        b.join(max(deadline - time.monotonic(), 0))
+        if b.is_alive():
+            logger.error('Port {} of lane {} timed out after {}s!'.format(
+                b.port_name, b.lane, timeout))
+        elif b.error:
+            # Fail when cannot import configured module
+            logger.critical('Cannot import port {} module: {}'.format(
+                b.port_name, b.error))
+            crit_exit(4, b.error)
+        elif b.test_error:
+            logger.error('Port {} test failed: {}!'.format(b.port_name,
+                b.test_error))
+        else:
+            ports[b.lane][b.port_name] = b.inst
+
+    # Report time spent in initialization of each port
+    for b in builders:
+        logger.info('Port {} of lane {} {} build:{} test:{}'.format(
+            b.port_name, b.lane, b.status(),
+            '{:.3f}s'.format(b.built) if b.built is not None else '-',
+            '{:.3f}s'.format(b.tested) if b.tested is not None else '-'))
+    logger.info('Ports initialized in {:.3f}s'.format(
+        time.monotonic() - start))
+
+
+class PortBuilder(threading.Thread):
+    """ Thread creating and testing one port.
+
+        :ivar inst:                 port instance or None
+        :ivar Exception error:      error raised while creating port
+        :ivar Exception test_error: error raised while testing port
+        :ivar float built:          time spent creating port
+        :ivar float tested:         time spent testing port
+    """
+
+    def __init__(self, port_name, lane=DEFAULT_LANE):
+        """ Initialize port builder.
+        """
+        threading.Thread.__init__(self)
+        self.name = 'PortBuilder-{}-{}'.format(lane, port_name)
+        # NOTE Port stuck in test must not block application exit
+        self.daemon = True
+
+        self.port_name = port_name
+        self.lane = lane
+        self.inst = None
+        self.error = None
+        self.test_error = None
+        self.built = None
+        self.tested = None
+
+
+    def run(self):
+        """ Create and test port.
+        """
+        start = time.monotonic()
+        try:
+            self.inst = port_factory(self.port_name, self.lane)
+        except Exception as err:
+            self.error = err
+            return
+        finally:
+            self.built = time.monotonic() - start
+
+        if not self.inst:
+            return
+
+        start = time.monotonic()
+        try:
+            self.inst.test()
+        except Exception as err:
+            self.test_error = err
+        finally:
+            self.tested = time.monotonic() - start
+
+
+    def status(self):
+        """ Get status of port initialization.
+        """
+        if self.is_alive():
+            return 'timed out'
+        if self.error or self.test_error:
+            return 'failed'
+        if not self.inst:
+            return 'skipped'
+        return 'created'
 
 
-def port(port_name):
-    """ Return instance of port if exists, otherwise None.
+def lanes():
+    """ Get names of configured lanes.
+
+        Default lane is configured in [ports] section and other lanes in
+        [lane:name] sections.
     """
-    return ports.get(port_name)
+    names = []
+    if conffile.conffile.has_section('ports'):
+        names.append(DEFAULT_LANE)
+    for section in conffile.conffile.sections():
+        if section.startswith(LANE_PREFIX):
+            names.append(section[len(LANE_PREFIX):])
+
+    # NOTE Without any port configuration there's still default lane so auto
+    # mode fails with meaningful message
+    return names or [DEFAULT_LANE]
 
 
-def has_ports(port_names):
-    """ Checks if all ports passed as port_names list are available.
+def lane_section(lane):
+    """ Get name of configuration section of given lane.
+    """
+    if lane == DEFAULT_LANE:
+        return 'ports'
+    return '{}{}'.format(LANE_PREFIX, lane)
+
+
+def port(port_name, lane=DEFAULT_LANE):
+    """ Return instance of port in given lane if exists, otherwise None.
+    """
+    return ports.get(lane, {}).get(port_name)
+
+
+def has_ports(port_names, lane=DEFAULT_LANE):
+    """ Checks if all ports passed as port_names list are available in lane.
     """
     for port_name in port_names:
-        if not port(port_name):
+        if not port(port_name, lane):
             return False
     return True
 
 
-def open_ports(port_names):
-    """ Open specified ports.
+def open_ports(port_names, lane=DEFAULT_LANE):
+    """ Open specified ports of lane.
     """
-    logger.debug('Opening ports: {}'.format(port_names))
+    logger.debug('Opening ports of lane {}: {}'.format(lane, port_names))
     for port_name in port_names:
-        p = port(port_name)
+        p = port(port_name, lane)
         try:
             if p and not p.is_open():
                 p.open()
@@ -111,24 +269,34 @@ def open_ports(port_names):
 
 
 def close_ports():
-    """ Close all open ports.
+    """ Close all open ports of all lanes.
     """
     logger.debug('Closing ports')
-    for p in ports:
-        if ports[p] and ports[p].is_open():
-            ports[p].close()
+
+    # Stop relay cycles before relay ports get closed
+    from vjezd.ports.relay import scheduler
+    scheduler.shutdown()
+
+    for lane in ports:
+        for p in ports[lane].values():
+            if p and p.is_open():
+                p.close()
 
 
-def port_factory(port_name):
+def port_factory(port_name, lane=DEFAULT_LANE):
     """ Get port instance.
 
         Port class is imported from vjezd.ports.<port>.<port_class> and
-        expected to be assigned to port_class variable.
+        expected to be assigned to port_class variable. Port is not tested.
+        Any exception raised while importing port module or creating port
+        instance is propagated to caller.
+
+        :return:                    port instance or None if not configured
     """
-    logger.info('Trying to create port {}'.format(port_name))
+    logger.info('Trying to create port {} of lane {}'.format(port_name, lane))
 
     # Read the port configuration
-    conf = conffile.get('ports', port_name, None)
+    conf = conffile.get(lane_section(lane), port_name, None)
     klass = None
     if conf:
         # Split class and configuration apart
@@ -149,16 +317,9 @@ def port_factory(port_name):
     path = 'vjezd.ports.{}.{}'.format(port_name, klass)
     logger.debug('Importing port module from: {}'.format(path))
 
-    inst = None
-    try:
-        module = importlib.import_module('{}'.format(path))
-        obj = getattr(module, 'port_class')
-        inst = obj(*args)
-    except Exception as err:
-        # Fail when cannot import configured module
-        logger.critical('Cannot import port {} module: {}'.format(
-            port_name, err))
-        crit_exit(4, err)
+    module = importlib.import_module('{}'.format(path))
+    obj = getattr(module, 'port_class')
+    inst = obj(*args)
 
     # Instance must be of BasePort type
     from vjezd.ports.base import BasePort
@@ -167,11 +328,4 @@ def port_factory(port_name):
             port_name))
         return None
 
-    try:
-        inst.test()
-    except Exception as err:
-        logger.error('Port {} test failed: {}!'.format(port_name, err))
-        return None
-
-    logger.info('Port {} created'.format(port_name))
     return inst
@@ -72,6 +72,28 @@ class BasePort(object):
         return True
 
 
+    def warm_up(self):
+        """ Warm up port.
+
+            Implementation of this method should do any slow work which would
+            otherwise delay handling of the first event (e.g. load fonts,
+            connect to remote device). It is called once the port is open.
+        """
+        pass
+
+
+    def fileno(self):
+        """ Get file descriptor of port.
+
+            Implementation of this method should return file descriptor which
+            becomes readable once port has data to be read. It is used by
+            asyncio core (see :mod:`vjezd.aio`) to wait for port without
+            polling. If port has no such descriptor None is returned and read()
+            will be polled instead.
+        """
+        return None
+
+
     def read(self, callback=None):
         """ Read data from port.
 
@@ -83,8 +105,9 @@ class BasePort(object):
             Method shouldn't be blocking for infinite amount of time as that
             effectively disables its thread from being interrupted. Method will
             be invoked from thread in interruptible infinte loop. Good practice
-            is to block for moderate amount of time (1-2 seconds) so the thread
-            can be interrupted.
+            is to block using :func:`vjezd.threads.select` which is interrupted
+            immediately once exiting or for moderate amount of time (1-2
+            seconds) so the thread can be interrupted.
 
             Callback method has a signature callback(data=None).
         """
@@ -99,15 +122,3 @@ class BasePort(object):
             inside the method itself.
         """
         logger.warning('Method write() not handled by port!')
-
-
-    def flush(self):
-        """ Flush port.
-
-            Implementation of this method will remove all events from queue (if
-            any) ignoring them.
-
-            This is usefull for quiet periods (e.g. button pushing while relay
-            is activated.
-        """
-        pass
@@ -29,14 +29,14 @@
     ===================
 """
 
-import select
 import logging
 logger = logging.getLogger(__name__)
 
-from evdev import InputDevice, ecodes
-from evdev.events import KeyEvent
+from evdev import ecodes
 
+from vjezd import threads
 from vjezd.ports.base import BasePort
+from vjezd.ports import evdevice
 
 
 class EvdevButton(BasePort):
@@ -46,6 +46,10 @@ class EvdevButton(BasePort):
         device special file representing keyboard. A given keycode acts as
         a button.
 
+        Event device is shared with other evdev ports using the same device
+        (see :mod:`vjezd.ports.evdevice`) and only trigger key events are
+        passed to the port.
+
         Configuration
         -------------
         Port accepts the following positional arguments:
@@ -63,6 +67,7 @@ class EvdevButton(BasePort):
         self.path = '/dev/input/event0'
         self.scancode = 57
         self.device = None
+        self.events = None
 
         if len(args) >= 1:
             self.path = args[0]
@@ -85,9 +90,9 @@ class EvdevButton(BasePort):
         """ Open event device.
         """
         logger.info('Opening evdev {}'.format(self.path))
-        self.device = InputDevice(self.path)
-        if self.device:
-            logger.info('Evdev button found: {}'.format(self.device))
+        self.device = evdevice.open_device(self.path)
+        self.events = self.device.subscribe(types=(ecodes.EV_KEY,),
+            codes=(self.scancode,))
 
 
     def close(self):
@@ -95,18 +100,27 @@ class EvdevButton(BasePort):
         """
         logger.info('Closing evdev {}'.format(self.path))
         if self.is_open():
-            self.device.close()
+            self.events.close()
+            self.events = None
             self.device = None
 
 
     def is_open(self):
         """ Check whether the event device is open.
         """
-        if self.device:
+        if self.events:
             return True
         return False
 
 
+    def fileno(self):
+        """ Get file descriptor of event device.
+        """
+        if self.is_open():
+            return self.events.fileno()
+        return None
+
+
     def read(self, callback=None):
         """ Read event device.
 
@@ -114,11 +128,15 @@ class EvdevButton(BasePort):
             argument is run.
         """
         # In order to avoid bare polling a select() is called on device
-        # descriptor with a reasonable timeout so the thread can be
-        # interrupted. In case of event read we will read and process it.
-        r, w, x = select.select([self.device.fileno()], [], [], 1)
-        if r:
-            e = self.device.read_one()
+        # descriptor with a reasonable timeout. Select is interrupted
+        # immediately once exiting. In case of event read we will read and
+        # process all of them.
+        r = threads.select([self.events], 1)
+        if not r:
+            return
+
+        # Read all pending events at once
+        for e in self.events.read():
             if e.type == ecodes.EV_KEY \
                 and e.value == 0 and e.code == self.scancode:
                     logger.debug('Trigger: {}'.format(e))
@@ -127,18 +145,5 @@ class EvdevButton(BasePort):
                         callback()
 
 
-    def flush(self):
-        """ Flush event device.
-        """
-
-        logger.debug('Flushing port')
-        while True:
-            r, w, x = select.select([self.device.fd], [], [], 0)
-            if r:
-                self.device.read_one()
-            else:
-                break
-
-
 # Export port_class for port_factory()
 port_class = EvdevButton
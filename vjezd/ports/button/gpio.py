@@ -29,11 +29,13 @@
     ===========
 """
 
+import queue
 import logging
 logger = logging.getLogger(__name__)
 
 import RPi.GPIO as GPIO
 
+from vjezd import threads
 from vjezd.ports import gpio_registry
 from vjezd.ports.base import BasePort
 
@@ -47,7 +49,8 @@ class GPIOButton(BasePort):
     """ Raspberry Pi GPIO button port.
 
         Raspberry Pi GPIO button reads button presses on a GPIO (general
-        purpose input/output) pin.
+        purpose input/output) pin. Rising edges are detected by RPi.GPIO
+        callback which puts them into queue, read() blocks on the queue.
 
         Configuration
         -------------
@@ -64,6 +67,7 @@ class GPIOButton(BasePort):
         """
         self.pin = 22
         self._is_open = False
+        self._edges = queue.Queue()
 
         if len(args) >= 1:
             self.pin = int(args[0])
@@ -89,7 +93,11 @@ class GPIOButton(BasePort):
         gpio_registry.register(self)
 
         GPIO.setup(self.pin, GPIO.IN)
-        GPIO.add_event_detect(self.pin, GPIO.RISING, bouncetime=1000)
+        GPIO.add_event_detect(self.pin, GPIO.RISING, callback=self._edge,
+            bouncetime=1000)
+
+        # Wake up read() once exiting
+        threads.on_exiting(self._wakeup)
 
         self._is_open = True
 
@@ -113,23 +121,33 @@ class GPIOButton(BasePort):
     def read(self, callback=None):
         """ Read GPIO.
 
-            If button event is triggered a function assigned to callback
-            argument is run.
+            Wait for rising edge at most 1 second (or until exiting). If
+            button event is triggered a function assigned to callback argument
+            is run.
         """
-        if GPIO.event_detected(self.pin):
-            logger.debug('Trigger: RISING EDGE')
-            # Execute callback function
-            if callback and hasattr(callback, '__call__'):
-                callback()
+        try:
+            edge = self._edges.get(timeout=1)
+        except queue.Empty:
+            return
+        if edge is None:
+            return
+
+        logger.debug('Trigger: RISING EDGE')
+        # Execute callback function
+        if callback and hasattr(callback, '__call__'):
+            callback()
 
 
-    def flush(self):
-        """ Flush event device.
+    def _edge(self, channel):
+        """ RPi.GPIO callback of rising edge. Called from RPi.GPIO thread.
         """
+        self._edges.put(channel)
 
-        logger.debug('Flushing port')
-        while GPIO.event_detected(self.pin):
-            pass
+
+    def _wakeup(self):
+        """ Wake up read() waiting for edge.
+        """
+        self._edges.put(None)
 
 
 # Export port_class for port_factory()
@@ -0,0 +1,153 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" GPIO Character Device Button
+    ============================
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import threads
+from vjezd.ports.base import BasePort
+from vjezd.ports import gpiochip
+
+
+class GPIOChipButton(BasePort):
+    """ GPIO character device button port.
+
+        Button reads rising edges of GPIO line using Linux GPIO character
+        device (see :mod:`vjezd.ports.gpiochip`). Edges are debounced using
+        kernel timestamps.
+
+        Configuration
+        -------------
+        Port accepts the following positional arguments:
+        #. pin - GPIO physical pin number (without P1_ prefix)
+        #. chip - path to GPIO character device (default /dev/gpiochip0) or
+           ``fake`` for fake in-memory chip
+        #. bouncetime - minimal time between presses in miliseconds (default
+           1000)
+
+        Full configuration line of gpiochip button is:
+        ``button=gpiochip:pin,chip,bouncetime``
+    """
+
+    def __init__(self, *args):
+        """ Initialize port configuration.
+        """
+        self.pin = 22
+        self.chip_path = gpiochip.DEFAULT_CHIP
+        self.bouncetime = 1000
+        self.chip = None
+        self.line = None
+        self._last = None
+
+        if len(args) >= 1:
+            self.pin = int(args[0])
+        if len(args) >= 2 and args[1]:
+            self.chip_path = args[1]
+        if len(args) >= 3:
+            self.bouncetime = int(args[2])
+
+        self.offset = gpiochip.pin_line(self.pin)
+
+        logger.info('GPIO chip button using: {} pin={} line={}'.format(
+            self.chip_path, self.pin, self.offset))
+
+
+    def test(self):
+        """ Test if GPIO chip can be opened.
+        """
+        gpiochip.open_chip(self.chip_path).close()
+
+
+    def open(self):
+        """ Request GPIO line.
+        """
+        logger.info('Opening GPIO chip {} line {}'.format(self.chip_path,
+            self.offset))
+        self.chip = gpiochip.open_chip(self.chip_path)
+        self.line = self.chip.request_events(self.offset, rising=True)
+
+
+    def close(self):
+        """ Release GPIO line.
+        """
+        logger.info('Closing GPIO chip {} line {}'.format(self.chip_path,
+            self.offset))
+        if self.is_open():
+            self.line.close()
+            self.line = None
+            self.chip.close()
+            self.chip = None
+
+
+    def is_open(self):
+        """ Check whether the GPIO line is requested.
+        """
+        if self.line:
+            return True
+        return False
+
+
+    def fileno(self):
+        """ Get file descriptor of GPIO line events.
+        """
+        if self.is_open():
+            return self.line.fileno()
+        return None
+
+
+    def read(self, callback=None):
+        """ Read GPIO line events.
+
+            Wait for edge at most 1 second (or until exiting). For each
+            rising edge which is not a bounce a function assigned to callback
+            argument is run.
+        """
+        r = threads.select([self.line.fileno()], 1)
+        if not r:
+            return
+
+        for timestamp, event in self.line.read_events():
+            if event != gpiochip.RISING:
+                continue
+            if self._last is not None and \
+                timestamp - self._last < self.bouncetime * 1000000:
+                logger.debug('Bounce: {}'.format(timestamp))
+                continue
+            self._last = timestamp
+
+            logger.debug('Trigger: RISING EDGE {}'.format(timestamp))
+            # Execute callback function
+            if callback and hasattr(callback, '__call__'):
+                callback()
+
+
+# Export port_class for port_factory()
+port_class = GPIOChipButton
@@ -0,0 +1,352 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Shared Event Device
+    ===================
+
+    Event device (``/dev/input/eventN``) is opened once per process no matter
+    how many ports use it (e.g. button and scanner on the same keyboard in
+    ``both`` mode). Single reader thread reads all pending events of the
+    device and fans them out to subscribers (logical ports) which want them.
+    Each subscriber has its own pipe file descriptor so it can be waited on
+    with select or added to asyncio loop as any other port.
+
+    Events not wanted by any subscriber are filtered out by the kernel using
+    EVIOCSMASK (Linux 4.4+) so they never wake up the reader. On older kernels
+    events are filtered in the reader.
+
+    Configuration Options
+    ---------------------
+    Shared event devices are configured in [evdev] section of the
+    configuration file:
+
+    ==============  ===========================================================
+    Option          Description
+    ==============  ===========================================================
+    grab            Grab event devices exclusively (EVIOCGRAB) so keystrokes
+                    do not reach console or other readers. Default is no.
+                    NOTE Grabbed device delivers events to the grabbing
+                    process only, so grab is ignored with ``processes``
+                    execution where each worker opens the device on its own.
+    ==============  ===========================================================
+"""
+
+import os
+import fcntl
+import ctypes
+import threading
+import collections
+import logging
+logger = logging.getLogger(__name__)
+
+from evdev import InputDevice, ecodes as e
+
+from vjezd import threads
+from vjezd import conffile
+
+# Constants
+# Default of grab option
+GRAB = False
+
+
+class _InputMask(ctypes.Structure):
+    _fields_ = [
+        ('type', ctypes.c_uint32),
+        ('codes_size', ctypes.c_uint32),
+        ('codes_ptr', ctypes.c_uint64)]
+
+
+# _IOW('E', 0x93, struct input_mask)
+_EVIOCSMASK = (1 << 30) | (ctypes.sizeof(_InputMask) << 16) \
+    | (ord('E') << 8) | 0x93
+
+
+class Subscriber(object):
+    """ Subscription of logical port to events of shared event device.
+
+        :ivar set types:            wanted event types (None for all)
+        :ivar set codes:            wanted codes of EV_KEY events (None for
+                                    all)
+    """
+
+    def __init__(self, device, types=None, codes=None):
+        self.device = device
+        self.types = frozenset(types) if types is not None else None
+        self.codes = frozenset(codes) if codes is not None else None
+        self._events = collections.deque()
+        self._r, self._w = os.pipe()
+        os.set_blocking(self._r, False)
+        os.set_blocking(self._w, False)
+
+
+    def wants(self, event):
+        """ Check whether subscriber wants given event.
+        """
+        if self.types is not None and event.type not in self.types:
+            return False
+        if self.codes is not None and event.type == e.EV_KEY \
+            and event.code not in self.codes:
+            return False
+        return True
+
+
+    def put(self, events):
+        """ Queue events and wake up subscriber.
+        """
+        self._events.extend(events)
+        try:
+            os.write(self._w, b'\0')
+        except BlockingIOError:
+            # Pipe is full, subscriber will be woken up anyway
+            pass
+
+
+    def read(self):
+        """ Get all queued events.
+
+            :return:                list of events (possibly empty)
+        """
+        try:
+            os.read(self._r, 4096)
+        except BlockingIOError:
+            pass
+        events = []
+        while self._events:
+            events.append(self._events.popleft())
+        return events
+
+
+    def fileno(self):
+        """ Get file descriptor which becomes readable once events are queued.
+        """
+        return self._r
+
+
+    def close(self):
+        """ Cancel subscription. Device is closed once no subscriber is left.
+        """
+        if self._r is None:
+            return
+        self.device._unsubscribe(self)
+        os.close(self._r)
+        os.close(self._w)
+        self._r = self._w = None
+
+
+class SharedDevice(object):
+    """ Event device shared by subscribers and read by single thread.
+
+        :ivar string path:          path to event device special file
+        :ivar InputDevice device:   opened event device
+        :ivar bool grabbed:         whether device is grabbed exclusively
+    """
+
+    def __init__(self, path, grab=False):
+        self.path = path
+        self.device = InputDevice(path)
+        self.grabbed = False
+        self.subscribers = []
+        self._lock = threading.Lock()
+        self._ctl_r, self._ctl_w = os.pipe()
+        self._thread = None
+        self._reads = 0
+        self._events = 0
+        self._dropped = 0
+
+        if grab:
+            try:
+                self.device.grab()
+                self.grabbed = True
+            except OSError as err:
+                logger.warning('Cannot grab evdev {}: {}'.format(path, err))
+
+        logger.info('Evdev shared device opened: {} grab={}'.format(
+            self.device, self.grabbed))
+
+
+    def subscribe(self, types=None, codes=None):
+        """ Subscribe to events of device.
+
+            :param types:           wanted event types (None for all)
+            :param codes:           wanted codes of EV_KEY events (None for
+                                    all)
+            :return:                Subscriber
+        """
+        subscriber = Subscriber(self, types, codes)
+        with self._lock:
+            self.subscribers.append(subscriber)
+            self._set_mask()
+            if not self._thread:
+                self._thread = threading.Thread(target=self._run, daemon=True,
+                    name='Evdev {}'.format(os.path.basename(self.path)))
+                self._thread.start()
+        return subscriber
+
+
+    def _unsubscribe(self, subscriber):
+        with self._lock:
+            if subscriber in self.subscribers:
+                self.subscribers.remove(subscriber)
+            if self.subscribers:
+                self._set_mask()
+                return
+        _release(self)
+
+
+    def _set_mask(self):
+        """ Set kernel event mask to union of events wanted by subscribers.
+
+            NOTE Called with lock held.
+        """
+        types = set()
+        codes = set()
+        for s in self.subscribers:
+            if s.types is None:
+                # Subscriber wants all events
+                types = codes = None
+                break
+            types |= s.types
+            if e.EV_KEY in s.types:
+                if s.codes is None:
+                    codes = None
+                elif codes is not None:
+                    codes |= s.codes
+
+        try:
+            # NOTE Mask of type 0 is the mask of event types, not of EV_SYN
+            # codes. EV_SYN events (incl. SYN_DROPPED reporting overruns) are
+            # never filtered by kernel
+            self._mask(0, range(e.EV_MAX + 1) if types is None else types)
+            self._mask(e.EV_KEY, range(e.KEY_MAX + 1) if codes is None
+                else codes)
+        except OSError as err:
+            # Kernel older than 4.4, events are filtered in reader
+            logger.debug('Cannot set evdev {} event mask: {}'.format(
+                self.path, err))
+
+
+    def _mask(self, type, codes):
+        """ Set kernel mask of given event type to given codes (or mask of
+            event types if type is 0).
+        """
+        bitmap = bytearray((e.KEY_MAX // 8) + 1)
+        for code in codes:
+            bitmap[code // 8] |= 1 << (code % 8)
+        buf = (ctypes.c_char * len(bitmap)).from_buffer(bitmap)
+        mask = _InputMask(type, len(bitmap), ctypes.addressof(buf))
+        fcntl.ioctl(self.device.fd, _EVIOCSMASK, mask)
+
+
+    def _run(self):
+        """ Read all pending events of device and dispatch them to
+            subscribers.
+        """
+        fd = self.device.fd
+        while not threads.exiting:
+            r = threads.select([fd, self._ctl_r], 1)
+            if self._ctl_r in r or threads.exiting:
+                break
+            if not r:
+                continue
+
+            try:
+                events = list(self.device.read())
+            except BlockingIOError:
+                continue
+            except OSError as err:
+                logger.error('Reading evdev {} failed: {}'.format(
+                    self.path, err))
+                break
+            self._reads += 1
+            self._events += len(events)
+
+            with self._lock:
+                subscribers = list(self.subscribers)
+            for event in events:
+                if event.type == e.EV_SYN and event.code == e.SYN_DROPPED:
+                    self._dropped += 1
+                    logger.warning('Evdev {} dropped events'.format(
+                        self.path))
+            for s in subscribers:
+                wanted = [event for event in events if s.wants(event)]
+                if wanted:
+                    s.put(wanted)
+
+
+    def close(self):
+        """ Stop reader thread and close device.
+        """
+        os.write(self._ctl_w, b'\0')
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join()
+        logger.info('Evdev {} read {} events in {} reads ({} drops)'.format(
+            self.path, self._events, self._reads, self._dropped))
+        if self.grabbed:
+            try:
+                self.device.ungrab()
+            except OSError:
+                pass
+        self.device.close()
+        os.close(self._ctl_r)
+        os.close(self._ctl_w)
+
+
+_devices = {}
+_lock = threading.Lock()
+
+
+def open_device(path):
+    """ Open shared event device.
+
+        If device is already opened by other port the same instance is
+        returned.
+
+        :param path string:         path to event device special file
+        :return:                    SharedDevice
+    """
+    path = os.path.realpath(path)
+    with _lock:
+        if path not in _devices:
+            grab = conffile.getbool('evdev', 'grab', GRAB)
+            if grab and conffile.get('device', 'execution',
+                'threads').lower() == 'processes':
+                logger.warning('Evdev grab is not supported with processes'
+                    ' execution. Ignoring')
+                grab = False
+            _devices[path] = SharedDevice(path, grab)
+        return _devices[path]
+
+
+def _release(device):
+    with _lock:
+        if _devices.get(device.path) is not device:
+            return
+        with device._lock:
+            if device.subscribers:
+                return
+        del _devices[device.path]
+    device.close()
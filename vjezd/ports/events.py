@@ -0,0 +1,277 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Port Event Queue
+    ================
+
+    Input ports (button, scanner) are read by a dedicated reader which puts
+    read data into a bounded event queue. Mode handlers consume events from
+    the queue, so events which arrive while handler is busy (e.g. while relay
+    is open) are not lost and are processed according to queue policy:
+
+    * drop-oldest:N: queue keeps at most N events, once full the oldest event
+      is dropped (default N is 16)
+    * coalesce:N: event equal to already queued event is merged into it,
+      otherwise same as drop-oldest:N
+    * latest:N: once handler gets to the queue only latest N events are kept
+      and older ones are dropped (default N is 1)
+    * expire:T: events older than T seconds are dropped once handler gets to
+      the queue (default T is 5)
+
+    Each event carries time it was read at and count of events merged into
+    it. Queue counts received, consumed, dropped, merged and expired events.
+
+    Configuration Options
+    ---------------------
+    Policy of each input port is configured in [events] section of the
+    configuration file as ``port=policy:arg``, e.g.:
+
+    .. code-block::
+
+        [events]
+        button=coalesce
+        scanner=expire:5
+
+    Default policy is ``coalesce``.
+"""
+
+import time
+import threading
+from collections import deque
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import conffile
+from vjezd import threads
+
+# Constants
+# Policies
+DROP_OLDEST = 'drop-oldest'
+COALESCE = 'coalesce'
+LATEST = 'latest'
+EXPIRE = 'expire'
+# Policy list
+policies = (DROP_OLDEST, COALESCE, LATEST, EXPIRE)
+# Default policy
+DEFAULT_POLICY = COALESCE
+
+# Default maximum number of events in queue
+QUEUE_SIZE = 16
+# Default number of events kept by latest policy
+KEEP = 1
+# Default time in seconds after which events expire in expire policy
+EXPIRE_AFTER = 5.0
+
+
+class Event(object):
+    """ Event read from port.
+
+        :ivar data:                 data passed by port to callback
+        :ivar float time:           timestamp of reading event
+        :ivar int count:            number of events merged into this event
+    """
+
+    def __init__(self, data=None):
+        """ Initialize event with port data.
+        """
+        self.data = data
+        self.time = time.time()
+        self.count = 1
+
+
+    def age(self):
+        """ Get age of event in seconds.
+        """
+        return time.time() - self.time
+
+
+    def __repr__(self):
+        """ String representation of object.
+        """
+        return '[Event age:{:.3f}s count:{} {}]'.format(self.age(),
+            self.count, self.data)
+
+
+class EventQueue(object):
+    """ Bounded event queue with policy.
+    """
+
+    def __init__(self, name, policy=DEFAULT_POLICY, arg=None):
+        """ Initialize event queue.
+
+            :param name string:     name of queue (for logging)
+            :param policy string:   queue policy
+            :param arg:             policy argument (see module docstring)
+        """
+        if policy not in policies:
+            logger.warning('Unknown event queue {} policy {}. Falling back'
+                ' to {}'.format(name, policy, DEFAULT_POLICY))
+            policy = DEFAULT_POLICY
+            arg = None
+
+        self.name = name
+        self.policy = policy
+        self.size = QUEUE_SIZE
+        self.keep = KEEP
+        self.expire = EXPIRE_AFTER
+        try:
+            if policy in (DROP_OLDEST, COALESCE) and arg is not None:
+                self.size = max(int(arg), 1)
+            elif policy == LATEST and arg is not None:
+                self.keep = max(int(arg), 1)
+            elif policy == EXPIRE and arg is not None:
+                self.expire = float(arg)
+        except ValueError:
+            logger.warning('Invalid event queue {} policy argument {}.'
+                ' Falling back to default'.format(name, arg))
+
+        self.events = deque()
+        self.stats = {'received': 0, 'consumed': 0, 'dropped': 0,
+            'merged': 0, 'expired': 0}
+        self._cond = threading.Condition()
+
+        # Wake up consumers waiting for event once exiting
+        threads.on_exiting(self._wakeup)
+
+
+    def put(self, data=None):
+        """ Put port data into queue.
+
+            Method has signature of port read callback and can be passed
+            directly to :meth:`vjezd.ports.base.BasePort.read`.
+        """
+        with self._cond:
+            self.stats['received'] += 1
+
+            if self.policy == COALESCE:
+                for event in self.events:
+                    if event.data == data:
+                        event.count += 1
+                        self.stats['merged'] += 1
+                        logger.debug('Queue {} merged {}'.format(self.name,
+                            event))
+                        return
+
+            if len(self.events) >= self.size:
+                event = self.events.popleft()
+                self.stats['dropped'] += 1
+                logger.warning('Queue {} is full. Dropped {}'.format(
+                    self.name, event))
+
+            self.events.append(Event(data))
+            self._cond.notify()
+
+
+    def get(self, timeout=None):
+        """ Get the oldest event from queue.
+
+            Wait for event at most given amount of time. Waiting is
+            interrupted once exiting.
+
+            :param timeout float:   time in seconds to wait for event, if 0
+                                    method does not block, if None it blocks
+                                    until exiting
+            :return:                Event or None if queue is empty
+        """
+        deadline = None
+        if timeout is not None:
+            deadline = time.time() + timeout
+
+        with self._cond:
+            while True:
+                self._trim()
+                if self.events:
+                    self.stats['consumed'] += 1
+                    return self.events.popleft()
+
+                if threads.exiting:
+                    return None
+                if deadline is None:
+                    self._cond.wait()
+                else:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        return None
+                    self._cond.wait(remaining)
+
+
+    def __len__(self):
+        """ Get number of events in queue.
+        """
+        with self._cond:
+            return len(self.events)
+
+
+    def __repr__(self):
+        """ String representation of object.
+        """
+        return ' '.join('{}:{}'.format(k, self.stats[k]) for k in
+            ('received', 'consumed', 'dropped', 'merged', 'expired'))
+
+
+    def _trim(self):
+        """ Drop events according to policy before handing event to consumer.
+        """
+        if self.policy == LATEST:
+            while len(self.events) > self.keep:
+                event = self.events.popleft()
+                self.stats['dropped'] += 1
+                logger.info('Queue {} dropped {}'.format(self.name, event))
+
+        elif self.policy == EXPIRE:
+            while self.events and self.events[0].age() > self.expire:
+                event = self.events.popleft()
+                self.stats['expired'] += 1
+                logger.info('Queue {} expired {}'.format(self.name, event))
+
+
+    def _wakeup(self):
+        """ Wake up consumers waiting for event.
+        """
+        with self._cond:
+            self._cond.notify_all()
+
+
+def event_queue(port_name, lane=None):
+    """ Create event queue of given input port configured in [events] section.
+
+        :param port_name string:    name of input port
+        :param lane string:         lane of port
+        :return:                    EventQueue instance
+    """
+    from vjezd.ports import DEFAULT_LANE
+
+    lane = lane or DEFAULT_LANE
+    config = conffile.get('events', port_name, DEFAULT_POLICY)
+    policy, _, arg = config.partition(':')
+
+    name = port_name
+    if lane != DEFAULT_LANE:
+        name = '{}-{}'.format(port_name, lane)
+
+    logger.debug('Event queue {} using policy: {}'.format(name, config))
+    return EventQueue(name, policy.strip(), arg.strip() or None)
@@ -0,0 +1,126 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Framing
+    =======
+
+    Receive buffer of byte stream ports (serial line, stream sockets) which
+    splits received bytes into codes by terminator characters. Buffer is
+    preallocated and received into directly (``readv``, ``recv_into``) so no
+    intermediate objects are created per read.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+# Constants
+# Default maximum length of frame (length of ticket code column)
+MAX_LENGTH = 240
+
+
+class FrameBuffer(object):
+    """ Receive buffer splitting bytes into frames.
+
+        Incomplete frame is kept for the next read. Frames longer than
+        maximum length are dropped up to the next terminator.
+
+        :ivar int dropped:          number of dropped frames
+    """
+
+    def __init__(self, terminators=b'\n', max_length=MAX_LENGTH):
+        self.terminators = terminators
+        self.max_length = max_length
+        # Buffer has room for the longest frame and its terminator
+        self.buffer = bytearray(max_length + 1)
+        self.view = memoryview(self.buffer)
+        self.length = 0
+        self.overflow = False
+        self.dropped = 0
+
+
+    def free(self):
+        """ Get writable view of free part of buffer to receive into.
+        """
+        return self.view[self.length:]
+
+
+    def feed(self, n):
+        """ Account bytes received into free part of buffer.
+
+            :param n int:           number of bytes received
+            :return:                list of complete frames (strings)
+        """
+        frames = []
+        buf = self.buffer
+        start = 0
+        end = self.length + n
+        for i in range(self.length, end):
+            if buf[i] in self.terminators:
+                self._frame(start, i, frames)
+                start = i + 1
+
+        # Keep incomplete frame at the buffer start. Once the buffer is full
+        # the frame is too long.
+        if start:
+            buf[:end - start] = buf[start:end]
+        self.length = end - start
+        if self.length > self.max_length:
+            self.overflow = True
+            self.length = 0
+        return frames
+
+
+    def flush(self):
+        """ Get incomplete frame (e.g. once the stream is closed).
+
+            :return:                list of frames (empty or one string)
+        """
+        frames = []
+        self._frame(0, self.length, frames)
+        self.length = 0
+        return frames
+
+
+    def clear(self):
+        """ Discard incomplete frame.
+        """
+        self.length = 0
+        self.overflow = False
+
+
+    def _frame(self, start, end, frames):
+        overflow = self.overflow
+        self.overflow = False
+        if overflow or end - start > self.max_length:
+            self.dropped += 1
+            logger.warning('Dropped frame longer than {}'.format(
+                self.max_length))
+            return
+        if start == end:
+            # Empty frame, e.g. CR of CRLF
+            return
+        frames.append(self.buffer[start:end].decode('ascii', 'replace'))
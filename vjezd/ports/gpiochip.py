@@ -0,0 +1,399 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Linux GPIO Character Device
+    ===========================
+
+    Thin wrapper of Linux GPIO character device uAPI (``/dev/gpiochipN``).
+    Unlike RPi.GPIO it has no global state: each requested line is owned by
+    its own file descriptor and it is released once the descriptor is closed.
+    Edge events are read from file descriptor which can be waited on using
+    select/epoll and carry kernel timestamps.
+
+    Module also provides fake in-memory chip (:class:`FakeChip`) with the same
+    interface, so the ports using GPIO character device can be tested and
+    benchmarked on any Linux box. Fake chip is used if chip path is ``fake``
+    (or ``fake:name`` to have multiple chips).
+
+    Lines are addressed by physical pin number of Raspberry Pi P1 header (as
+    in RPi.GPIO ports) which is mapped to line offset of gpiochip0.
+"""
+
+import os
+import time
+import errno
+import fcntl
+import ctypes
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+# Constants
+# Default chip
+DEFAULT_CHIP = '/dev/gpiochip0'
+# Prefix of fake chip path
+FAKE_PREFIX = 'fake'
+# Mapping of P1 header physical pin to line offset (BCM number), pins 27-40
+# are available on 40-pin header only
+PIN_LINES = {
+    3: 2, 5: 3, 7: 4, 8: 14, 10: 15, 11: 17, 12: 18, 13: 27, 15: 22, 16: 23,
+    18: 24, 19: 10, 21: 9, 22: 25, 23: 11, 24: 8, 26: 7,
+    27: 0, 28: 1, 29: 5, 31: 6, 32: 12, 33: 13, 35: 19, 36: 16, 37: 26,
+    38: 20, 40: 21}
+# Consumer label of requested lines
+LABEL = b'vjezd'
+
+# uAPI v1 (linux/gpio.h)
+_HANDLES_MAX = 64
+_REQUEST_INPUT = 1 << 0
+_REQUEST_OUTPUT = 1 << 1
+_EVENT_RISING_EDGE = 1 << 0
+_EVENT_FALLING_EDGE = 1 << 1
+# Event identifiers
+RISING = 0x01
+FALLING = 0x02
+
+
+class _HandleRequest(ctypes.Structure):
+    _fields_ = [
+        ('lineoffsets', ctypes.c_uint32 * _HANDLES_MAX),
+        ('flags', ctypes.c_uint32),
+        ('default_values', ctypes.c_uint8 * _HANDLES_MAX),
+        ('consumer_label', ctypes.c_char * 32),
+        ('lines', ctypes.c_uint32),
+        ('fd', ctypes.c_int)]
+
+
+class _HandleData(ctypes.Structure):
+    _fields_ = [
+        ('values', ctypes.c_uint8 * _HANDLES_MAX)]
+
+
+class _EventRequest(ctypes.Structure):
+    _fields_ = [
+        ('lineoffset', ctypes.c_uint32),
+        ('handleflags', ctypes.c_uint32),
+        ('eventflags', ctypes.c_uint32),
+        ('consumer_label', ctypes.c_char * 32),
+        ('fd', ctypes.c_int)]
+
+
+class _EventData(ctypes.Structure):
+    _fields_ = [
+        ('timestamp', ctypes.c_uint64),
+        ('id', ctypes.c_uint32)]
+
+
+def _iowr(nr, struct):
+    """ Get _IOWR ioctl request number of GPIO character device.
+    """
+    return (3 << 30) | (ctypes.sizeof(struct) << 16) | (0xB4 << 8) | nr
+
+
+_GET_LINEHANDLE = _iowr(0x03, _HandleRequest)
+_GET_LINEEVENT = _iowr(0x04, _EventRequest)
+_GET_LINE_VALUES = _iowr(0x08, _HandleData)
+_SET_LINE_VALUES = _iowr(0x09, _HandleData)
+
+
+def pin_line(pin):
+    """ Get line offset of physical pin.
+
+        :param pin integer:         P1 header physical pin number
+        :return:                    line offset
+    """
+    if pin not in PIN_LINES:
+        raise ValueError('Invalid GPIO pin {}'.format(pin))
+    return PIN_LINES[pin]
+
+
+class Line(object):
+    """ Requested GPIO line.
+
+        Line is owned until closed.
+    """
+
+    def __init__(self, fd, offset):
+        """ Initialize line with file descriptor returned by chip.
+        """
+        self.fd = fd
+        self.offset = offset
+
+
+    def fileno(self):
+        """ Get file descriptor of line.
+        """
+        return self.fd
+
+
+    def close(self):
+        """ Release line.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class OutputLine(Line):
+    """ Output line.
+    """
+
+    def set(self, value):
+        """ Set line value.
+
+            :param value integer:   1 for high, 0 for low
+        """
+        data = _HandleData()
+        data.values[0] = 1 if value else 0
+        fcntl.ioctl(self.fd, _SET_LINE_VALUES, data)
+
+
+class EventLine(Line):
+    """ Input line with edge events.
+
+        File descriptor becomes readable once edge event is queued in kernel.
+    """
+
+    def get(self):
+        """ Get line value.
+        """
+        data = _HandleData()
+        fcntl.ioctl(self.fd, _GET_LINE_VALUES, data)
+        return data.values[0]
+
+
+    def read_events(self):
+        """ Read all queued edge events. Blocks if there are none.
+
+            :return:                list of (timestamp, event id) tuples,
+                                    timestamp is in nanoseconds
+        """
+        size = ctypes.sizeof(_EventData)
+        buf = os.read(self.fd, size * 16)
+        events = []
+        for i in range(0, len(buf) - size + 1, size):
+            e = _EventData.from_buffer_copy(buf, i)
+            events.append((e.timestamp, e.id))
+        return events
+
+
+class Chip(object):
+    """ GPIO character device.
+    """
+
+    def __init__(self, path=DEFAULT_CHIP):
+        """ Open GPIO character device.
+        """
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CLOEXEC)
+
+
+    def request_output(self, offset, value=0):
+        """ Request output line.
+
+            :param offset integer:  line offset
+            :param value integer:   initial value
+            :return:                OutputLine
+        """
+        req = _HandleRequest()
+        req.lineoffsets[0] = offset
+        req.flags = _REQUEST_OUTPUT
+        req.default_values[0] = 1 if value else 0
+        req.consumer_label = LABEL
+        req.lines = 1
+        fcntl.ioctl(self.fd, _GET_LINEHANDLE, req)
+        return OutputLine(req.fd, offset)
+
+
+    def request_events(self, offset, rising=True, falling=False):
+        """ Request input line with edge events.
+
+            :param offset integer:  line offset
+            :param rising bool:     report rising edges
+            :param falling bool:    report falling edges
+            :return:                EventLine
+        """
+        req = _EventRequest()
+        req.lineoffset = offset
+        req.handleflags = _REQUEST_INPUT
+        req.eventflags = ((_EVENT_RISING_EDGE if rising else 0) |
+            (_EVENT_FALLING_EDGE if falling else 0))
+        req.consumer_label = LABEL
+        fcntl.ioctl(self.fd, _GET_LINEEVENT, req)
+        return EventLine(req.fd, offset)
+
+
+    def close(self):
+        """ Close GPIO character device. Requested lines stay owned.
+        """
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+
+
+class FakeOutputLine(Line):
+    """ Output line of fake chip.
+
+        :ivar int value:            current line value
+        :ivar list history:         list of (timestamp, value) of all sets
+    """
+
+    def __init__(self, chip, offset, value=0):
+        Line.__init__(self, None, offset)
+        self.chip = chip
+        self.value = value
+        self.history = []
+
+
+    def set(self, value):
+        self.value = 1 if value else 0
+        self.history.append((time.monotonic_ns(), self.value))
+
+
+    def close(self):
+        self.chip._release(self.offset)
+
+
+class FakeEventLine(EventLine):
+    """ Input line of fake chip.
+
+        Events are passed through pipe in the same format as kernel passes
+        them, so waiting and reading works the same way as with real chip.
+    """
+
+    def __init__(self, chip, offset, rising=True, falling=False):
+        self._r, self._w = os.pipe()
+        EventLine.__init__(self, self._r, offset)
+        self.chip = chip
+        self.value = 0
+        self.rising = rising
+        self.falling = falling
+
+
+    def get(self):
+        return self.value
+
+
+    def trigger(self, value):
+        """ Change line value and queue edge event.
+
+            :param value integer:   new line value
+        """
+        value = 1 if value else 0
+        if value == self.value:
+            return
+        self.value = value
+        if (value and self.rising) or (not value and self.falling):
+            e = _EventData(time.monotonic_ns(), RISING if value else FALLING)
+            os.write(self._w, bytes(e))
+
+
+    def close(self):
+        if self.fd is not None:
+            os.close(self._r)
+            os.close(self._w)
+            self.fd = None
+            self.chip._release(self.offset)
+
+
+class FakeChip(object):
+    """ Fake in-memory GPIO chip.
+
+        Line can be requested only once until it is released, as with real
+        chip.
+
+        :ivar dict lines:           requested lines by offset
+    """
+
+    def __init__(self, path=FAKE_PREFIX):
+        self.path = path
+        self.lines = {}
+        self._lock = threading.Lock()
+
+
+    def request_output(self, offset, value=0):
+        return self._request(offset,
+            lambda: FakeOutputLine(self, offset, value))
+
+
+    def request_events(self, offset, rising=True, falling=False):
+        return self._request(offset,
+            lambda: FakeEventLine(self, offset, rising, falling))
+
+
+    def press(self, offset):
+        """ Simulate button press (rising and falling edge) on input line.
+
+            Raises ValueError if line is not requested for events.
+        """
+        line = self.lines.get(offset)
+        if not isinstance(line, FakeEventLine):
+            raise ValueError('Line {} is not requested for events'.format(
+                offset))
+        line.trigger(1)
+        line.trigger(0)
+
+
+    def close(self):
+        pass
+
+
+    def _request(self, offset, factory):
+        with self._lock:
+            if offset in self.lines:
+                raise OSError(errno.EBUSY, 'Line {} is busy'.format(offset))
+            line = factory()
+            self.lines[offset] = line
+        return line
+
+
+    def _release(self, offset):
+        with self._lock:
+            self.lines.pop(offset, None)
+
+
+_fake_chips = {}
+_lock = threading.Lock()
+
+
+def open_chip(path=DEFAULT_CHIP):
+    """ Open GPIO chip.
+
+        If path is ``fake`` or starts with ``fake:`` fake chip of given name is
+        returned. Fake chips are shared so they can be driven from outside of
+        the port.
+
+        :param path string:         path to GPIO character device
+        :return:                    Chip or FakeChip
+    """
+    if path == FAKE_PREFIX or path.startswith(FAKE_PREFIX + ':'):
+        with _lock:
+            if path not in _fake_chips:
+                logger.warning('Using fake GPIO chip: {}'.format(path))
+                _fake_chips[path] = FakeChip(path)
+            return _fake_chips[path]
+    return Chip(path)
@@ -0,0 +1,89 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Base Printer Port
+    =================
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd.ports.base import BasePort
+
+
+class BasePrinter(BasePort):
+    """ Base printer.
+
+        Printing a ticket is done in two steps: rendering the ticket into
+        a document and writing the document to the printer. These steps are
+        separated so they can run in different stages of print pipeline (see
+        :mod:`vjezd.threads.print`) and the next ticket can be rendered while
+        the previous one is still being printed.
+
+        Inherit from this class to get these methods in printer port class.
+    """
+
+    def __init__(self, *args):
+        raise NotImplementedError
+
+
+    def render(self, ticket):
+        """ Render ticket into a document.
+
+            Implementation of this method must not have any side effects on the
+            port (e.g. write shared files) as it can be run concurrently with
+            write().
+
+            :param ticket Ticket:   ticket object
+            :return:                rendered document
+        """
+        raise NotImplementedError
+
+
+    def write(self, data, document=None):
+        """ Print ticket.
+
+            :param data Ticket:     ticket object
+            :param document:        document rendered by render(), if None
+                                    ticket will be rendered first
+        """
+        if document is None:
+            document = self.render(data)
+        self.print_document(data, document)
+
+
+    def print_document(self, ticket, document):
+        """ Print rendered document.
+
+            Implementation of this method should send document to the printer
+            and block until it is printed. In case of failure a PortWriteError
+            should be raised.
+
+            :param ticket Ticket:   ticket object
+            :param document:        document rendered by render()
+        """
+        raise NotImplementedError
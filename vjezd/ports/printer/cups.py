@@ -31,7 +31,6 @@
 
 import os
 import tempfile
-import time
 import logging
 logger = logging.getLogger(__name__)
 
@@ -42,6 +41,7 @@ from vjezd import threads
 from vjezd.models import Ticket
 from vjezd.ports import PortWriteError
 from vjezd.ports.printer.pdf import PDFPrinter
+from vjezd.ports.printer.render import Renderer
 
 
 class CUPSPrinterTestError(Exception):
@@ -80,6 +80,7 @@ class CUPSPrinter(PDFPrinter):
         self.cups_printer_name = None # use default printer
         self.cups_printer = None
         self.cups_conn = None
+        self.renderer = Renderer()
 
         if len(args) >= 1:
             self.width = int(args[0])
@@ -125,6 +126,8 @@ class CUPSPrinter(PDFPrinter):
         os.close(fd)
         logger.debug('Using PDF temp file: {}'.format(self.pdf_path))
 
+        self.renderer.start()
+
 
     def close(self):
         """ Close CUPS connection and PDF file.
@@ -139,6 +142,14 @@ class CUPSPrinter(PDFPrinter):
                 logger.debug('Removing PDF temp file: {}'.format(
                     self.pdf_path))
                 os.remove(self.pdf_path)
+        self.renderer.stop()
+
+
+    def warm_up(self):
+        """ Render throwaway ticket and query printer over CUPS connection.
+        """
+        PDFPrinter.warm_up(self)
+        self.cups_conn.getPrinterAttributes(self.cups_printer)
 
 
     def is_open(self):
@@ -149,11 +160,11 @@ class CUPSPrinter(PDFPrinter):
         return False
 
 
-    def write(self, data):
-        """ Print ticket.
+    def print_document(self, ticket, document):
+        """ Print rendered PDF document.
         """
-        # Generate PDF
-        PDFPrinter.write(self, data)
+        # Write PDF to temporary file
+        PDFPrinter.print_document(self, ticket, document)
 
         # Print PDF and block until ticket gets printed (or max timeout is
         # reached)
@@ -161,7 +172,7 @@ class CUPSPrinter(PDFPrinter):
         job_id = self.cups_conn.printFile(
             printer=self.cups_printer,
             filename=self.pdf_path,
-            title='ticket-{}'.format(data.code),
+            title='ticket-{}'.format(ticket.code),
             options={})
         logger.debug('CUPS print job #{} submitted. Waiting'.format(job_id))
         while self.cups_conn.getJobs().get(job_id, None) is not None:
@@ -169,7 +180,7 @@ class CUPSPrinter(PDFPrinter):
             if timeout >= self.PRINT_TIMEOUT or threads.exiting:
                 raise PortWriteError('CUPS print job #{} stalled!'.format(
                     job_id))
-            time.sleep(1)
+            threads.sleep(1)
             timeout = timeout + 1
         logger.debug('CUPS print job #{} printed'.format(job_id))
 
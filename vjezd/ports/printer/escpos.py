@@ -0,0 +1,253 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" ESC/POS Printer Port
+    ====================
+"""
+
+import os
+import socket
+import unicodedata
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd.models import Ticket
+from vjezd.models import Config
+from vjezd.ports import PortWriteError
+from vjezd.ports.printer.base import BasePrinter
+from vjezd.ports.printer.render import ticket_data
+
+
+# Constants
+# Default TCP port of network printers (raw printing)
+TCP_PORT = 9100
+# ESC/POS commands
+INIT = b'\x1b@'
+ALIGN_LEFT = b'\x1ba\x00'
+ALIGN_CENTER = b'\x1ba\x01'
+SIZE_NORMAL = b'\x1d!\x00'
+SIZE_DOUBLE = b'\x1d!\x11'
+HRI_BELOW = b'\x1dH\x02'
+CODE39 = b'\x1dk\x45'
+FEED = b'\x1bd'
+CUT = b'\x1dVB\x00'
+
+
+class EscPosPrinterTestError(Exception):
+    """ Exception raised when port test fails.
+    """
+    pass
+
+
+class EscPosPrinter(BasePrinter):
+    """ ESC/POS printer.
+
+        Prints ticket on thermal receipt printer using native ESC/POS commands
+        (text, Code39 barcode and paper cut). Ticket is sent directly to
+        printer device file (e.g. ``/dev/usb/lp0``, serial line) or to network
+        printer over raw TCP, no PDF is rendered and no print spooler is used.
+        Ticket is printed once written, the port doesn't wait for the printer.
+
+        Text is printed without diacritics as printer code pages differ.
+
+        Port can be tested against existing regular file or pseudo terminal.
+        Device is never created, so tickets are not written into a regular
+        file while the printer is unplugged.
+
+        Configuration
+        -------------
+        Port accepts the following positional arguments:
+        #. target - path to device (any target containing ``/``, e.g.
+           ``/dev/usb/lp0`` or ``./ticket.bin``) or host[:port] of network
+           printer (port is 9100 if omitted)
+        #. module - barcode module width in dots 2-6 (default 2)
+        #. height - barcode height in dots (default 160)
+
+        Full configuration line of ESC/POS printer is:
+        ``printer=escpos:target,module,height``
+    """
+
+    #: Timeout in seconds to connect and write to network printer
+    PRINT_TIMEOUT = 20
+
+
+    def __init__(self, *args):
+        """ Initialize ESC/POS printer.
+        """
+        self.target = '/dev/usb/lp0'
+        self.module = 2
+        self.height = 160
+        self.fd = None
+        self.socket = None
+        self.address = None
+        self._is_open = False
+
+        if len(args) >= 1:
+            self.target = args[0]
+        if len(args) >= 2:
+            self.module = int(args[1])
+        if len(args) >= 3:
+            self.height = int(args[2])
+
+        if '/' not in self.target:
+            host, sep, port = self.target.partition(':')
+            self.address = (host, int(port or TCP_PORT))
+
+        # Barcode setup sent with every ticket
+        self._barcode = b'\x1dh' + bytes((self.height,)) \
+            + b'\x1dw' + bytes((self.module,)) + HRI_BELOW
+
+        logger.info('ESC/POS printer using: {}'.format(self.target))
+
+
+    def is_network(self):
+        """ Check whether the printer is network printer.
+        """
+        return self.address is not None
+
+
+    def test(self):
+        """ Test whether the printer device (or sink file) exists and is
+            writable.
+        """
+        if self.is_network():
+            return
+        if not os.access(self.target, os.W_OK):
+            raise EscPosPrinterTestError('Cannot write to {}'.format(
+                self.target))
+
+
+    def open(self):
+        """ Open printer device or connect to network printer.
+        """
+        logger.info('Opening ESC/POS printer: {}'.format(self.target))
+        if self.is_network():
+            self._connect()
+        else:
+            self.fd = os.open(self.target,
+                os.O_WRONLY | os.O_NOCTTY | os.O_APPEND)
+        self._is_open = True
+
+
+    def close(self):
+        """ Close printer device or connection.
+        """
+        logger.info('Closing ESC/POS printer: {}'.format(self.target))
+        if self.fd is not None:
+            os.close(self.fd)
+            self.fd = None
+        if self.socket:
+            self.socket.close()
+            self.socket = None
+        self._is_open = False
+
+
+    def is_open(self):
+        """ Check whether the printer is open.
+        """
+        return self._is_open
+
+
+    def warm_up(self):
+        """ Initialize printer.
+        """
+        self.print_document(None, INIT)
+
+
+    def render(self, ticket):
+        """ Render ticket into ESC/POS commands.
+
+            :param ticket Ticket:   ticket object
+            :return:                ESC/POS document bytes
+        """
+        if not isinstance(ticket, Ticket):
+            raise TypeError('Not a Ticket object')
+
+        data = ticket_data(ticket, None, _(Config.get('ticket_title', None)))
+        code = _text(data['code'])
+
+        document = [INIT, ALIGN_CENTER]
+        if data['title']:
+            document += [SIZE_DOUBLE, _text(data['title']), b'\n',
+                SIZE_NORMAL]
+        document += [
+            ALIGN_LEFT,
+            _text('{}: {}\n{}: {}\n'.format(
+                data['issued_label'], data['issued'],
+                data['expires_label'], data['expires'])),
+            FEED, b'\x02',
+            ALIGN_CENTER,
+            self._barcode,
+            CODE39, bytes((len(code),)), code,
+            FEED, b'\x04',
+            CUT]
+        return b''.join(document)
+
+
+    def print_document(self, ticket, document):
+        """ Write ESC/POS document to printer.
+        """
+        try:
+            if self.is_network():
+                if not self.socket:
+                    self._connect()
+                try:
+                    self.socket.sendall(document)
+                except OSError:
+                    # Connection could be closed by printer, reconnect once
+                    self._connect()
+                    self.socket.sendall(document)
+            else:
+                view = memoryview(document)
+                while view:
+                    view = view[os.write(self.fd, view):]
+        except OSError as err:
+            if self.socket:
+                self.socket.close()
+                self.socket = None
+            raise PortWriteError('ESC/POS printer {} failed: {}'.format(
+                self.target, err))
+
+
+    def _connect(self):
+        """ Connect to network printer.
+        """
+        if self.socket:
+            self.socket.close()
+        self.socket = socket.create_connection(self.address,
+            self.PRINT_TIMEOUT)
+        self.socket.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+def _text(text):
+    """ Encode text for printer stripping diacritics.
+    """
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore')
+
+
+# Export port_class for port_factory()
+port_class = EscPosPrinter
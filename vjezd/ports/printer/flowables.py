@@ -0,0 +1,75 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Ticket Flowables
+    ================
+
+    Reportlab flowables used by ticket layout (see
+    :mod:`vjezd.ports.printer.render`). Module imports reportlab, so it is
+    imported only once rendering.
+"""
+
+from reportlab.platypus import Flowable
+from reportlab.graphics.barcode.code39 import Standard39
+from reportlab.pdfbase.pdfmetrics import getAscent, getDescent
+from reportlab.lib.units import mm
+
+
+class Barcode(Flowable):
+    """ Code39 bar code with human readable text scaled to given width.
+
+        Bars are drawn directly on canvas. Bar code drawing (graphics widget)
+        looks the same but it builds and validates a shape for each bar twice
+        per ticket, which is the most of ticket rendering time.
+    """
+
+    def __init__(self, value, width):
+        """ Create bar code.
+
+            :param value string:    bar code value
+            :param width float:     width in points
+        """
+        Flowable.__init__(self)
+        self.barcode = Standard39(value,
+            checksum=0,
+            quiet=False,        # don't use quiet zones on left and right
+            barWidth=0.25*mm,
+            barHeight=30*mm,
+            humanReadable=True)
+
+        # Space below bars taken by human readable text
+        font = self.barcode.fontName
+        self.depth = (1.07 * getAscent(font) - getDescent(font)) \
+            * self.barcode.fontSize / 1000
+        self.scale = float(width) / float(self.barcode.width)
+        self.width = width
+        self.height = (self.barcode.height + self.depth) * self.scale
+
+
+    def draw(self):
+        self.canv.scale(self.scale, self.scale)
+        self.barcode.drawOn(self.canv, 0, self.depth)
@@ -33,10 +33,10 @@ import logging
 logger = logging.getLogger(__name__)
 
 from vjezd.models import Ticket
-from vjezd.ports.base import BasePort
+from vjezd.ports.printer.base import BasePrinter
 
 
-class LogPrinter(BasePort):
+class LogPrinter(BasePrinter):
     """ Log printer.
 
         Log printer will just do INFO level log entry on event of printing a
@@ -57,15 +57,21 @@ class LogPrinter(BasePort):
         pass
 
 
-    def write(self, data):
-        """ Write out data.
+    def render(self, ticket):
+        """ Render ticket as a log message.
 
-            :param data Ticket:         Ticket object to be printed
+            :param ticket Ticket:       Ticket object to be printed
         """
-        if isinstance(data, Ticket):
+        if not isinstance(ticket, Ticket):
             raise TypeError('Not a Ticket object')
 
-        logger.info('Printing ticket: {}'.format(data))
+        return '{}'.format(ticket)
+
+
+    def print_document(self, ticket, document):
+        """ Write out rendered ticket.
+        """
+        logger.info('Printing ticket: {}'.format(document))
 
 
 # Export port_class for port_factory()
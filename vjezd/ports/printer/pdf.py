@@ -30,19 +30,14 @@
 """
 
 import os
+import time
 import logging
 logger = logging.getLogger(__name__)
 
-from reportlab.platypus import SimpleDocTemplate, Spacer
-from reportlab.platypus.paragraph import Paragraph
-from reportlab.lib.styles import getSampleStyleSheet
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.units import mm
-from reportlab.graphics.barcode import createBarcodeDrawing
-
 from vjezd.models import Ticket
 from vjezd.models import Config
-from vjezd.ports.base import BasePort
+from vjezd.ports.printer.base import BasePrinter
+from vjezd.ports.printer.render import Renderer, ticket_data
 
 
 class PDFPrinterTestError(Exception):
@@ -51,7 +46,7 @@ class PDFPrinterTestError(Exception):
     pass
 
 
-class PDFPrinter(BasePort):
+class PDFPrinter(BasePrinter):
     """ PDF printer.
 
         Prints ticket of given size as a PDF to file in specified path.
@@ -66,6 +61,13 @@ class PDFPrinter(BasePort):
         ``printer=pdf:width,/path/to/pdf``
     """
 
+    #: Time in seconds ticket title read from DB is cached
+    TITLE_TTL = 60
+
+    # Ticket title and time it was read
+    _title = None
+    _title_read = None
+
     def __init__(self, *args):
         """ Initialize PDF printer.
         """
@@ -77,6 +79,9 @@ class PDFPrinter(BasePort):
         if len(args) >= 2:
             self.pdf_path = args[1]
 
+        self.renderer = Renderer()
+        self._is_open = False
+
         logger.info('PDF printer using: {} size={}mm'.format(
             self.pdf_path, self.width))
 
@@ -90,69 +95,78 @@ class PDFPrinter(BasePort):
                 self.pdf_path))
 
 
-    def write(self, data):
-        """ Write PDF file with bar code and information about validity.
+    def open(self):
+        """ Start render workers.
+        """
+        self.renderer.start()
+        self._is_open = True
+
+
+    def close(self):
+        """ Stop render workers.
+        """
+        self.renderer.stop()
+        self._is_open = False
+
+
+    def is_open(self):
+        """ Check whether the printer is open (render workers started).
+        """
+        return self._is_open
+
+
+    def warm_up(self):
+        """ Render throwaway ticket to warm up renderer.
         """
-        if not isinstance(data, Ticket):
+        self.render(Ticket())
+
+
+    def render(self, ticket):
+        """ Render PDF with bar code and information about validity.
+
+            :param ticket Ticket:   ticket object
+            :return:                PDF document bytes
+        """
+        if not isinstance(ticket, Ticket):
             raise TypeError('Not a Ticket object')
 
-        self.generate_pdf(data)
+        return self.generate_pdf(ticket)
+
+
+    def print_document(self, ticket, document):
+        """ Write PDF file.
+        """
+        with open(self.pdf_path, 'wb') as f:
+            f.write(document)
 
 
     def generate_pdf(self, ticket):
-        """ Generate PDF file.
+        """ Generate PDF document.
+
+            Document is rendered by render worker (see
+            :mod:`vjezd.ports.printer.render`).
 
             :param ticket Ticket:   ticket object
-            :return:                path to output PDF
+            :return:                PDF document bytes
         """
 
-        # Get configurable text
-        title_text = _(Config.get('ticket_title', None))
-
-        # Setup styles
-        styles = getSampleStyleSheet()
-
-        doc = SimpleDocTemplate(self.pdf_path,
-            pagesize=letter,
-            topMargin=5*mm,
-            # NOTE We don't want to offend some printers by setting too small
-            # pagesize.
-            rightMargin=(letter[0] - self.width*mm - 2*mm),
-            bottomMargin=5*mm,
-            leftMargin=2*mm)
-
-        # Build document contents
-        story = []
-
-        if title_text:
-            story.append(Paragraph('{}'.format(title_text), styles['Title']))
-
-        # Creation and expiration date
-        story.append(Paragraph('{}: {}<br/>{}: {}'.format(
-            _('Cas vydani'),
-            ticket.created.strftime('%d.%m.%Y %H:%M'),
-            _('Platnost do'),
-            ticket.expires().strftime('%d.%m.%Y %H:%M')),
-            styles['Normal']))
-
-        story.append(Spacer(width=1, height=10*mm))
-
-        # Barcode (Standard39)
-        barcode = createBarcodeDrawing('Standard39',
-            value=ticket.code,
-            checksum=0,
-            quiet=False,        # don't use quiet zones on left and right
-            barWidth=0.25*mm,
-            barHeight=30*mm,
-            humanReadable = True)
-
-        # Scale barcode down to fit the page
-        s = float(self.width*mm - 8*mm)  / float(barcode.width)
-        barcode.scale(s, s)
-        story.append(barcode)
-
-        # Save the PDF
-        doc.build(story)
+        return self.renderer.render(ticket_data(ticket, self.width,
+            self.get_title()))
+
+
+    def get_title(self):
+        """ Get ticket title.
+
+            Title is re-read from DB once cached title is older than
+            TITLE_TTL. Ticket layout is cached by title (see
+            :func:`vjezd.ports.printer.render.template`), so changed title
+            gets new layout.
+        """
+        now = time.monotonic()
+        if self._title_read is None or now - self._title_read > self.TITLE_TTL:
+            self._title = _(Config.get('ticket_title', None))
+            self._title_read = now
+        return self._title
 
 
 # Export port_class for port_factory()
@@ -0,0 +1,287 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Ticket Renderer
+    ===============
+
+    Ticket renderer renders ticket into PDF document using reportlab. Rendering
+    is CPU heavy and holds the interpreter lock, so it is done in a small pool
+    of persistent worker processes which keep reportlab imported and warm.
+    Worker gets plain ticket data and returns PDF document bytes. In case the
+    pool is not available or fails, ticket is rendered in-process.
+
+    Static part of ticket layout (styles, page geometry, title and labels) is
+    built once and cached (see :func:`template`), each ticket lays out only
+    its dates and bar code.
+
+    Reportlab takes long to import so it is imported on first rendering, main
+    process rendering tickets in worker pool never imports it.
+
+    Configuration Options
+    ---------------------
+    Renderer is configured in [render] section of the configuration file:
+
+    ==============  ===========================================================
+    Option          Description
+    ==============  ===========================================================
+    workers         Number of render worker processes. If 0 tickets are
+                    rendered in-process. Default is 1.
+    timeout         Maximum time in seconds to wait for worker to render
+                    ticket before falling back to in-process rendering.
+                    Default is 10.
+    ==============  ===========================================================
+"""
+
+import time
+import signal
+import functools
+import multiprocessing
+from io import BytesIO
+from concurrent.futures import ProcessPoolExecutor
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import conffile
+
+
+def ticket_data(ticket, width, title=None):
+    """ Get plain ticket data which can be passed to render worker.
+
+        :param ticket Ticket:       ticket object
+        :param width integer:       ticket width in milimeters
+        :param title string:        ticket title
+        :return:                    dict of ticket data
+    """
+    return {
+        'width': width,
+        'title': title,
+        'code': ticket.code,
+        'issued_label': _('Cas vydani'),
+        'issued': ticket.created.strftime('%d.%m.%Y %H:%M'),
+        'expires_label': _('Platnost do'),
+        'expires': ticket.expires().strftime('%d.%m.%Y %H:%M'),
+    }
+
+
+class Template(object):
+    """ Static part of ticket layout.
+
+        Styles, page geometry, title and labels are the same for all tickets,
+        so they are prepared once. Flowables are built for each ticket as
+        they are changed by document build and the layout is shared by
+        threads.
+    """
+
+    def __init__(self, width, title, issued_label, expires_label):
+        """ Prepare ticket layout.
+
+            :param width integer:   ticket width in milimeters
+            :param title string:    ticket title
+        """
+        from reportlab.lib.styles import getSampleStyleSheet
+        from reportlab.lib.pagesizes import letter
+        from reportlab.lib.units import mm
+
+        self.width = width
+
+        # Setup styles
+        self.styles = getSampleStyleSheet()
+
+        # Page geometry
+        self.geometry = {
+            'pagesize': letter,
+            'topMargin': 5*mm,
+            # NOTE We don't want to offend some printers by setting too small
+            # pagesize.
+            'rightMargin': (letter[0] - width*mm - 2*mm),
+            'bottomMargin': 5*mm,
+            'leftMargin': 2*mm}
+
+        self.title = title
+        self.dates = '{}: %s<br/>{}: %s'.format(issued_label, expires_label)
+        self.spacer_height = 10*mm
+        self.barcode_width = width*mm - 8*mm
+
+
+    def render(self, data):
+        """ Render ticket PDF document.
+
+            :param data dict:       ticket data (see ticket_data())
+            :return:                PDF document bytes
+        """
+        from reportlab.platypus import SimpleDocTemplate, Spacer
+        from reportlab.platypus.paragraph import Paragraph
+        from vjezd.ports.printer.flowables import Barcode
+
+        output = BytesIO()
+        doc = SimpleDocTemplate(output, **self.geometry)
+
+        # Build document contents
+        story = []
+        if self.title:
+            story.append(Paragraph('{}'.format(self.title),
+                self.styles['Title']))
+
+        # Creation and expiration date
+        story.append(Paragraph(self.dates % (data['issued'], data['expires']),
+            self.styles['Normal']))
+
+        story.append(Spacer(width=1, height=self.spacer_height))
+
+        # Barcode (Standard39) scaled down to fit the page
+        story.append(Barcode(data['code'], self.barcode_width))
+
+        # Render the PDF
+        doc.build(story)
+        return output.getvalue()
+
+
+@functools.lru_cache(maxsize=4)
+def template(width, title, issued_label, expires_label):
+    """ Get cached ticket layout.
+
+        Layout is cached by its static fields, so once the title changes new
+        layout is built.
+    """
+    logger.debug('Building ticket layout {}mm: {}'.format(width, title))
+    return Template(width, title, issued_label, expires_label)
+
+
+def render_pdf(data):
+    """ Render ticket PDF document.
+
+        :param data dict:           ticket data (see ticket_data())
+        :return:                    PDF document bytes
+    """
+    return template(data['width'], data['title'], data['issued_label'],
+        data['expires_label']).render(data)
+
+
+def _init_worker():
+    """ Initialize render worker process.
+    """
+    # NOTE Worker is stopped by its pool, SIGINT must not kill it
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # Warm up reportlab (imports, fonts, stylesheet)
+    from reportlab.lib.styles import getSampleStyleSheet
+    from vjezd.ports.printer import flowables
+    getSampleStyleSheet()
+
+
+class Renderer(object):
+    """ Ticket renderer using pool of worker processes.
+    """
+
+    def __init__(self, workers=None, timeout=None):
+        """ Initialize renderer.
+
+            :param workers integer: number of worker processes
+            :param timeout float:   timeout of rendering in worker
+        """
+        if workers is None:
+            workers = conffile.getint('render', 'workers', 1)
+        if timeout is None:
+            timeout = conffile.getfloat('render', 'timeout', 10.0)
+
+        self.workers = workers
+        self.timeout = timeout
+        self.pool = None
+
+        self.stats = {'pool': 0, 'inline': 0, 'fallback': 0}
+        self.time = {'pool': 0.0, 'inline': 0.0}
+
+
+    def start(self):
+        """ Start worker processes.
+        """
+        if self.workers <= 0:
+            logger.info('Rendering tickets in-process')
+            return
+
+        logger.info('Starting {} render workers'.format(self.workers))
+        try:
+            self.pool = ProcessPoolExecutor(self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker)
+            # NOTE Workers are spawned lazily, submit dummy job so first
+            # ticket doesn't pay for worker start-up
+            self.pool.submit(int)
+        except Exception as err:
+            logger.error('Cannot start render workers: {}!'.format(err))
+            self.pool = None
+
+
+    def stop(self):
+        """ Stop worker processes and log statistics.
+        """
+        if self.pool:
+            logger.info('Stopping render workers')
+            self.pool.shutdown()
+            self.pool = None
+
+        for k in ('pool', 'inline'):
+            if self.stats[k]:
+                logger.info('Rendered {} tickets {}, avg {:.3f}s'.format(
+                    self.stats[k], k, self.time[k] / self.stats[k]))
+        if self.stats['fallback']:
+            logger.warning('Render fallbacks: {}'.format(
+                self.stats['fallback']))
+
+
+    def render(self, data):
+        """ Render ticket.
+
+            :param data dict:       ticket data (see ticket_data())
+            :return:                PDF document bytes
+        """
+        start = time.time()
+
+        if self.pool:
+            try:
+                document = self.pool.submit(render_pdf, data).result(
+                    self.timeout)
+                self._measure('pool', start)
+                return document
+            except Exception as err:
+                logger.error('Render worker failed: {}! Rendering '
+                    'in-process'.format(err))
+                self.stats['fallback'] += 1
+                start = time.time()
+
+        document = render_pdf(data)
+        self._measure('inline', start)
+        return document
+
+
+    def _measure(self, kind, start):
+        """ Measure rendering time.
+        """
+        elapsed = time.time() - start
+        self.stats[kind] += 1
+        self.time[kind] += elapsed
+        logger.debug('Ticket rendered {} in {:.3f}s'.format(kind, elapsed))
@@ -29,17 +29,14 @@
     ===============
 """
 
-import threading
 import logging
 logger = logging.getLogger(__name__)
 
 from vjezd.ports.base import BasePort
+from vjezd.ports.relay import scheduler
 from vjezd.models import Config
 
 
-_lock = threading.Lock()
-
-
 class BaseRelay(BasePort):
     """ Base relay.
 
@@ -48,6 +45,10 @@ class BaseRelay(BasePort):
         re-use in order to adhere to parameters. See the method descriptions
         below.
 
+        Relay cycles are timed by relay scheduler (see
+        :mod:`vjezd.ports.relay.scheduler`). Hardware-bound relay port class
+        just implements switch().
+
         Inherit from this class to get these methods in hardware-bound relay
         port class.
 
@@ -57,6 +58,12 @@ class BaseRelay(BasePort):
         raise NotImplementedError
 
 
+    def warm_up(self):
+        """ Start relay scheduler.
+        """
+        scheduler.scheduler()
+
+
     def get_delay(self, mode):
         """ Get delay in seconds before relay activation in given mode.
 
@@ -73,29 +80,80 @@ class BaseRelay(BasePort):
         return 5
 
 
+    def get_policy(self):
+        """ Get policy for requests overlapping with scheduled relay cycle.
+        """
+        policy = Config.get('relay_policy', scheduler.QUEUE)
+        if policy not in scheduler.policies:
+            logger.warning('Unknown relay policy {}. Falling back to {}'.format(
+                policy, scheduler.QUEUE))
+            policy = scheduler.QUEUE
+        return policy
+
+
+    def get_priority(self):
+        """ Get mode which relay cycles are queued ahead of other mode.
+
+            :return:                print, scan or None for FIFO order
+        """
+        priority = Config.get('relay_priority', None)
+        if priority not in (None, 'print', 'scan'):
+            logger.warning('Unknown relay priority {}. Ignoring'.format(
+                priority))
+            priority = None
+        return priority
+
+
+    def get_extend_max(self):
+        """ Get maximum time in seconds relay is kept open by extend policy.
+        """
+        return Config.get_int('relay_extend_max', 20)
+
+
     def write(self, data):
         """ Convenience write to port method.
 
             Relay expects print or scan string as data on write. This method
-            just verifies if one of these was passed and calls self.activate
+            just verifies if one of these was passed and schedules relay cycle.
+            It returns immediately.
+
+            :return:                RelayHandle of scheduled cycle or None
         """
         if data not in ('print', 'scan'):
             raise TypeError('Invalid activation mode {}'.format(data))
 
+        # Return in case the delay is < 0
+        delay = self.get_delay(data)
+        if delay < 0:
+            logger.warning('Delay set to < 0. Ommiting relay activation')
+            return None
+
         # As relay might be (in case of mode=both) used by print and scan
-        # thread it is important to lock body of activate method and make
-        # second thread wait for relay.
-        logger.debug('Waiting for relay lock')
-        with _lock:
-            self.activate(data)
+        # thread it is scheduler who makes sure the cycles don't overlap.
+        return scheduler.scheduler().schedule(self, data, delay,
+            self.get_period(data), self.get_policy(), self.get_extend_max(),
+            self.get_priority())
 
 
-    def activate(self, mode):
-        """ Activate relay.
+    def output(self):
+        """ Get key of physical output driven by relay.
 
-            Implementation of this method should activate relay and can trust
-            the mode.
+            Cycles of relays with the same output never overlap. Relay port
+            class driving hardware output should return hashable key
+            identifying it (e.g. pin and host), by default each relay instance
+            is a separate output.
         """
-        raise NotImplementedError
+        return self
+
+
+    def switch(self, state):
+        """ Switch relay.
 
+            Implementation of this method should switch the relay output on
+            (state 1) or off (state 0) immediately and return. All the timing
+            is done by relay scheduler (or by asyncio core, see
+            :mod:`vjezd.aio`).
 
+            :param state int:       1 to switch relay on, 0 to switch it off
+        """
+        raise NotImplementedError
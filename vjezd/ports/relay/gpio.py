@@ -29,7 +29,6 @@
     ==========
 """
 
-import time
 import logging
 logger = logging.getLogger(__name__)
 
@@ -106,28 +105,19 @@ class GPIORelay(BaseRelay):
         return self._is_open
 
 
-    def activate(self, mode):
-        """ Activate relay.
-
-            :param data string:     activation mode (print or scan)
+    def output(self):
+        """ Get key of physical output driven by relay.
         """
+        return ('gpio', self.pin)
 
-        # Wait for configured delay or return in case the delay is < 0
-        delay = self.get_delay(mode)
-        if delay < 0:
-            logger.warning('Delay set to < 0. Ommiting relay activation')
-            return
-        logger.info('Waiting configured delay {} seconds'.format(delay))
-        time.sleep(delay)
 
-        # Activate relay for configured period
-        period = self.get_period(mode)
-        logger.info('Activating relay in {} mode for {}s'.format(mode, period))
+    def switch(self, state):
+        """ Switch relay GPIO pin.
 
+            :param state int:       1 to switch relay on, 0 to switch it off
+        """
         # TODO Raise PortWriteError?
-        GPIO.output(self.pin, GPIO.HIGH)
-        time.sleep(period)
-        GPIO.output(self.pin, GPIO.LOW)
+        GPIO.output(self.pin, GPIO.HIGH if state else GPIO.LOW)
 
 
 # Export port_class for port_factory()
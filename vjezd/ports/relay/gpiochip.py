@@ -0,0 +1,126 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" GPIO Character Device Relay
+    ===========================
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd.ports.relay.base import BaseRelay
+from vjezd.ports import gpiochip
+
+
+class GPIOChipRelay(BaseRelay):
+    """ GPIO character device relay port.
+
+        Relay driven by GPIO line using Linux GPIO character device (see
+        :mod:`vjezd.ports.gpiochip`). Line is owned by the port while it is
+        open.
+
+        Configuration
+        -------------
+        Port accepts the following positional arguments:
+        #. pin - GPIO physical pin number (without P1_ prefix)
+        #. chip - path to GPIO character device (default /dev/gpiochip0) or
+           ``fake`` for fake in-memory chip
+
+        Full configuration line of gpiochip relay is:
+        ``relay=gpiochip:pin,chip``
+    """
+
+    def __init__(self, *args):
+        """ Initialize port configuration.
+        """
+        self.pin = 18
+        self.chip_path = gpiochip.DEFAULT_CHIP
+        self.chip = None
+        self.line = None
+
+        if len(args) >= 1:
+            self.pin = int(args[0])
+        if len(args) >= 2 and args[1]:
+            self.chip_path = args[1]
+
+        self.offset = gpiochip.pin_line(self.pin)
+
+        logger.info('GPIO chip relay using: {} pin={} line={}'.format(
+            self.chip_path, self.pin, self.offset))
+
+
+    def test(self):
+        """ Test if GPIO chip can be opened.
+        """
+        gpiochip.open_chip(self.chip_path).close()
+
+
+    def open(self):
+        """ Request GPIO line as output (relay off).
+        """
+        logger.info('Opening GPIO chip {} line {}'.format(self.chip_path,
+            self.offset))
+        self.chip = gpiochip.open_chip(self.chip_path)
+        self.line = self.chip.request_output(self.offset, 0)
+
+
+    def close(self):
+        """ Release GPIO line.
+        """
+        logger.info('Closing GPIO chip {} line {}'.format(self.chip_path,
+            self.offset))
+        if self.is_open():
+            self.line.close()
+            self.line = None
+            self.chip.close()
+            self.chip = None
+
+
+    def is_open(self):
+        """ Check whether the GPIO line is requested.
+        """
+        if self.line:
+            return True
+        return False
+
+
+    def output(self):
+        """ Get key of physical output driven by relay.
+        """
+        return ('gpiochip', self.chip_path, self.offset)
+
+
+    def switch(self, state):
+        """ Switch relay GPIO line.
+
+            :param state int:       1 to switch relay on, 0 to switch it off
+        """
+        self.line.set(state)
+
+
+# Export port_class for port_factory()
+port_class = GPIOChipRelay
@@ -29,7 +29,6 @@
     ==============
 """
 
-import time
 import logging
 logger = logging.getLogger(__name__)
 
@@ -57,20 +56,12 @@ class LogRelay(BaseRelay):
         pass
 
 
-    def activate(self, mode):
-        """ Activate relay.
+    def switch(self, state):
+        """ Log relay switch.
 
-            :param data string:     activation mode (print or scan)
+            :param state int:       1 to switch relay on, 0 to switch it off
         """
-
-        # Get delay
-        delay = self.get_delay(mode)
-        logger.info('Waiting configured delay {} seconds'.format(delay))
-        time.sleep(delay)
-
-        # Activate relay
-        logger.info('Activating relay in {} mode'.format(mode))
-        return True
+        logger.info('Relay switched {}'.format('ON' if state else 'OFF'))
 
 
 # Export port_class for port_factory()
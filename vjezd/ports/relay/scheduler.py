@@ -0,0 +1,465 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Relay Scheduler
+    ===============
+
+    Relay scheduler switches relays according to deadlines instead of blocking
+    the thread which requested relay activation. Each activation request
+    creates a :class:`RelayHandle` describing one relay cycle (delay, switch
+    on, period, switch off) and returns it immediately. Deadlines of all
+    cycles are kept in a single timer heap serviced by one scheduler thread.
+
+    Cycles of relays driving the same physical output (see
+    :meth:`vjezd.ports.relay.base.BaseRelay.output`) never overlap, cycles of
+    different outputs run concurrently. Cycles of each output are queued in
+    FIFO order, optionally cycles of priority mode (e.g. scan, so cars leave
+    before new ones enter) are queued ahead of other waiting cycles.
+    Overlapping requests are handled according to policy:
+
+    * queue: cycle is queued and its delay starts once previous cycle is
+      finished (this mimics the former blocking behavior)
+    * merge: request is merged into the last queued or running cycle and the
+      handle of that cycle is returned
+    * extend: request arriving while relay is open pushes out deactivation of
+      the open cycle by a new period, so convoys pass within one cycle. Relay
+      is kept open at most given cap in total, requests beyond the cap are
+      queued. Request arriving during delay is merged into the pending cycle.
+"""
+
+import time
+import heapq
+import itertools
+import threading
+from collections import deque
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import threads
+from vjezd.ports import PortWriteError
+
+# Constants
+# Policies
+QUEUE = 'queue'
+MERGE = 'merge'
+EXTEND = 'extend'
+# Policy list
+policies = (QUEUE, MERGE, EXTEND)
+
+# Handle states
+PENDING = 'pending'
+ACTIVE = 'active'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+
+# Timer actions
+_ON = 1
+_OFF = 0
+
+_scheduler = None
+_lock = threading.Lock()
+
+
+class RelayHandle(object):
+    """ Handle of relay cycle.
+
+        :ivar str mode:             activation mode (print or scan)
+        :ivar str policy:           policy for overlapping requests
+        :ivar str state:            state of cycle
+        :ivar int requests:         number of requests merged into cycle
+        :ivar int extensions:       number of open period extensions
+        :ivar Exception error:      error raised while switching relay
+    """
+
+    def __init__(self, relay, mode, delay, period, policy=QUEUE):
+        """ Initialize handle of relay cycle.
+        """
+        self.relay = relay
+        self.output = None
+        self.mode = mode
+        self.policy = policy
+        self.delay = delay
+        self.period = period
+        self.state = PENDING
+        self.requests = 1
+        self.extensions = 0
+        self.error = None
+        self.activate_at = None
+        self.activated_at = None
+        self.deactivate_at = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+        self._cond = threading.Condition(self._lock)
+        self._callbacks = []
+
+
+    def __repr__(self):
+        """ String representation of object.
+        """
+        return '[RelayHandle {} mode:{} requests:{} extensions:{}]'.format(
+            self.state, self.mode, self.requests, self.extensions)
+
+
+    def done(self):
+        """ Check whether the cycle is finished (successfuly or not).
+        """
+        return self._done.is_set()
+
+
+    def exclusive(self):
+        """ Check whether requester should wait for the cycle to finish before
+            handling its next event.
+
+            This is the case of queue policy only. Merge and extend policies
+            rely on next requests arriving while the cycle runs.
+        """
+        return self.policy == QUEUE
+
+
+    def add_done_callback(self, callback):
+        """ Add callback called once the cycle is finished.
+
+            Callback has a signature callback(handle) and it is called from
+            scheduler thread so it must not block. If the cycle is already
+            finished callback is called immediately.
+        """
+        with self._lock:
+            if not self.done():
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+
+    def _finish(self, state, error=None):
+        """ Set final state of the cycle and call callbacks.
+        """
+        with self._lock:
+            self.state = state
+            self.error = error
+            self._done.set()
+            self._cond.notify_all()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as err:
+                logger.error('Relay handle callback failed: {}'.format(err))
+
+
+    def wait(self):
+        """ Wait until the cycle is finished or application is exiting.
+
+            Raises PortWriteError if the cycle failed. Caller decides on its
+            own what to do with cycle which didn't finish (see :attr:`state`).
+
+            :return:                True if cycle is done, False if it was
+                                    cancelled or application is exiting
+        """
+        threads.on_exiting(self._wakeup)
+        try:
+            with self._cond:
+                self._cond.wait_for(lambda: self.done() or threads.exiting)
+        finally:
+            threads.remove_on_exiting(self._wakeup)
+        if not self.done():
+            return False
+
+        if self.state == FAILED:
+            raise PortWriteError('{}'.format(self.error))
+        return self.state == DONE
+
+
+    def _wakeup(self):
+        """ Wake up threads waiting for the cycle once exiting.
+        """
+        with self._cond:
+            self._cond.notify_all()
+
+
+class RelayScheduler(threading.Thread):
+    """ Relay scheduler thread.
+    """
+
+    def __init__(self):
+        """ Initialize scheduler.
+        """
+        threading.Thread.__init__(self)
+        self.name = self.__class__.__name__
+        self.daemon = True
+
+        self.stats = {'scheduled': 0, 'merged': 0, 'extended': 0,
+            'prioritized': 0, 'done': 0, 'failed': 0}
+
+        # Heap of timers (deadline, sequence, handle, action)
+        self._timers = []
+        self._seq = itertools.count()
+        # Queues of cycles per output, head of the queue is the current cycle
+        self._queues = {}
+        self._cond = threading.Condition()
+        self._stopping = False
+
+
+    def schedule(self, relay, mode, delay, period, policy=QUEUE,
+        extend_max=None, priority=None):
+        """ Schedule relay cycle.
+
+            :param relay BaseRelay: relay port instance
+            :param mode string:     activation mode (print or scan)
+            :param delay float:     delay before activation in seconds
+            :param period float:    activation period in seconds
+            :param policy string:   policy for overlapping requests
+            :param extend_max float: maximum time in seconds relay is kept
+                                    open by extend policy (None for no cap)
+            :param priority string: mode which cycles are queued ahead of
+                                    waiting cycles of other mode (or None)
+            :return:                RelayHandle of the cycle
+        """
+        output = relay.output()
+        with self._cond:
+            q = self._queues.setdefault(output, deque())
+
+            if q and (policy == MERGE or
+                (policy == EXTEND and q[-1].state == PENDING)):
+                handle = q[-1]
+                handle.requests += 1
+                self.stats['merged'] += 1
+                logger.info('Relay request merged into {}'.format(handle))
+                return handle
+
+            if policy == EXTEND and q and self._extend(q[-1], period,
+                extend_max):
+                return q[-1]
+
+            handle = RelayHandle(relay, mode, delay, period, policy)
+            handle.output = output
+            self.stats['scheduled'] += 1
+            if not q:
+                q.append(handle)
+                self._start(handle)
+                return handle
+
+            # NOTE Head of the queue is already running
+            i = len(q)
+            if priority and mode == priority:
+                while i > 1 and q[i - 1].mode != priority:
+                    i -= 1
+                if i < len(q):
+                    self.stats['prioritized'] += 1
+            q.insert(i, handle)
+            logger.info('Relay busy. Queued {} behind {} cycles'.format(
+                handle, i))
+            return handle
+
+
+    def interrupt(self):
+        """ Interrupt scheduler without waiting for it.
+
+            Scheduler thread cancels all pending cycles and switches off active
+            relays. Handles of all cycles are finished.
+        """
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+
+
+    def stop(self):
+        """ Stop scheduler. Cancel all pending cycles and switch off active.
+        """
+        self.interrupt()
+        self.join()
+        logger.info('Relay scheduler {} saved cycles:{}'.format(' '.join(
+            '{}:{}'.format(k, v) for k, v in sorted(self.stats.items())),
+            self.stats['merged'] + self.stats['extended']))
+
+
+    def run(self):
+        """ Service timers until stopped.
+        """
+        while True:
+            with self._cond:
+                while not self._stopping:
+                    timeout = None
+                    if self._timers:
+                        timeout = self._timers[0][0] - time.monotonic()
+                        if timeout <= 0:
+                            break
+                    self._cond.wait(timeout)
+                if self._stopping:
+                    break
+                deadline, seq, handle, action = heapq.heappop(self._timers)
+                if action == _OFF and handle.deactivate_at > deadline:
+                    # Open period was extended meanwhile
+                    self._push(handle.deactivate_at, handle, _OFF)
+                    continue
+
+            # NOTE Relay is switched outside of the lock as it might block
+            # (e.g. TCPGPIO)
+            if action == _ON:
+                self._activate(handle)
+            else:
+                self._deactivate(handle)
+
+        self._cancel()
+
+
+    def _extend(self, handle, period, extend_max=None):
+        """ Extend open period of active cycle. Must be called with lock held.
+
+            :return:                True if cycle was extended
+        """
+        now = time.monotonic()
+        # NOTE Once deactivation deadline passes relay is being switched off
+        if handle.state != ACTIVE or handle.deactivate_at <= now:
+            return False
+
+        deactivate_at = now + period
+        if extend_max is not None:
+            deactivate_at = min(deactivate_at,
+                handle.activated_at + extend_max)
+        if deactivate_at <= handle.deactivate_at:
+            logger.info('Relay open period cap reached. Not extending '
+                '{}'.format(handle))
+            return False
+
+        # NOTE Deactivation timer is not touched, once it expires it is
+        # re-pushed at the new deadline
+        handle.deactivate_at = deactivate_at
+        handle.requests += 1
+        handle.extensions += 1
+        self.stats['extended'] += 1
+        logger.info('Relay open period extended by {:.3f}s {}'.format(
+            deactivate_at - now, handle))
+        return True
+
+
+    def _start(self, handle):
+        """ Start delay of the cycle. Must be called with lock held.
+        """
+        logger.info('Waiting configured delay {} seconds'.format(handle.delay))
+        handle.activate_at = time.monotonic() + handle.delay
+        self._push(handle.activate_at, handle, _ON)
+
+
+    def _push(self, deadline, handle, action):
+        """ Push new timer. Must be called with lock held.
+        """
+        heapq.heappush(self._timers, (deadline, next(self._seq), handle,
+            action))
+        self._cond.notify()
+
+
+    def _activate(self, handle):
+        """ Switch relay on and schedule its deactivation.
+        """
+        logger.info('Activating relay in {} mode for {}s'.format(
+            handle.mode, handle.period))
+        try:
+            handle.relay.switch(1)
+        except Exception as err:
+            logger.error('Cannot activate relay: {}!'.format(err))
+            self._finish(handle, err)
+            return
+
+        with self._cond:
+            handle.state = ACTIVE
+            handle.activated_at = time.monotonic()
+            handle.deactivate_at = handle.activated_at + handle.period
+            self._push(handle.deactivate_at, handle, _OFF)
+
+
+    def _deactivate(self, handle):
+        """ Switch relay off and start the next cycle.
+        """
+        logger.info('Deactivating relay')
+        err = None
+        try:
+            handle.relay.switch(0)
+        except Exception as e:
+            logger.critical('Cannot deactivate relay: {}!'.format(e))
+            err = e
+        self._finish(handle, err)
+
+
+    def _finish(self, handle, err=None):
+        """ Finish the cycle and start the next queued one.
+        """
+        with self._cond:
+            self.stats['failed' if err else 'done'] += 1
+
+            q = self._queues[handle.output]
+            q.popleft()
+            if q:
+                self._start(q[0])
+        handle._finish(FAILED if err else DONE, err)
+
+
+    def _cancel(self):
+        """ Cancel all cycles. Active relays are switched off.
+        """
+        with self._cond:
+            queues = list(self._queues.values())
+            self._queues = {}
+            self._timers = []
+
+        for q in queues:
+            for handle in q:
+                if handle.state == ACTIVE:
+                    logger.warning('Relay cycle interrupted. Switching off')
+                    try:
+                        handle.relay.switch(0)
+                    except Exception as err:
+                        logger.critical('Cannot deactivate relay: {}!'.format(
+                            err))
+                handle._finish(CANCELLED)
+
+
+def scheduler():
+    """ Get running relay scheduler. Scheduler is started on first use.
+    """
+    global _scheduler
+
+    with _lock:
+        if not _scheduler:
+            logger.debug('Starting relay scheduler')
+            _scheduler = RelayScheduler()
+            _scheduler.start()
+            # Don't let threads wait for relay cycles once exiting
+            threads.on_exiting(_scheduler.interrupt)
+        return _scheduler
+
+
+def shutdown():
+    """ Stop relay scheduler if it is running.
+    """
+    global _scheduler
+
+    with _lock:
+        if _scheduler:
+            logger.debug('Stopping relay scheduler')
+            _scheduler.stop()
+            _scheduler = None
@@ -29,7 +29,6 @@
     =============
 """
 
-import time
 import socket
 import logging
 logger = logging.getLogger(__name__)
@@ -116,27 +115,18 @@ class TCPGPIORelay(BaseRelay):
         return True
 
 
-    def activate(self, mode):
-        """ Activate relay.
-
-            :param data string:     activation mode (print or scan)
+    def output(self):
+        """ Get key of physical output driven by relay.
         """
+        return ('tcpgpio', self.ip, self.port, self.pin)
+
 
-        # Wait for configured delay or return in case the delay is < 0
-        delay = self.get_delay(mode)
-        if delay < 0:
-            logger.warning('Delay set to < 0. Ommiting relay activation')
-            return
-        logger.info('Waiting configured delay {} seconds'.format(delay))
-        time.sleep(delay)
-
-        # Activate relay for configured period
-        period = self.get_period(mode)
-        logger.info('Activating relay in {} mode for {}s'.format(mode, period))
-
-        self._send_message(self.pin, 1)
-        time.sleep(period)
-        self._send_message(self.pin, 0)
+    def switch(self, state):
+        """ Switch remote relay GPIO pin.
+
+            :param state int:       1 to switch relay on, 0 to switch it off
+        """
+        self._send_message(self.pin, 1 if state else 0)
 
 
     def _send_message(self, pin, state):
@@ -30,14 +30,21 @@
 """
 
 import os
-import select
+import time
 import logging
 logger = logging.getLogger(__name__)
 
-from evdev import InputDevice, ecodes as e, categorize
+from evdev import InputDevice, ecodes as e
 from evdev.events import KeyEvent
 
+from vjezd import threads
 from vjezd.ports.base import BasePort
+from vjezd.ports import evdevice
+
+
+# Constants
+# Default maximum length of code (length of ticket code column)
+MAX_LENGTH = 240
 
 
 class EvdevScannerTestError(Exception):
@@ -53,15 +60,28 @@ class EvdevScanner(BasePort):
         key is read the buffer is flushed as a read code.
 
         Most barcode readers act as a HID keyboard. In order to make them work
-        with this port they must be configured to send RETURN after code.
+        with this port they must be configured to send RETURN after code or
+        gap framing must be used: once no key is pressed for given time
+        (measured using kernel event timestamps) the code is complete.
+
+        Codes with unknown keys or longer than maximum length are dropped.
+        Optional prefix and suffix configured on scanner are stripped.
+
+        Event device is shared with other evdev ports using the same device
+        (see :mod:`vjezd.ports.evdevice`).
 
         Configuration
         -------------
         Port accepts the following positional arguments:
         #. /path/to/event_device - path to event device special file
+        #. gap - gap between keys in miliseconds which completes code, 0
+           disables gap framing (default)
+        #. max_length - maximum length of code, default is 240
+        #. prefix - prefix to strip
+        #. suffix - suffix to strip
 
         Full configuration line of evdev button is:
-        ``scanner=evdev:/path/to/event_device``
+        ``scanner=evdev:/path/to/event_device,gap,max_length,prefix,suffix``
     """
 
     # NOTE This is really incomplete but it works with ticket generator just
@@ -75,22 +95,50 @@ class EvdevScanner(BasePort):
          45: 'X', 46: 'C', 47: 'V', 48: 'B', 49: 'N', 50: 'M', 52: '.',
          53: '/', 57: ' ', }
 
+    # Scancode tables without and with shift (precomputed from CODE39)
+    _unshifted = {k: v[0] for k, v in CODE39.items()}
+    _shifted = {k: v[-1] for k, v in CODE39.items()}
+
 
     def __init__(self, *args):
         """ Initialize port configuration.
         """
 
         self.path = '/dev/input/event0'
+        self.gap = 0
+        self.max_length = MAX_LENGTH
+        self.prefix = ''
+        self.suffix = ''
         self.device = None
+        self.events = None
 
         if len(args) >= 1:
             self.path = args[0]
-
-        self._buffer = ''
+        if len(args) >= 2:
+            self.gap = int(args[1]) / 1000
+        if len(args) >= 3:
+            self.max_length = int(args[2])
+        if len(args) >= 4:
+            self.prefix = args[3]
+        if len(args) >= 5:
+            self.suffix = args[4]
+
+        # Characters of code being read (reused between codes)
+        self._buffer = []
         self._shift = False
         self._caps = False
+        # Timestamp of the last key and reason of corruption of code being
+        # read
+        self._last = 0
+        self._corrupted = None
+        # Number of dropped codes
+        self.dropped = 0
+        # Number of events and reads of code being read
+        self._events = 0
+        self._reads = 0
 
-        logger.debug('Evdev scanner using: {}'.format(self.path))
+        logger.debug('Evdev scanner using: {} gap={}ms max_length={}'.format(
+            self.path, int(self.gap * 1000), self.max_length))
 
 
     def test(self):
@@ -111,9 +159,8 @@ class EvdevScanner(BasePort):
         """ Open event device.
         """
         logger.debug('Opening evdev {}'.format(self.path))
-        self.device = InputDevice(self.path)
-        if self.device:
-            logger.info('Evdev scanner found: {}'.format(self.device))
+        self.device = evdevice.open_device(self.path)
+        self.events = self.device.subscribe(types=(e.EV_KEY,))
 
 
     def close(self):
@@ -121,79 +168,135 @@ class EvdevScanner(BasePort):
         """
         logger.debug('Closing evdev {}'.format(self.path))
         if self.is_open():
-            self.device.close()
+            self.events.close()
+            self.events = None
+            self.device = None
 
 
     def is_open(self):
         """ Check whether the event device is open.
         """
-        if self.device:
+        if self.events:
             return True
         return False
 
 
+    def fileno(self):
+        """ Get file descriptor of event device.
+        """
+        if self.is_open():
+            return self.events.fileno()
+        return None
+
+
     def read(self, callback=None):
         """ Read event device.
 
-            If button event is triggered a function assigned to callback
-            argument is run.
+            All pending events are read at once. Once a code is read
+            a function assigned to callback argument is run.
         """
 
         # In order to avoid bare polling a select() is called on device
-        # descriptor with a reasonable timeout so the thread can be
-        # interrupted. In case of event read we will read and process it.
-        r, w, x = select.select([self.device.fileno()], [], [], 1)
+        # descriptor with a reasonable timeout. Select is interrupted
+        # immediately once exiting. In case of events read we will read and
+        # process all of them. If the gap framing is used timeout is
+        # shortened so the code is delivered once the gap elapses.
+        timeout = 1
+        if self.gap and (self._buffer or self._corrupted):
+            timeout = max(0, min(timeout, self._last + self.gap - time.time()))
+        r = threads.select([self.events], timeout)
         if r:
-            event = self.device.read_one()
-            if event.type == e.EV_KEY:
-                data = categorize(event)
-
-                skip = False
-                # Handle shift
-                if data.scancode in (e.KEY_LEFTSHIFT, e.KEY_RIGHTSHIFT):
-                    if data.keystate == 1:
-                        self._shift = True
-                    elif data.keystate == 0:
-                        self._shift = False
-                    skip = True
-                # Handle capslock
-                if data.scancode == e.KEY_CAPSLOCK:
-                    if data.keystate == 1:
-                        self._caps = True
-                    elif data.keystate == 0:
-                        self._caps = False
-                    skip = True
-
-                # Read key up events, not capslock/shift
-                if data.keystate == 0 and not skip:
-                    if data.scancode != e.KEY_ENTER:
-                        k = self.CODE39.get(data.scancode, '?')
-                        if len(k) == 2:
-                            if self._shift != self._caps:
-                                k = k[1]
-                            elif self._shift == self._caps:
-                                k = k[0]
-                        self._buffer += k
-                    else:
-                        logger.debug('Evdev buffer: {}'.format(self._buffer))
-                        if callback and hasattr(callback, '__call__'):
-                            callback(self._buffer)
-                        self._buffer = ''
-
-
-    def flush(self):
-        """ Flush event device.
-        """
+            self._reads += 1
+            for event in self.events.read():
+                self._key(event, callback)
+
+        if self.gap and (self._buffer or self._corrupted) \
+            and time.time() - self._last > self.gap:
+                self._frame(self._last, callback)
+
 
-        logger.debug('Flushing port')
-        while True:
-            r, w, x = select.select([self.device.fd], [], [], 0)
-            if r:
-                self.device.read_one()
+    def _key(self, event, callback=None):
+        """ Process key event.
+        """
+        code = event.code
+        state = event.value
+        timestamp = event.timestamp()
+        self._events += 1
+
+        # Gap between keys of the same code elapsed, code is complete
+        # NOTE Corrupted code (e.g. with stray unknown key only) is framed
+        # too, so it doesn't corrupt the next one
+        if self.gap and (self._buffer or self._corrupted) \
+            and timestamp - self._last > self.gap:
+            self._frame(self._last, callback)
+        self._last = timestamp
+
+        # Handle shift and capslock
+        if code in (e.KEY_LEFTSHIFT, e.KEY_RIGHTSHIFT):
+            if state == 1:
+                self._shift = True
+            elif state == 0:
+                self._shift = False
+            return
+        if code == e.KEY_CAPSLOCK:
+            if state == 1:
+                self._caps = True
+            elif state == 0:
+                self._caps = False
+            return
+
+        # Read key up events
+        if state != 0:
+            return
+
+        if code != e.KEY_ENTER:
+            if code not in self._unshifted:
+                self._corrupted = 'unknown key {}'.format(code)
+            elif len(self._buffer) >= self.max_length:
+                self._corrupted = 'longer than {}'.format(self.max_length)
+            elif self._shift != self._caps:
+                self._buffer.append(self._shifted[code])
             else:
-                break
+                self._buffer.append(self._unshifted[code])
+            return
+
+        self._frame(timestamp, callback)
 
 
+    def _frame(self, timestamp, callback=None):
+        """ Complete the code being read and pass it to callback.
+
+            Corrupted codes (with unknown keys or too long) are dropped.
+            Prefix and suffix are stripped.
+
+            :param timestamp float: timestamp of the last key of the code
+        """
+        data = ''.join(self._buffer)
+        corrupted = self._corrupted
+        logger.debug('Evdev buffer: {} ({} events, {} reads, {:.3f}ms since '
+            'last key)'.format(data, self._events, self._reads,
+            (time.time() - timestamp) * 1000))
+        self._buffer.clear()
+        self._corrupted = None
+        self._events = 0
+        self._reads = 0
+
+        if corrupted:
+            self.dropped += 1
+            logger.warning('Dropped corrupted code {}: {}'.format(
+                data, corrupted))
+            return
+
+        if self.prefix and data.startswith(self.prefix):
+            data = data[len(self.prefix):]
+        if self.suffix and data.endswith(self.suffix):
+            data = data[:-len(self.suffix)]
+        if not data:
+            return
+
+        if callback and hasattr(callback, '__call__'):
+            callback(data)
+
 
 # Export port_class for port_factory()
 port_class = EvdevScanner
@@ -0,0 +1,192 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Serial Scanner
+    ==============
+"""
+
+import os
+import tty
+import codecs
+import termios
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import threads
+from vjezd.ports import PortReadError
+from vjezd.ports.base import BasePort
+from vjezd.ports.framing import FrameBuffer, MAX_LENGTH
+
+
+class SerialScannerTestError(Exception):
+    """ Exception raised when port test fails.
+    """
+
+
+class SerialScanner(BasePort):
+    """ Serial scanner port.
+
+        Reads codes from scanner connected to serial line (RS-232 or USB-CDC
+        scanner in serial emulation mode, usually ``/dev/ttyACM0`` or
+        ``/dev/ttyUSB0``). Line is switched to raw mode and read without
+        blocking; all received bytes are read by one syscall into preallocated
+        buffer and split into codes by terminators (see
+        :mod:`vjezd.ports.framing`).
+
+        Codes longer than maximum length are dropped.
+
+        Port can be tested against pseudo terminal pair, e.g.:
+
+        $ socat -d -d pty,raw,echo=0 pty,raw,echo=0
+
+        Configuration
+        -------------
+        Port accepts the following positional arguments:
+        #. /path/to/tty - path to serial line special file
+        #. baudrate - line speed (default 9600)
+        #. terminators - characters which end code, backslash escapes are
+           allowed (default ``\\r\\n``)
+        #. max_length - maximum length of code, default is 240
+
+        Full configuration line of serial scanner is:
+        ``scanner=serial:/path/to/tty,baudrate,terminators,max_length``
+    """
+
+    def __init__(self, *args):
+        """ Initialize port configuration.
+        """
+        self.path = '/dev/ttyACM0'
+        self.baudrate = 9600
+        terminators = b'\r\n'
+        max_length = MAX_LENGTH
+        self.fd = None
+
+        if len(args) >= 1:
+            self.path = args[0]
+        if len(args) >= 2:
+            self.baudrate = int(args[1])
+        if len(args) >= 3:
+            terminators = codecs.decode(args[2], 'unicode_escape') \
+                .encode('latin-1')
+        if len(args) >= 4:
+            max_length = int(args[3])
+
+        self.frames = FrameBuffer(terminators, max_length)
+
+        logger.debug('Serial scanner using: {} {}bd'.format(
+            self.path, self.baudrate))
+
+
+    def test(self):
+        """ Test if serial line exists, is accessible and the baudrate is
+            supported.
+        """
+        if not os.access(self.path, os.R_OK | os.W_OK):
+            raise SerialScannerTestError('Cannot access {}'.format(self.path))
+        if not hasattr(termios, 'B{}'.format(self.baudrate)):
+            raise SerialScannerTestError('Unsupported baudrate {}'.format(
+                self.baudrate))
+
+
+    def open(self):
+        """ Open serial line and switch it to raw non-blocking mode.
+        """
+        logger.info('Opening serial line: {}'.format(self.path))
+        fd = os.open(self.path, os.O_RDWR | os.O_NOCTTY | os.O_NONBLOCK)
+        try:
+            tty.setraw(fd)
+            attrs = termios.tcgetattr(fd)
+            speed = getattr(termios, 'B{}'.format(self.baudrate))
+            attrs[4] = attrs[5] = speed
+            # Enable receiver, ignore modem control lines
+            attrs[2] |= termios.CREAD | termios.CLOCAL
+            attrs[6][termios.VMIN] = 0
+            attrs[6][termios.VTIME] = 0
+            termios.tcsetattr(fd, termios.TCSANOW, attrs)
+            termios.tcflush(fd, termios.TCIFLUSH)
+        except:
+            os.close(fd)
+            raise
+        self.fd = fd
+        self.frames.clear()
+
+
+    def close(self):
+        """ Close serial line.
+        """
+        logger.info('Closing serial line: {}'.format(self.path))
+        if self.is_open():
+            os.close(self.fd)
+            self.fd = None
+
+
+    def is_open(self):
+        """ Check whether the serial line is open.
+        """
+        return self.fd is not None
+
+
+    def fileno(self):
+        """ Get file descriptor of serial line.
+        """
+        return self.fd
+
+
+    def read(self, callback=None):
+        """ Read serial line.
+
+            All received bytes are read at once. For each complete code
+            a function assigned to callback argument is run. Raises
+            PortReadError once the line is hung up (e.g. scanner unplugged).
+        """
+        # In order to avoid bare polling a select() is called on device
+        # descriptor with a reasonable timeout. Select is interrupted
+        # immediately once exiting. In case of data read we will read and
+        # process all of them.
+        r = threads.select([self.fd], 1)
+        if not r:
+            return
+
+        try:
+            n = os.readv(self.fd, [self.frames.free()])
+        except BlockingIOError:
+            return
+        except OSError as err:
+            raise PortReadError('Cannot read serial line {}: {}'.format(
+                self.path, err))
+        if n == 0:
+            # NOTE Hung up line stays readable, reading it again would spin
+            raise PortReadError('Serial line {} hung up'.format(self.path))
+
+        for data in self.frames.feed(n):
+            logger.debug('Received data: {}'.format(data))
+            if callback and hasattr(callback, '__call__'):
+                callback(data)
+
+
+# Export port_class for port_factory()
+port_class = SerialScanner
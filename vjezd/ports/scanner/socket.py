@@ -30,11 +30,11 @@
 """
 
 import os
-import select
 import socket
 import logging
 logger = logging.getLogger(__name__)
 
+from vjezd import threads
 from vjezd.ports.base import BasePort
 
 
@@ -114,6 +114,14 @@ class SocketScanner(BasePort):
         return self._is_open
 
 
+    def fileno(self):
+        """ Get file descriptor of UNIX socket.
+        """
+        if self.is_open():
+            return self.socket.fileno()
+        return None
+
+
     def read(self, callback=None):
         """ Read UNIX socket.
 
@@ -121,9 +129,10 @@ class SocketScanner(BasePort):
             run.
         """
         # In order to avoid bare polling a select() is called on device
-        # descriptor with a reasonable timeout so the thread can be
-        # interrupted. In case of event read we will read and process it.
-        r, w, x = select.select([self.socket], [], [], 1)
+        # descriptor with a reasonable timeout. Select is interrupted
+        # immediately once exiting. In case of event read we will read and
+        # process it.
+        r = threads.select([self.socket], 1)
         if r:
             data = self.socket.recv(1024)
             if data:
@@ -133,17 +142,5 @@ class SocketScanner(BasePort):
                     callback(data)
 
 
-    def flush(self):
-        """ Flush UNIX socket.
-        """
-        logger.debug('Flushing UNIX socket')
-        while True:
-            r, w, x = select.select([self.socket], [], [], 0)
-            if r:
-                self.socket.recv(1024)
-            else:
-                break
-
-
 # Export port_class for port_factory()
 port_class = SocketScanner
@@ -0,0 +1,259 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Stream Socket Scanner
+    =====================
+"""
+
+import os
+import socket
+import select
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import threads
+from vjezd.ports.base import BasePort
+from vjezd.ports.framing import FrameBuffer, MAX_LENGTH
+
+
+# Constants
+# Default maximum number of connected clients
+MAX_CLIENTS = 16
+
+
+class StreamScanner(BasePort):
+    """ Stream socket scanner port.
+
+        Listens on UNIX or TCP stream socket and accepts connections from
+        multiple clients (IP scanners, kiosk applications, etc.). Codes are
+        submitted in plain-text one line ('\\n') per code; code not ended by
+        newline is read once the client closes connection. Code can be sent
+        using following command:
+
+        $ echo '1234' | nc -N localhost 7778
+
+        Listening socket and clients are registered in epoll whose descriptor
+        is the port descriptor, so all ready clients are served in one
+        wakeup. Each client is read at
+        most once per wakeup into its own buffer (see
+        :mod:`vjezd.ports.framing`), so a client sending faster than codes
+        are read is slowed down by socket flow control and does not starve
+        other clients. Clients over the connection limit are refused.
+
+        UNIX socket will be created during the port open and destroyed during
+        the port close.
+
+        Configuration
+        -------------
+        Port accepts the following positional arguments:
+        #. address - /path/to/socket for UNIX socket or host:port for TCP
+        #. max_clients - maximum number of connected clients (default 16)
+        #. max_length - maximum length of code, default is 240
+
+        Full configuration line is:
+        ``scanner=stream:address,max_clients,max_length``
+    """
+
+    def __init__(self, *args):
+        """ Initialize port configuration.
+        """
+        self.address = '/tmp/vjezd_scanner.sock'
+        self.max_clients = MAX_CLIENTS
+        self.max_length = MAX_LENGTH
+        self.socket = None
+        self.poll = None
+        # Connected clients (socket and buffer) by file descriptor
+        self.clients = {}
+
+        if len(args) >= 1:
+            self.address = args[0]
+        if len(args) >= 2:
+            self.max_clients = int(args[1])
+        if len(args) >= 3:
+            self.max_length = int(args[2])
+
+        # Statistics
+        self.accepted = 0
+        self.refused = 0
+
+        logger.debug('Scanner is using stream socket: {}'.format(
+            self.address))
+
+
+    def is_unix(self):
+        """ Check whether the port listens on UNIX socket.
+        """
+        return self.address.startswith('/')
+
+
+    def test(self):
+        """ Test if configured address is valid.
+        """
+        if not self.is_unix():
+            host, port = self.address.rsplit(':', 1)
+            int(port)
+
+
+    def open(self):
+        """ Open listening socket.
+        """
+        logger.info('Opening stream socket: {}'.format(self.address))
+
+        if self.is_unix():
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            if os.path.exists(self.address):
+                logger.debug('Removing stale UNIX socket file: {}'.format(
+                    self.address))
+                os.remove(self.address)
+            self.socket.bind(self.address)
+        else:
+            host, port = self.address.rsplit(':', 1)
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            self.socket.bind((host, int(port)))
+        self.socket.listen(self.max_clients)
+        self.socket.setblocking(0)
+        self.poll = select.epoll()
+        self.poll.register(self.socket.fileno(), select.EPOLLIN)
+
+
+    def close(self):
+        """ Close all clients and listening socket.
+        """
+        logger.info('Closing stream socket: {}'.format(self.address))
+        for fd in list(self.clients):
+            self._disconnect(fd)
+        if self.is_open():
+            self.poll.close()
+            self.poll = None
+            self.socket.close()
+            self.socket = None
+            if self.is_unix():
+                logger.debug('Removing UNIX socket file: {}'.format(
+                    self.address))
+                os.remove(self.address)
+        logger.info('Stream socket accepted {} clients, refused {}'.format(
+            self.accepted, self.refused))
+
+
+    def is_open(self):
+        """ Check whether the listening socket is open.
+        """
+        return self.socket is not None
+
+
+    def fileno(self):
+        """ Get file descriptor of epoll which is readable once listening
+            socket or any client is readable.
+        """
+        if self.is_open():
+            return self.poll.fileno()
+        return None
+
+
+    def read(self, callback=None):
+        """ Accept new clients and read codes from all ready clients.
+
+            For each read code a function assigned to callback argument is
+            run.
+        """
+        # In order to avoid bare polling a select() is called on epoll
+        # descriptor with a reasonable timeout. Select is interrupted
+        # immediately once exiting. Then all ready sockets are served.
+        r = threads.select([self.poll], 1)
+        if not r:
+            return
+
+        listener = self.socket.fileno()
+        for fd, mask in self.poll.poll(0):
+            if fd == listener:
+                self._accept()
+            elif fd in self.clients:
+                self._receive(fd, callback)
+
+
+    def _accept(self):
+        """ Accept all pending connections.
+        """
+        while True:
+            try:
+                client, address = self.socket.accept()
+            except (BlockingIOError, InterruptedError):
+                return
+            if len(self.clients) >= self.max_clients:
+                self.refused += 1
+                logger.warning('Refused client {}, limit of {} reached'
+                    .format(address or 'unix', self.max_clients))
+                client.close()
+                continue
+            client.setblocking(0)
+            self.clients[client.fileno()] = (client,
+                FrameBuffer(b'\n', self.max_length))
+            self.poll.register(client.fileno(), select.EPOLLIN)
+            self.accepted += 1
+            logger.debug('Accepted client {}'.format(address or 'unix'))
+
+
+    def _receive(self, fd, callback=None):
+        """ Read client once and pass codes to callback.
+        """
+        client, frames = self.clients[fd]
+        try:
+            n = client.recv_into(frames.free())
+        except (BlockingIOError, InterruptedError):
+            return
+        except OSError as err:
+            logger.warning('Client read failed: {}'.format(err))
+            n = 0
+
+        if n:
+            codes = frames.feed(n)
+        else:
+            # Connection closed, code without newline is complete
+            codes = frames.flush()
+            self._disconnect(fd)
+
+        for data in codes:
+            data = data.strip()
+            if not data:
+                continue
+            logger.debug('Received data: {}'.format(data))
+            if callback and hasattr(callback, '__call__'):
+                callback(data)
+
+
+    def _disconnect(self, fd):
+        client, frames = self.clients.pop(fd)
+        self.poll.unregister(fd)
+        if frames.dropped:
+            logger.warning('Client dropped {} codes longer than {}'.format(
+                frames.dropped, self.max_length))
+        client.close()
+
+
+# Export port_class for port_factory()
+port_class = StreamScanner
@@ -0,0 +1,192 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Startup Profiler
+    ****************
+
+    Startup profiler measures wall and CPU time of each startup phase (from
+    loading configuration file to starting mode threads) and writes
+    a machine-readable JSON report. It is enabled by ``--profile-startup``
+    command line option.
+
+    With ``--profile-detail`` option the whole startup also runs under cProfile
+    and its statistics are dumped next to the report (with ``.prof``
+    extension). The report then also lists modules imported in each phase.
+
+    Report has following format:
+
+    .. code-block::
+
+        {
+            "version": "1.0",
+            "started": 1400000000.0,
+            "wall": 3.2,
+            "cpu": 2.9,
+            "phases": [
+                {"name": "conffile.load", "wall": 0.01, "cpu": 0.01,
+                 "imports": 3, "modules": [...]},
+                ...
+            ]
+        }
+"""
+
+import sys
+import time
+import json
+from contextlib import contextmanager
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import APP_VER
+
+# Path to report file or None if profiler is not enabled
+_path = None
+_detail = False
+_profile = None
+_started = None
+_start = None
+_phases = []
+_pending = None
+
+
+def start(path, detail=False):
+    """ Start startup profiler.
+
+        :param path string:         path to report file
+        :param detail bool:         run startup under cProfile and list
+                                    imported modules
+    """
+    global _path, _detail, _profile, _started, _start
+
+    _path = path
+    _detail = detail
+    _started = time.time()
+    _start = (time.monotonic(), time.process_time())
+
+    if detail:
+        import cProfile
+        _profile = cProfile.Profile()
+        _profile.enable()
+
+
+def enabled():
+    """ Check whether startup profiler is running.
+    """
+    return _path is not None
+
+
+def begin(name):
+    """ Begin startup phase. Previous phase is ended.
+
+        :param name string:         name of phase
+    """
+    global _pending
+
+    if not enabled():
+        return
+
+    end()
+    _pending = (name, set(sys.modules), time.monotonic(), time.process_time())
+
+
+def end():
+    """ End current startup phase.
+    """
+    global _pending
+
+    if not _pending:
+        return
+
+    name, modules, wall, cpu = _pending
+    _pending = None
+    p = {
+        'name': name,
+        'wall': time.monotonic() - wall,
+        'cpu': time.process_time() - cpu,
+        'imports': len(set(sys.modules) - modules)}
+    if _detail:
+        p['modules'] = sorted(set(sys.modules) - modules)
+    _phases.append(p)
+    logger.debug('Startup phase {} took {:.3f}s (cpu {:.3f}s)'.format(
+        name, p['wall'], p['cpu']))
+
+
+@contextmanager
+def phase(name):
+    """ Measure startup phase.
+
+        Usage:
+
+        .. code-block::
+
+            with profiler.phase('db.init'):
+                db.init()
+
+        :param name string:         name of phase
+    """
+    begin(name)
+    try:
+        yield
+    finally:
+        end()
+
+
+def finish():
+    """ Finish startup profiling and write report.
+
+        Called once the application started to handle events. Does nothing if
+        profiler is not running.
+    """
+    global _path, _profile
+
+    if not enabled():
+        return
+
+    end()
+    path, _path = _path, None
+    if _profile:
+        _profile.disable()
+        _profile.dump_stats('{}.prof'.format(path))
+        _profile = None
+
+    report = {
+        'version': APP_VER,
+        'started': _started,
+        'wall': time.monotonic() - _start[0],
+        'cpu': time.process_time() - _start[1],
+        'phases': _phases}
+
+    logger.info('Startup took {:.3f}s (cpu {:.3f}s): {}'.format(
+        report['wall'], report['cpu'], ' '.join(
+        '{}:{:.3f}s'.format(p['name'], p['wall']) for p in _phases)))
+
+    try:
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=4)
+        logger.info('Startup profile written to: {}'.format(path))
+    except OSError as err:
+        logger.error('Cannot write startup profile: {}!'.format(err))
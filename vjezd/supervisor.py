@@ -0,0 +1,427 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Supervisor
+    **********
+
+    Supervisor runs each mode of each lane in its own worker process so CPU
+    heavy work (e.g. ticket rendering) of one mode doesn't add latency to the
+    other mode as they no longer share the interpreter lock. Process execution
+    is enabled by ``execution=processes`` option in [device] section of the
+    configuration file.
+
+    Supervisor process owns relays of all lanes and drives them by relay
+    scheduler. Workers use :class:`RemoteRelay` which sends relay requests to
+    supervisor through a pipe and receives the results back. Workers load the
+    same configuration file as supervisor and periodically report their health
+    (events, CPU time, memory). Once any worker dies all workers are stopped
+    and application exits.
+
+    Messages exchanged through the pipe are tuples:
+
+    * ('relay', id, mode, delay, period, policy): relay request (worker)
+    * ('relay', id, state, error): relay cycle finished (supervisor)
+    * ('health', stats): worker health report (worker)
+    * ('exit',): worker should exit (supervisor)
+"""
+
+import os
+import time
+import signal
+import resource
+import threading
+import multiprocessing
+from multiprocessing import connection
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import threads
+from vjezd import profiler
+from vjezd import ports
+from vjezd.ports import PortWriteError
+from vjezd.ports.relay.base import BaseRelay
+from vjezd.ports.relay import scheduler
+from vjezd.ports.relay.scheduler import RelayHandle
+
+# Constants
+# Interval in seconds between worker health reports
+HEALTH_INTERVAL = 5
+# Number of missed health reports after which worker is considered stalled
+HEALTH_MISSED = 3
+# Time in seconds to wait for worker to exit
+EXIT_TIMEOUT = 10
+
+
+class Link(object):
+    """ Worker side of pipe to supervisor.
+
+        Link dispatches messages from supervisor in its own thread.
+    """
+
+    def __init__(self, conn):
+        """ Initialize link with pipe connection.
+        """
+        self.conn = conn
+        self._lock = threading.Lock()
+        self._ids = iter(range(1, 2**31))
+        self._pending = {}
+
+
+    def start(self):
+        """ Start dispatching messages from supervisor.
+        """
+        t = threading.Thread(target=self._dispatch, name='Link')
+        t.daemon = True
+        t.start()
+
+
+    def send(self, *msg):
+        """ Send message to supervisor.
+        """
+        with self._lock:
+            self.conn.send(msg)
+
+
+    def request_relay(self, mode, delay, period, policy, extend_max=None,
+        priority=None):
+        """ Request relay cycle from supervisor.
+
+            :return:                RelayHandle of the remote cycle
+        """
+        handle = RelayHandle(None, mode, delay, period, policy)
+        with self._lock:
+            id = next(self._ids)
+            self._pending[id] = handle
+            self.conn.send(('relay', id, mode, delay, period, policy,
+                extend_max, priority))
+        return handle
+
+
+    def _dispatch(self):
+        """ Dispatch messages from supervisor until pipe is closed.
+        """
+        try:
+            while True:
+                msg = self.conn.recv()
+                if msg[0] == 'relay':
+                    id, state, error = msg[1:]
+                    with self._lock:
+                        handle = self._pending.pop(id, None)
+                    if handle:
+                        handle._finish(state, error)
+                elif msg[0] == 'exit':
+                    logger.info('Supervisor requested exit')
+                    threads.set_exiting(threads.EXITING)
+
+        except (EOFError, OSError):
+            if not threads.exiting:
+                logger.critical('Supervisor has gone away. Exiting')
+                threads.set_exiting(threads.CRIT_EXITING)
+
+        # Don't let anything wait for remote cycles
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        for handle in pending.values():
+            handle._finish(scheduler.CANCELLED)
+
+
+class RemoteRelay(BaseRelay):
+    """ Relay driven by supervisor process.
+
+        Delay, period and policy are read in worker, relay cycle is scheduled
+        by relay scheduler in supervisor.
+    """
+
+    def __init__(self, link):
+        """ Initialize remote relay.
+        """
+        self.link = link
+
+
+    def test(self):
+        """ Remote relay test always passes.
+        """
+        pass
+
+
+    def warm_up(self):
+        """ Relay scheduler runs in supervisor.
+        """
+        pass
+
+
+    def write(self, data):
+        """ Request relay cycle from supervisor.
+
+            :return:                RelayHandle of remote cycle or None
+        """
+        if data not in ('print', 'scan'):
+            raise TypeError('Invalid activation mode {}'.format(data))
+
+        delay = self.get_delay(data)
+        if delay < 0:
+            logger.warning('Delay set to < 0. Ommiting relay activation')
+            return None
+
+        try:
+            return self.link.request_relay(data, delay, self.get_period(data),
+                self.get_policy(), self.get_extend_max(), self.get_priority())
+        except (OSError, ValueError) as err:
+            raise PortWriteError('Supervisor unreachable: {}'.format(err))
+
+
+def health():
+    """ Get health statistics of current worker process.
+    """
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    return {
+        'pid': os.getpid(),
+        'events': sum(t.events for t in threads.threads),
+        'completed': sum(t.completed for t in threads.threads),
+        'cpu_time': usage.ru_utime + usage.ru_stime,
+        'maxrss': usage.ru_maxrss,
+    }
+
+
+def _report_health(link):
+    """ Report worker health to supervisor until exiting.
+    """
+    while threads.sleep(HEALTH_INTERVAL):
+        try:
+            link.send('health', health())
+        except (OSError, ValueError):
+            break
+
+
+def _worker_main(opts, lane, mode, conn):
+    """ Entry point of worker process.
+
+        :param opts dict:           command line options of supervisor
+        :param lane string:         lane operated by worker
+        :param mode string:         mode operated by worker
+        :param conn Connection:     pipe connection to supervisor
+    """
+    from vjezd import signal_handler
+    from vjezd import conffile
+    from vjezd import log
+    from vjezd import db
+    from vjezd.models import Ticket
+
+    signal.signal(signal.SIGINT, signal_handler)
+    signal.signal(signal.SIGUSR1, signal_handler)
+    signal.signal(signal.SIGUSR2, signal_handler)
+
+    # NOTE Worker must append to log file of supervisor
+    conffile.load(opts['conf'])
+    log.init(opts['logfile'], opts['loglevel'], append=True)
+    db.init()
+
+    from vjezd import device
+
+    # Initialize ports of worker lane. Relay is owned by supervisor.
+    link = Link(conn)
+    ports.init([lane], {lane: [p for p in device.dep[mode] if p != 'relay']})
+    ports.ports[lane]['relay'] = RemoteRelay(link)
+
+    device.id = opts['id']
+    Ticket.issuer = opts['issuer']
+    device.lanes = {lane: (mode,)}
+    device.modes = (mode,)
+    ports.open_ports(device.dep[mode], lane)
+    device.warm_up()
+
+    link.start()
+    t = threading.Thread(target=_report_health, args=(link,), name='Health')
+    t.daemon = True
+    t.start()
+
+    logger.info('Worker {}-{} started'.format(lane, mode))
+    threads.run()
+
+
+class Worker(object):
+    """ Supervisor side of worker process.
+    """
+
+    def __init__(self, context, opts, lane, mode):
+        """ Initialize worker.
+        """
+        self.lane = lane
+        self.mode = mode
+        self.name = 'Worker-{}-{}'.format(lane, mode)
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main,
+            args=(opts, lane, mode, child_conn), name=self.name)
+        self._child_conn = child_conn
+        self._lock = threading.Lock()
+        self.health = {}
+        self.last_seen = None
+
+
+    def start(self):
+        """ Start worker process.
+        """
+        logger.debug('Starting {}'.format(self.name))
+        self.process.start()
+        self._child_conn.close()
+        self.last_seen = time.monotonic()
+
+
+    def send(self, *msg):
+        """ Send message to worker.
+        """
+        with self._lock:
+            try:
+                self.conn.send(msg)
+            except (OSError, ValueError) as err:
+                logger.warning('Cannot send message to {}: {}'.format(
+                    self.name, err))
+
+
+    def receive(self):
+        """ Receive and handle message from worker.
+
+            :return:                False if worker closed the pipe
+        """
+        try:
+            msg = self.conn.recv()
+        except (EOFError, OSError):
+            return False
+
+        self.last_seen = time.monotonic()
+        if msg[0] == 'relay':
+            self.relay(*msg[1:])
+        elif msg[0] == 'health':
+            self.health = msg[1]
+            logger.debug('{} health: {}'.format(self.name, self.health))
+        return True
+
+
+    def relay(self, id, mode, delay, period, policy, extend_max=None,
+        priority=None):
+        """ Schedule relay cycle requested by worker.
+        """
+        def done(handle):
+            self.send('relay', id, handle.state,
+                '{}'.format(handle.error) if handle.error else None)
+
+        relay = ports.port('relay', self.lane)
+        handle = scheduler.scheduler().schedule(relay, mode, delay, period,
+            policy, extend_max, priority)
+        handle.add_done_callback(done)
+
+
+    def stop(self):
+        """ Ask worker to exit.
+        """
+        if self.process.is_alive():
+            self.send('exit')
+
+
+def run(opts):
+    """ Run worker processes for all modes of all lanes and supervise them.
+
+        :param opts dict:           command line options passed to workers
+    """
+    # Avoid circular dependencies
+    from vjezd import crit_exit, exit
+    from vjezd import device as this_device
+
+    opts = dict(opts, id=this_device.id)
+
+    # Supervisor drives relays of all lanes
+    for lane in this_device.lanes:
+        ports.open_ports(['relay'], lane)
+
+    context = multiprocessing.get_context('spawn')
+    workers = []
+    issuers = 0
+    for lane, modes in sorted(this_device.lanes.items()):
+        for mode in modes:
+            # Each print worker issues tickets with its own issuer number so
+            # their codes never collide
+            issuer = 0
+            if mode == 'print':
+                issuer = issuers
+                issuers += 1
+            w = Worker(context, dict(opts, issuer=issuer), lane, mode)
+            w.start()
+            workers.append(w)
+    profiler.finish()
+
+    started = time.monotonic()
+    while not threads.exiting:
+        objs = [threads.wakeup_fd()]
+        for w in workers:
+            objs.extend((w.conn, w.process.sentinel))
+        ready = connection.wait(objs, HEALTH_INTERVAL)
+        if threads.exiting:
+            break
+
+        for w in workers:
+            if w.conn in ready and w.receive():
+                continue
+            if w.conn in ready or w.process.sentinel in ready:
+                # Worker closed the pipe or exited
+                w.process.join(EXIT_TIMEOUT)
+                logger.critical('{} has exited with code {}. Exiting'.format(
+                    w.name, w.process.exitcode))
+                threads.set_exiting(threads.CRIT_EXITING)
+                break
+            if time.monotonic() - w.last_seen > \
+                HEALTH_INTERVAL * HEALTH_MISSED:
+                logger.warning('{} has not reported health for {:.0f}s'.format(
+                    w.name, time.monotonic() - w.last_seen))
+
+    logger.info('Waiting for all workers to exit')
+    for w in workers:
+        w.stop()
+    for w in workers:
+        w.process.join(EXIT_TIMEOUT)
+        if w.process.is_alive():
+            logger.error('{} did not exit. Terminating'.format(w.name))
+            w.process.terminate()
+            w.process.join()
+    logger.info('All workers exited in {:.3f}s'.format(
+        threads.exiting_elapsed()))
+
+    # Report last known health of workers
+    uptime = time.monotonic() - started
+    for w in workers:
+        h = w.health
+        if not h:
+            continue
+        logger.info('{} pid:{} events:{} completed:{} cpu:{:.3f}s ({:.2%}) '
+            'maxrss:{}kB'.format(w.name, h['pid'], h['events'],
+            h['completed'], h['cpu_time'], h['cpu_time'] / uptime,
+            h['maxrss']))
+
+    # Exit depending on exiting state
+    if threads.exiting == threads.CRIT_EXITING:
+        crit_exit(10)
+    else:
+        exit()
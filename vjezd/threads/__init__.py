@@ -30,10 +30,24 @@
 
     This module contains implementation of threads handling the device modes.
     Each mode has its own lifecycle implemented in thread.
+
+    Interrupting
+    ------------
+    Once the exiting flag is set by set_exiting() every blocked wait must be
+    interrupted within milliseconds. Module provides these primitives:
+
+    * sleep() is an interruptible replacement of time.sleep()
+    * select() is a replacement of select.select() which also waits on the
+      wakeup pipe which becomes readable once exiting
+    * on_exiting() registers callback which is called once exiting (e.g. to
+      wake up a thread blocked on queue), remove_on_exiting() unregisters
+      callback of a single wait
 """
 
 
+import os
 import time
+import select as _select
 import threading
 import logging
 logger = logging.getLogger(__name__)
@@ -50,6 +64,13 @@ exiting = NOT_EXITING
 threads = []
 # Exiting state lock
 _lock = threading.Lock()
+# Exiting event, wakeup pipe, exiting callbacks and time of exiting
+_event = threading.Event()
+_wakeup_r, _wakeup_w = os.pipe()
+_callbacks = []
+_exiting_since = None
+# Time of threads start
+_started = None
 
 
 def run():
@@ -61,31 +82,42 @@ def run():
     # Avoid circular dependencies
     from vjezd import crit_exit, exit
     from vjezd import device as this_device
+    from vjezd import profiler
     from vjezd.threads.print import PrintThread
     from vjezd.threads.scan import ScanThread
 
-    if 'print' in this_device.modes:
-        threads.append(PrintThread())
-    if 'scan' in this_device.modes:
-        threads.append(ScanThread())
+    global _started
+    _started = time.monotonic()
+
+    for lane, modes in sorted(this_device.lanes.items()):
+        if 'print' in modes:
+            t = PrintThread(lane)
+            threads.extend([t.reader, t])
+            threads.extend(t.stages)
+        if 'scan' in modes:
+            t = ScanThread(lane)
+            threads.extend([t.reader, t])
 
     for t in threads:
         logger.debug('Starting thread {}'.format(t.name))
         t.start()
+    profiler.finish()
 
     while not exiting:
         # Check if all threads are still active
+        logger.debug('Monitoring threads')
         for t in threads:
-            logger.debug('Monitoring threads')
             if not t.is_alive():
                 logger.critical('Thread {} is not alive. Exiting'.format(
                     t.name))
                 crit_exit(10, force_thread=True)
-            time.sleep(1)
+        sleep(1)
 
     logger.info('Waiting for all threads to join')
     for t in threads:
         t.join()
+    logger.info('All threads joined in {:.3f}s'.format(exiting_elapsed()))
+    report()
 
     # Exit depending on exiting state
     if exiting == CRIT_EXITING:
@@ -94,10 +126,36 @@ def run():
         exit()
 
 
+def report():
+    """ Report throughput and resource cost of each lane.
+
+        Events are button presses and scanned codes, completed are issued and
+        used tickets. CPU time is summed over all lane threads.
+    """
+    uptime = time.monotonic() - _started
+    lanes = {}
+    for t in threads:
+        l = lanes.setdefault(t.lane, {'threads': 0, 'events': 0,
+            'completed': 0, 'cpu_time': 0.0})
+        l['threads'] += 1
+        l['events'] += t.events
+        l['completed'] += t.completed
+        l['cpu_time'] += t.cpu_time
+
+    for lane, l in sorted(lanes.items()):
+        logger.info('Lane {} threads:{} events:{} completed:{} ({:.1f}/h) '
+            'cpu:{:.3f}s ({:.2%})'.format(lane, l['threads'], l['events'],
+            l['completed'], l['completed'] * 3600 / uptime, l['cpu_time'],
+            l['cpu_time'] / uptime))
+
+    from vjezd import codes
+    codes.report()
+
+
 def set_exiting(state=EXITING):
     """ Method to set exiting flag thread-safely.
     """
-    global exiting
+    global exiting, _exiting_since
 
     logger.debug('Waiting for exiting state lock')
     with _lock:
@@ -105,6 +163,79 @@ def set_exiting(state=EXITING):
             logger.debug('Setting exiting flag to {}'.format(state))
             exiting = state
 
+        # Wake up all the waits only once
+        if _event.is_set():
+            return
+        _exiting_since = time.monotonic()
+        _event.set()
+        os.write(_wakeup_w, b'\0')
+        callbacks = list(_callbacks)
+
+    for callback in callbacks:
+        try:
+            callback()
+        except Exception as err:
+            logger.error('Exiting callback failed: {}'.format(err))
+
+
+def on_exiting(callback):
+    """ Register callback called once the exiting flag is set.
+
+        Callback is called from thread which set the flag (possibly from
+        signal handler) so it must not block. If already exiting, callback is
+        called immediately.
+    """
+    with _lock:
+        if not _event.is_set():
+            _callbacks.append(callback)
+            return
+    callback()
+
+
+def remove_on_exiting(callback):
+    """ Unregister callback registered by on_exiting().
+    """
+    with _lock:
+        if callback in _callbacks:
+            _callbacks.remove(callback)
+
+
+def sleep(seconds):
+    """ Sleep for given amount of seconds or until exiting.
+
+        :return:                    True if slept whole time, False if
+                                    interrupted
+    """
+    return not _event.wait(seconds)
+
+
+def exiting_elapsed():
+    """ Get number of seconds elapsed since the exiting flag was set.
+
+        Used to measure how long it takes to interrupt all waits and exit.
+    """
+    if _exiting_since is None:
+        return 0.0
+    return time.monotonic() - _exiting_since
+
+
+def wakeup_fd():
+    """ Get file descriptor which becomes readable once exiting.
+
+        NOTE The descriptor is never drained so it stays readable.
+    """
+    return _wakeup_r
+
+
+def select(rlist, timeout=None):
+    """ Wait until some of given file descriptors (or objects with fileno())
+        is readable, timeout or until exiting.
+
+        :return:                    list of readable objects from rlist
+    """
+    r, w, x = _select.select(list(rlist) + [_wakeup_r], [], [], timeout)
+    return [f for f in r if f != _wakeup_r]
+
 
 def is_main_thread():
     """ Checks whether current thread is the MainThread.
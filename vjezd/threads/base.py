@@ -29,6 +29,7 @@
     ===========
 """
 
+import time
 import threading
 import logging
 logger = logging.getLogger(__name__)
@@ -47,11 +48,23 @@ class BaseThread(threading.Thread):
         order to have sensible thread name, exiting flag processing.
     """
 
-    def __init__(self):
-        """ Initialize print thread.
+    def __init__(self, lane=None):
+        """ Initialize thread.
+
+            :param lane string:     lane operated by thread
         """
+        from vjezd.ports import DEFAULT_LANE
+
         threading.Thread.__init__(self)
+        self.lane = lane or DEFAULT_LANE
         self.name = self.__class__.__name__
+        if self.lane != DEFAULT_LANE:
+            self.name = '{}-{}'.format(self.name, self.lane)
+
+        # Statistics for lane report (see vjezd.threads.report)
+        self.events = 0
+        self.completed = 0
+        self.cpu_time = 0.0
 
 
     def run(self):
@@ -67,6 +80,9 @@ class BaseThread(threading.Thread):
             logger.critical('Thread {} has failed: {}'.format(self.name, err))
             crit_exit(11, err)
 
+        finally:
+            self.cpu_time = time.thread_time()
+
 
     def do(self):
         """ Abstract worker method of thread.
@@ -74,7 +90,8 @@ class BaseThread(threading.Thread):
         raise NotImplementedError
 
 
-    def check_hours(self):
+    @staticmethod
+    def check_hours():
         """ Check whether device operates in or past opening hours (including
             both regular and exception hours.)
 
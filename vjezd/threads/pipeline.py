@@ -0,0 +1,353 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Pipeline
+    ========
+
+    Pipeline is a chain of stages connected by bounded queues. Each stage is
+    a thread that takes a job from its inbox queue, processes it by the stage
+    function and puts it into the inbox of the next stage. As each stage has
+    exactly one thread and queues are FIFO, order of jobs is preserved.
+
+    Number of jobs in flight within the leading part of pipeline can be
+    limited by :class:`Limit`, so events wait in their event queue (where its
+    policy applies) instead of filling the stage inboxes.
+
+    Each stage measures the time jobs spent waiting in its inbox, the time
+    spent in the stage function and the inbox depth. Statistics are logged for
+    each job and summarized once the stage exits.
+"""
+
+import time
+import queue
+import threading
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd import threads
+from vjezd.threads.base import BaseThread
+
+# Constants
+# Default maximum number of jobs waiting in stage inbox
+QUEUE_SIZE = 2
+
+
+class Job(object):
+    """ Job passed through the pipeline.
+
+        Stage functions can store arbitrary attributes on the job.
+
+        :ivar data:                 data of event which created the job
+        :ivar str lane:             lane of event
+        :ivar float created:        timestamp of job creation
+        :ivar float queued:         timestamp of putting job into last inbox
+        :ivar dict timings:         time spent in each stage (by stage name)
+        :ivar Limit limit:          limit the job holds slot of (or None)
+    """
+
+    def __init__(self, data=None, lane=None):
+        """ Initialize job with event data.
+        """
+        from vjezd.ports import DEFAULT_LANE
+
+        self.data = data
+        self.lane = lane or DEFAULT_LANE
+        self.created = time.time()
+        self.queued = self.created
+        self.timings = {}
+        self.limit = None
+
+
+    def __repr__(self):
+        """ String representation of object.
+        """
+        return '[Job age:{:.3f}s {}]'.format(time.time() - self.created,
+            ' '.join('{}:{:.3f}s'.format(k, v)
+                for k, v in sorted(self.timings.items())))
+
+
+class StageStats(object):
+    """ Statistics of pipeline stage.
+
+        :ivar int processed:        number of jobs processed by stage function
+        :ivar int dropped:          number of jobs dropped by stage function
+        :ivar int rejected:         number of jobs rejected by full inbox
+    """
+
+    def __init__(self):
+        self.processed = 0
+        self.dropped = 0
+        self.rejected = 0
+        self.busy = 0.0
+        self.busy_max = 0.0
+        self.waited = 0.0
+        self.waited_max = 0.0
+        self.depth_max = 0
+
+
+    def update(self, waited, busy, depth):
+        """ Update statistics with one processed job.
+        """
+        self.processed += 1
+        self.busy += busy
+        self.busy_max = max(self.busy_max, busy)
+        self.waited += waited
+        self.waited_max = max(self.waited_max, waited)
+        self.depth_max = max(self.depth_max, depth)
+
+
+    def __repr__(self):
+        """ String representation of object.
+        """
+        n = self.processed or 1
+        return ('processed:{} dropped:{} rejected:{} '
+            'busy avg:{:.3f}s max:{:.3f}s '
+            'waited avg:{:.3f}s max:{:.3f}s depth max:{}').format(
+            self.processed, self.dropped, self.rejected,
+            self.busy / n, self.busy_max,
+            self.waited / n, self.waited_max,
+            self.depth_max)
+
+
+class Limit(object):
+    """ Limit of jobs in flight within the leading part of pipeline.
+
+        Job takes a slot by :meth:`acquire` before it is put into the first
+        stage (see :attr:`Job.limit`). It leaves the limited part once it is
+        dropped by any stage or passed on by the stage releasing the limit
+        (see :attr:`Stage.releases`).
+    """
+
+    def __init__(self, size=1):
+        """ Initialize limit.
+
+            :param size integer:    maximum number of jobs in flight
+        """
+        self.size = size
+        self.jobs = 0
+        self._cond = threading.Condition()
+
+        # Wake up thread waiting for free slot once exiting
+        threads.on_exiting(self._wakeup)
+
+
+    def acquire(self, timeout=None):
+        """ Wait for free slot for the next job.
+
+            :param timeout float:   time in seconds to wait for free slot
+            :return:                True if slot was taken, False on timeout
+                                    or once exiting
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: threads.exiting
+                or self.jobs < self.size, timeout)
+            if threads.exiting or self.jobs >= self.size:
+                return False
+            self.jobs += 1
+            return True
+
+
+    def release(self):
+        """ Release slot of job leaving the limited part of pipeline.
+        """
+        with self._cond:
+            self.jobs -= 1
+            self._cond.notify()
+
+
+    def _wakeup(self):
+        """ Wake up thread waiting for free slot.
+        """
+        with self._cond:
+            self._cond.notify_all()
+
+
+class Inbox(queue.Queue):
+    """ Bounded stage inbox.
+
+        Producer waiting for free space is woken up once exiting (see
+        :meth:`wakeup`).
+    """
+
+    def put_until_exiting(self, item):
+        """ Put item into inbox, wait for free space until exiting.
+
+            :return:                True if item was queued, False once exiting
+        """
+        with self.not_full:
+            while self.maxsize > 0 and self._qsize() >= self.maxsize:
+                if threads.exiting:
+                    return False
+                self.not_full.wait()
+            self._put(item)
+            self.unfinished_tasks += 1
+            self.not_empty.notify()
+        return True
+
+
+    def wakeup(self):
+        """ Wake up producers waiting for free space.
+        """
+        with self.not_full:
+            self.not_full.notify_all()
+
+
+class Stage(BaseThread):
+    """ Pipeline stage thread.
+
+        Stage function has a signature func(job) and returns the job which is
+        then passed to the next stage or None in case the job was dropped.
+
+        :ivar bool releases:        whether jobs passed on by stage release
+                                    their limit slot
+    """
+
+    def __init__(self, name, func, size=QUEUE_SIZE, lane=None):
+        """ Initialize stage.
+
+            :param name string:     name of stage
+            :param func function:   stage function
+            :param size integer:    maximum number of jobs in stage inbox
+            :param lane string:     lane of pipeline
+        """
+        BaseThread.__init__(self, lane)
+        self.name = self.name.replace(self.__class__.__name__,
+            '{}Stage'.format(name.capitalize()))
+        self.stage_name = name
+        self.func = func
+        self.inbox = Inbox(size)
+        self.next = None
+        self.releases = False
+        self.stats = StageStats()
+
+        # Wake up stage waiting for job once exiting
+        threads.on_exiting(self._wakeup)
+
+
+    def run(self):
+        """ Run stage and summarize its statistics once exiting.
+        """
+        BaseThread.run(self)
+        logger.info('Stage {} {}'.format(self.stage_name, self.stats))
+
+
+    def do(self):
+        """ Take job from inbox, process it and pass it to the next stage.
+        """
+        # NOTE Block for moderate amount of time so the thread can be
+        # interrupted. Once exiting None is put into inbox to wake it up.
+        try:
+            job = self.inbox.get(timeout=1)
+        except queue.Empty:
+            return
+        if job is None:
+            return
+
+        passed = False
+        try:
+            passed = self.process(job)
+        finally:
+            # Job leaves the limited part of pipeline
+            if job.limit and (self.releases or not passed):
+                job.limit.release()
+                job.limit = None
+
+
+    def process(self, job):
+        """ Process job by stage function and pass it to the next stage.
+
+            :return:                True if job was passed on, False if it was
+                                    dropped
+        """
+        depth = self.inbox.qsize() + 1
+        start = time.time()
+        waited = start - job.queued
+
+        result = self.func(job)
+
+        busy = time.time() - start
+        job.timings[self.stage_name] = busy
+        self.stats.update(waited, busy, depth)
+        logger.debug('Stage {} took {:.3f}s, waited {:.3f}s, depth {}'.format(
+            self.stage_name, busy, waited, depth))
+
+        if result is None:
+            logger.debug('Stage {} dropped {}'.format(self.stage_name, job))
+            self.stats.dropped += 1
+            return False
+
+        if self.next:
+            return self.next.put(result)
+        self.completed += 1
+        logger.info('Pipeline finished {}'.format(result))
+        return True
+
+
+    def put(self, job, block=True):
+        """ Put job into stage inbox.
+
+            :param job Job:         job to be processed by stage
+            :param block bool:      if True wait for free space in inbox
+                                    (until exiting), otherwise reject the job
+                                    immediately if inbox is full
+            :return:                True if job was queued, otherwise False
+        """
+        job.queued = time.time()
+
+        if not block:
+            try:
+                self.inbox.put_nowait(job)
+                return True
+            except queue.Full:
+                self.stats.rejected += 1
+                logger.warning('Stage {} is full. Rejected {}'.format(
+                    self.stage_name, job))
+                return False
+
+        return self.inbox.put_until_exiting(job)
+
+
+    def _wakeup(self):
+        """ Wake up stage waiting for job and stages waiting for free space in
+            its inbox.
+        """
+        self.inbox.wakeup()
+        try:
+            self.inbox.put_nowait(None)
+        except queue.Full:
+            # Stage is not waiting for job
+            pass
+
+
+def chain(*stages):
+    """ Connect stages into pipeline in given order.
+
+        :return:                    list of stages
+    """
+    for prev, stage in zip(stages, stages[1:]):
+        prev.next = stage
+    return list(stages)
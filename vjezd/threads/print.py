@@ -28,13 +28,24 @@
 """ Print Thread
     ============
 
-    Print thread is supposed to operate device in print mode. Basic workflow of
-    this thread is to:
-
-    * wait for button press
-    * print ticket
-    * switch relay
-
+    Print thread is supposed to operate device in print mode. Print mode is
+    a pipeline (see :mod:`vjezd.threads.pipeline`) of the following stages:
+
+    * event: take button press from button event queue (PrintThread itself)
+    * issue: check opening hours and create new ticket
+    * render: render ticket into printer document
+    * print: print rendered document
+    * gate: switch relay and commit ticket
+
+    Button is read by reader thread (see :mod:`vjezd.threads.reader`) into
+    event queue. Each stage runs in its own thread so the next ticket can be
+    issued and rendered while the gate cycle of the previous one is still in
+    progress. Only one job at a time is in flight before the gate stage (see
+    :class:`vjezd.threads.pipeline.Limit`), so further button presses wait in
+    event queue and are dropped or merged according to queue policy.
+
+    Ticket is created outside of DB session and it is added to the session
+    and commited only in the gate stage once it is successfuly issued.
 """
 
 import logging
@@ -45,54 +56,121 @@ logger = logging.getLogger(__name__)
 from vjezd import db
 from vjezd.models import Ticket
 from vjezd.threads.base import BaseThread
+from vjezd.threads.pipeline import Job, Stage, Limit, chain
+from vjezd.threads.reader import ReaderThread
 from vjezd.ports import port, PortWriteError
 
 
-class PrintThread(BaseThread):
-    """ Print thread class.
+def issue(job):
+    """ Issue stage. Check opening hours and create new ticket.
     """
+    try:
+        # Check hours
+        if not BaseThread.check_hours():
+            logger.warning('Event past opening hours. Ignoring')
+            return None
 
-    def do(self):
-        """ Poll for button press and once pressed print a ticket.
-        """
-        port('button').read(callback=self.button_callback)
+        # Create new ticket
+        job.ticket = Ticket()
+        return job
 
+    finally:
+        db.session.remove()
 
-    def button_callback(self, data=None):
-        """ Callback function for button port read event.
 
-            Once the button is pressed following actions are done:
-            #. Check opening hours
-            #. If open, generate new ticket and print it
-            #. Once printed activate relay in print mode
-            #. Flush button port to ignore queued events (while relay open)
-        """
-        logger.info('Button pressed')
+def render(job):
+    """ Render stage. Render ticket into a printer document.
+    """
+    try:
+        job.document = port('printer', job.lane).render(job.ticket)
+        return job
 
-        # Check hours
-        if not self.check_hours():
-            logger.warning('Event past opening hours. Ignoring')
+    finally:
+        db.session.remove()
 
-            db.session.remove()
-            return
 
-        # Create new ticket
-        ticket = Ticket()
-        db.session.add(ticket)
+def print_ticket(job):
+    """ Print stage. Print rendered ticket document.
+    """
+    try:
+        port('printer', job.lane).write(job.ticket, job.document)
+    except PortWriteError as err:
+        logger.error('Cannot write port {}!'.format(err))
+        return None
+
+    return job
 
-        try:
-            port('printer').write(ticket)
-            port('relay').write('print')
-        except PortWriteError as err:
-            # In case port write raised an exception rollback the session
-            logger.error('Cannot write port {}!'.format(err))
 
-            db.session.remove()
+def gate(job):
+    """ Gate stage. Activate relay in print mode and commit the ticket.
+    """
+    try:
+        handle = port('relay', job.lane).write('print')
+        # Wait for the relay cycle so the ticket is not commited if it fails
+        # NOTE Ticket is already printed, so it is commited also when the
+        # cycle is cancelled or application is exiting. Other policies than
+        # queue need next tickets to join the open cycle, don't wait for it
+        if handle and handle.exclusive() and not handle.wait():
+            logger.warning('Relay cycle {} not finished'.format(handle))
+    except PortWriteError as err:
+        logger.error('Cannot write port {}!'.format(err))
+        return None
+
+    commit_ticket(job)
+    return job
+
+
+def commit_ticket(job):
+    """ Commit DB transaction once ticket is successfuly issued.
+    """
+    db.session.add(job.ticket)
+    db.session.commit()
+    db.session.remove()
+
+
+class PrintThread(BaseThread):
+    """ Print thread class.
+
+        Print thread handles the event stage of print pipeline. Button reader
+        and other stages are available in reader and stages attributes and
+        must be started along with it.
+    """
+
+    def __init__(self, lane=None):
+        """ Initialize print thread, button reader and pipeline stages.
+
+            :param lane string:     lane operated by thread
+        """
+        BaseThread.__init__(self, lane)
+        self.reader = ReaderThread('button', lane)
+        self.stages = chain(
+            Stage('issue', issue, lane=lane),
+            Stage('render', render, lane=lane),
+            Stage('print', print_ticket, lane=lane),
+            Stage('gate', gate, lane=lane))
+
+        # Job leaves the limited part once printed and passed to gate stage
+        self.limit = Limit(1)
+        self.stages[-2].releases = True
+
+
+    def do(self):
+        """ Take button press from event queue and pass it to pipeline.
+
+            Waits until the previous job is passed to gate stage, so button
+            presses queue up in event queue while pipeline is busy.
+        """
+        if not self.limit.acquire(timeout=1):
+            return
+        event = self.reader.queue.get(timeout=1)
+        if not event:
+            self.limit.release()
             return
 
-        # Commit DB transaction once ticket is successfuly issued
-        db.session.commit()
-        db.session.remove()
+        logger.info('Button pressed {}'.format(event))
 
-        # Ignore all events queued during the relay period
-        port('button').flush()
+        job = Job(event.data, self.lane)
+        job.created = event.time
+        job.limit = self.limit
+        if not self.stages[0].put(job):
+            self.limit.release()
@@ -0,0 +1,79 @@
+# encoding: utf-8
+
+# Copyright (c) 2014, Ondrej Balaz. All rights reserved.
+#
+# Redistribution and use in source and binary forms, with or without
+# modification, are permitted provided that the following conditions are met:
+#
+# * Redistributions of source code must retain the above copyright notice, this
+#   list of conditions and the following disclaimer.
+# * Redistributions in binary form must reproduce the above copyright notice,
+#   this list of conditions and the following disclaimer in the documentation
+#   and/or other materials provided with the distribution.
+# * Neither the name of the original author nor the names of contributors
+#   may be used to endorse or promote products derived from this software
+#   without specific prior written permission.
+#
+# THIS SOFTWARE IS PROVIDED BY THE COPYRIGHT HOLDERS AND CONTRIBUTORS "AS IS"
+# AND ANY EXPRESS OR IMPLIED WARRANTIES, INCLUDING, BUT NOT LIMITED TO, THE
+# IMPLIED WARRANTIES OF MERCHANTABILITY AND FITNESS FOR A PARTICULAR PURPOSE
+# ARE DISCLAIMED. IN NO EVENT SHALL <COPYRIGHT HOLDER> BE LIABLE FOR ANY
+# DIRECT, INDIRECT, INCIDENTAL, SPECIAL, EXEMPLARY, OR CONSEQUENTIAL DAMAGES
+# (INCLUDING, BUT NOT LIMITED TO, PROCUREMENT OF SUBSTITUTE GOODS OR SERVICES;
+# LOSS OF USE, DATA, OR PROFITS; OR BUSINESS INTERRUPTION) HOWEVER CAUSED AND
+# ON ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
+# (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE OF THIS
+# SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
+
+""" Reader Thread
+    =============
+
+    Reader thread reads input port in a loop and puts read data into event
+    queue of the port (see :mod:`vjezd.ports.events`). Mode thread then
+    consumes events from the queue, so the port is read even while the mode
+    thread is busy.
+"""
+
+import logging
+logger = logging.getLogger(__name__)
+
+from vjezd.threads.base import BaseThread
+from vjezd.ports import port
+from vjezd.ports.events import event_queue
+
+
+class ReaderThread(BaseThread):
+    """ Reader thread class.
+    """
+
+    def __init__(self, port_name, lane=None):
+        """ Initialize reader thread and its event queue.
+
+            :param port_name string: name of input port
+            :param lane string:     lane operated by thread
+        """
+        BaseThread.__init__(self, lane)
+        self.name = self.name.replace(self.__class__.__name__,
+            '{}Reader'.format(port_name.capitalize()))
+        self.port_name = port_name
+        self.queue = event_queue(port_name, lane)
+
+
+    def run(self):
+        """ Run reader and summarize its queue statistics once exiting.
+        """
+        BaseThread.run(self)
+        logger.info('Queue {} {}'.format(self.queue.name, self.queue))
+
+
+    def do(self):
+        """ Read port and queue read data.
+        """
+        port(self.port_name, self.lane).read(callback=self.put)
+
+
+    def put(self, data=None):
+        """ Callback function for port read event.
+        """
+        self.events += 1
+        self.queue.put(data)
@@ -33,19 +33,78 @@ import logging
 logger = logging.getLogger(__name__)
 
 from vjezd import db
+from vjezd import codes
 from vjezd.models import Ticket
 from vjezd.threads.base import BaseThread
+from vjezd.threads.reader import ReaderThread
 from vjezd.ports import port, PortWriteError
 
 
+def admit_ticket(code):
+    """ Check code format and opening hours, validate scanned code and use
+        its ticket.
+
+        Used ticket is not commited. Call commit_ticket() once the gate is
+        opened.
+
+        :param code string:         scanned code
+        :return:                    used Ticket object or None
+    """
+    # Check format before any DB access
+    code = codes.check(code)
+    if not code:
+        return None
+
+    # Check hours
+    if not BaseThread.check_hours():
+        logger.warning('Event past opening hours. Ignoring')
+
+        db.session.remove()
+        return None
+
+    # Validate ticket
+    ticket = Ticket.validate(code)
+    if not ticket:
+        # FIXME some signalization to user?
+        logger.info('Invalid ticket. Ignoring')
+
+        db.session.remove()
+        return None
+
+    # If ticket is valid use ticket
+    ticket.use()
+    return ticket
+
+
+def commit_ticket():
+    """ Commit DB transaction once ticket is succesfully used.
+    """
+    db.session.commit()
+    db.session.remove()
+
+
 class ScanThread(BaseThread):
-    """ A class representing print mode thread.
+    """ A class representing scan mode thread.
+
+        Scanner reader is available in reader attribute and must be started
+        along with it.
     """
 
+    def __init__(self, lane=None):
+        """ Initialize scan thread and scanner reader.
+
+            :param lane string:     lane operated by thread
+        """
+        BaseThread.__init__(self, lane)
+        self.reader = ReaderThread('scanner', lane)
+
+
     def do(self):
-        """ Poll for read codes and once scanned valid code open gate.
+        """ Take scanned code from event queue and once valid open gate.
         """
-        port('scanner').read(callback=self.scanner_callback)
+        event = self.reader.queue.get(timeout=1)
+        if event:
+            self.scanner_callback(event.data)
 
 
     def scanner_callback(self, data=None):
@@ -56,42 +115,35 @@ class ScanThread(BaseThread):
             #. Check if code is valid
             #. If valid use it
             #. Activate relay in scan mode
-            #. Flush scanner port to ignore queued events (while relay open)
+            #. Wait for relay cycle to finish (queue relay policy only)
+
+            Codes scanned while relay is open wait in event queue of scanner.
+            With merge or extend relay policy they are admitted while relay is
+            open and join its cycle.
         """
         logger.info('Code scanned: {}'.format(data))
 
-        # Check hours
-        if not self.check_hours():
-            logger.warning('Event past opening hours. Ignoring')
-
-            db.session.remove()
-            return
-
-        # Validate ticket
-        ticket = Ticket.validate(data)
-        if not ticket:
-            # FIXME some signalization to user?
-            logger.info('Invalid ticket. Ignoring')
-
-            db.session.remove()
+        if not admit_ticket(data):
             return
 
-        # If ticket is valid use ticket
-        ticket.use()
-
         # Activate relay
+        handle = None
         try:
-            port('relay').write('scan')
+            handle = port('relay', self.lane).write('scan')
         except PortWriteError as err:
             # In case port write raised an exception rollback the session
             logger.error('Cannot write port {}!'.format(err))
             db.session.remove()
 
 
-        # Commit DB transaction once ticket is succesfully used
-        db.session.commit()
-        db.session.remove()
+        commit_ticket()
+        self.completed += 1
 
-        # Ignore all events queued during the relay period
-        # NOTE This avoids other tickets being used before the gate closes
-        port('scanner').flush()
+        # Wait for the gate to close
+        # NOTE This avoids other tickets being used before the gate closes,
+        # other policies than queue need them to join the open cycle
+        try:
+            if handle and handle.exclusive():
+                handle.wait()
+        except PortWriteError as err:
+            logger.error('Cannot write port {}!'.format(err))